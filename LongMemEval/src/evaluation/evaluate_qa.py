@@ -1,6 +1,9 @@
 import os
 import sys
 import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 import backoff
 import openai
@@ -43,17 +46,73 @@ def get_anscheck_prompt(task, question, answer, response, abstention=False):
     return prompt
 
 
+class JudgeCache:
+    # append-only jsonl of judge responses keyed by (judge model, prompt) hash, shared across runs
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        self.key2response = {}
+        if os.path.exists(cache_file):
+            with open(cache_file) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # torn last line from an interrupted run
+                        continue
+                    self.key2response[record['key']] = record['response']
+        self.out_f = open(cache_file, 'a')
+
+    @staticmethod
+    def get_key(model, prompt):
+        return hashlib.sha256((model + '\n' + prompt).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        return self.key2response.get(key)
+
+    def put(self, key, response):
+        with self.lock:
+            self.key2response[key] = response
+            print(json.dumps({'key': key, 'response': response}), file=self.out_f, flush=True)
+
+    def close(self):
+        self.out_f.close()
+
+
+def judge_with_cache(client, cache, model, prompt):
+    key = JudgeCache.get_key(model, prompt)
+    eval_response = cache.get(key)
+    if eval_response is None:
+        kwargs = {
+            'model': model,
+            'messages':[
+                {"role": "user", "content": prompt}
+            ],
+            'n': 1,
+            'temperature': 0,
+            'max_tokens': 10
+        }
+        completion = chat_completions_with_backoff(client, **kwargs)
+        eval_response = completion.choices[0].message.content.strip()
+        cache.put(key, eval_response)
+    return eval_response
+
+
 if __name__ == '__main__':
-    if len(sys.argv) != 4:
-        print('Usage: python evaluate_qa.py metric_model hyp_file ref_file')
+    if len(sys.argv) not in [4, 5]:
+        print('Usage: python evaluate_qa.py metric_model hyp_file ref_file [max_concurrency]')
         exit()
 
     metric_model_short = sys.argv[1]
     hyp_file = sys.argv[2]
     ref_file = sys.argv[3]
+    max_concurrency = int(sys.argv[4]) if len(sys.argv) == 5 else 16
     verbose = True
     
     result_file = hyp_file + '.eval-results-{}'.format(metric_model_short)
+    # verdicts are reused across hypothesis files and reruns; override the location with LONGMEMEVAL_JUDGE_CACHE
+    cache_file = os.getenv('LONGMEMEVAL_JUDGE_CACHE',
+                           os.path.join(os.path.dirname(os.path.abspath(hyp_file)), '.judge_cache_{}.jsonl'.format(metric_model_short)))
 
     if metric_model_short not in model_zoo:
         print('Requested metric model is not supported:', metric_model_short)
@@ -85,31 +144,26 @@ if __name__ == '__main__':
     qtypes = set(list(qid2qtype.values()))
     qtype2acc = {t: [] for t in qtypes}
 
-    with open(result_file, 'w') as out_f:
+    judge_cache = JudgeCache(cache_file)
+    print('Using judge cache at {} ({} cached verdicts)'.format(cache_file, len(judge_cache.key2response)))
+
+    jobs = []
+    for entry in hypotheses:
+        if entry['question_id'] not in qid2qtype:
+            print('Warning: skipping {} as it is not in reference data.'.format(entry['question_id']))
+            continue
+        qtype = qid2qtype[entry['question_id']]
+        q = qid2qdata[entry['question_id']]['question']
+        ans = qid2qdata[entry['question_id']]['answer']
+        hyp = entry['hypothesis']
+        prompt = get_anscheck_prompt(qtype, q, ans, hyp, abstention='_abs' in entry['question_id'])
+        jobs.append((entry, q, ans, hyp, prompt))
+
+    # requests run concurrently; results are consumed (and written) in hypothesis order as they become available
+    with open(result_file, 'w') as out_f, ThreadPoolExecutor(max_workers=max_concurrency) as executor:
         logs = []
-        for entry in tqdm(hypotheses):
-
-            if entry['question_id'] not in qid2qtype:
-                print('Warning: skipping {} as it is not in reference data.'.format(entry['question_id']))
-                continue
-            
-            qtype = qid2qtype[entry['question_id']]
-            q = qid2qdata[entry['question_id']]['question']
-            ans = qid2qdata[entry['question_id']]['answer']
-            hyp = entry['hypothesis']
-            
-            prompt = get_anscheck_prompt(qtype, q, ans, hyp, abstention='_abs' in entry['question_id'])
-            kwargs = {
-                'model': metric_model,
-                'messages':[
-                    {"role": "user", "content": prompt}
-                ],
-                'n': 1,
-                'temperature': 0,
-                'max_tokens': 10
-            }
-            completion = chat_completions_with_backoff(metric_client, **kwargs)
-            eval_response = completion.choices[0].message.content.strip()
+        eval_responses = executor.map(lambda job: judge_with_cache(metric_client, judge_cache, metric_model, job[-1]), jobs)
+        for (entry, q, ans, hyp, prompt), eval_response in tqdm(zip(jobs, eval_responses), total=len(jobs)):
             label = 'yes' in eval_response.lower()
             entry['autoeval_label'] = {
                 'model': metric_model,
@@ -123,10 +177,10 @@ if __name__ == '__main__':
                     'hypothesis': hyp,
                     'autoeval_label': label
                 }, indent=4), flush=True)
-            print(json.dumps(entry), file=out_f)
+            print(json.dumps(entry), file=out_f, flush=True)
             qtype2acc[qid2qtype[entry['question_id']]].append(1 if label else 0)
+    judge_cache.close()
 
-            
     print('Accuracy:', round(np.mean([1 if x['autoeval_label']['label'] else 0 for x in logs]).item(), 4))
     for k,v in qtype2acc.items():
         print('\t{}: {} ({})'.format(k, round(np.mean(v), 4), len(v)))
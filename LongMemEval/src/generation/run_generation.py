@@ -1,5 +1,7 @@
 import sys
 import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 import openai
 from openai import OpenAI
@@ -193,38 +195,32 @@ def prepare_prompt(entry, retriever_type, topk_context: int, useronly: bool, his
     # optional: if CoN is specified, add an information extraction process before feeding into the model
     if con:
         con_prompt = "I will give you a chat history between you and a user, as well as a question from the user. Write reading notes to extract all the relevant user information relevant to answering the answer. If no relevant information is found, just output \"empty\". \n\n\nChat History:\nSession Date: {}\nSession Content:\n{}\n\nQuestion Date: {}\nQuestion: {}\nExtracted note (information relevant to answering the question):"
-        retrieved_chunks_with_notes = []
+        con_inputs = []
         for i, cur_item in enumerate(retrieved_chunks):
             if merge_key_expansion_into_value == 'merge':
                 (chunk_date, chunk_expansion_entry, chunk_entry) = cur_item
-                                
             else:
                 (chunk_date, chunk_entry) = cur_item
-                
-            kwargs = {
-                'model': con_model,
-                'messages':[
-                    {"role": "user", "content": con_prompt.format(chunk_date, json.dumps(chunk_entry), question_date_string, question_string)}
-                ],
-                'n': 1,
-                'temperature': 0,
-                'max_tokens': 500,
-            }
-            completion = chat_completions_with_backoff(con_client, **kwargs) 
-            cur_note = completion.choices[0].message.content.strip()
-            chunk_entry_con = {'session_summary': cur_note}
+            con_inputs.append(con_prompt.format(chunk_date, json.dumps(chunk_entry), question_date_string, question_string))
 
+        # notes are independent of each other, so all chunks are sent at once
+        with ThreadPoolExecutor(max_workers=max(1, len(con_inputs))) as executor:
+            con_notes = list(executor.map(lambda x: get_con_note(con_client, con_model, x), con_inputs))
+
+        retrieved_chunks_with_notes = []
+        for cur_item, cur_note in zip(retrieved_chunks, con_notes):
+            chunk_entry_con = {'session_summary': cur_note}
             if merge_key_expansion_into_value == 'merge':
-                retrieved_chunks_with_notes.append((chunk_date, chunk_expansion_entry, chunk_entry_con))
+                retrieved_chunks_with_notes.append((cur_item[0], cur_item[1], chunk_entry_con))
             else:
-                retrieved_chunks_with_notes.append((chunk_date, chunk_entry_con))
+                retrieved_chunks_with_notes.append((cur_item[0], chunk_entry_con))
 
         retrieved_chunks = retrieved_chunks_with_notes
                 
     # sort sessions by their dates
     retrieved_chunks.sort(key=lambda x: x[0])
     
-    history_string = ""
+    history_chunks = []
     for i, cur_item in enumerate(retrieved_chunks):
         if merge_key_expansion_into_value == 'merge':
             (chunk_date, chunk_expansion_entry, chunk_entry) = cur_item
@@ -249,37 +245,78 @@ def prepare_prompt(entry, retriever_type, topk_context: int, useronly: bool, his
             raise NotImplementedError
 
         if retriever_type in ["orig-session", "flat-session", "oracle-session"]:
-            history_string += '\n### Session {}:\nSession Date: {}\nSession Content:\n{}\n'.format(i+1, chunk_date, sess_string)
+            history_chunks.append('\n### Session {}:\nSession Date: {}\nSession Content:\n{}\n'.format(i+1, chunk_date, sess_string))
         elif retriever_type in ["orig-turn", "flat-turn", "oracle-turn"]:  
-            # history_string += '\n### Round {}:\nDate: {}\nRound Content:\n{}\n'.format(i+1, chunk_date, sess_string)
-            history_string += '\n### Session {}:\nSession Date: {}\nSession Content:\n{}\n'.format(i+1, chunk_date, sess_string)  # we include both sides right now
+            # history_chunks.append('\n### Round {}:\nDate: {}\nRound Content:\n{}\n'.format(i+1, chunk_date, sess_string))
+            history_chunks.append('\n### Session {}:\nSession Date: {}\nSession Content:\n{}\n'.format(i+1, chunk_date, sess_string))  # we include both sides right now
         elif retriever_type == "no-retrieval":
-            history_string += ""
+            pass
         else:
             raise NotImplementedError
 
-    assert retriever_type == "no-retrieval" or history_string != ""
+    assert retriever_type == "no-retrieval" or ''.join(history_chunks) != ""
     if retriever_type == "no-retrieval":
         prompt = answer_prompt_template.format(question_string)
     else:
         # truncate history string
-        if tokenizer_backend == 'openai':
-            tokens = tokenizer.encode(history_string, allowed_special={'<|endoftext|>'})
-            if len(tokens) > max_retrieval_length:
-                print('Truncating from {} to {}'.format(len(tokens), max_retrieval_length), flush=True)
-                truncated_tokens = tokens[:max_retrieval_length]
-                history_string = tokenizer.decode(truncated_tokens)
-        elif tokenizer_backend == 'huggingface':
-            encoded_input = tokenizer(history_string, max_length=max_retrieval_length, truncation=False, return_tensors="pt")
-            if len(encoded_input['input_ids'][0]) > max_retrieval_length:
-                print('Truncating from {} to {}'.format(len(encoded_input['input_ids'][0]), max_retrieval_length))
-                encoded_input = tokenizer(history_string, max_length=max_retrieval_length, truncation=True, return_tensors="pt")
-                history_string = tokenizer.decode(encoded_input['input_ids'][0], skip_special_tokens=True)
-        else:
-            raise NotImplementedError
+        history_string = truncate_history_chunks(history_chunks, tokenizer, tokenizer_backend, max_retrieval_length)
         prompt = answer_prompt_template.format(history_string, question_date_string, question_string)
 
     return prompt
+
+
+def encode_history_chunk(chunk, tokenizer, tokenizer_backend):
+    if tokenizer_backend == 'openai':
+        return tokenizer.encode(chunk, allowed_special={'<|endoftext|>'})
+    elif tokenizer_backend == 'huggingface':
+        return tokenizer.encode(chunk, add_special_tokens=False)
+    else:
+        raise NotImplementedError
+
+
+def decode_history_tokens(tokens, tokenizer, tokenizer_backend):
+    if tokenizer_backend == 'openai':
+        return tokenizer.decode(tokens)
+    elif tokenizer_backend == 'huggingface':
+        return tokenizer.decode(tokens, skip_special_tokens=True)
+    else:
+        raise NotImplementedError
+
+
+def truncate_history_chunks(history_chunks, tokenizer, tokenizer_backend, max_retrieval_length):
+    # accumulate per-chunk token counts and stop at the budget, so the joined history is never re-encoded;
+    # only the chunk that crosses the budget is decoded back to text
+    kept_chunks, n_tokens = [], 0
+    for i, chunk in enumerate(history_chunks):
+        chunk_tokens = encode_history_chunk(chunk, tokenizer, tokenizer_backend)
+        if n_tokens + len(chunk_tokens) > max_retrieval_length:
+            print('Truncating at chunk {} of {} ({} tokens kept)'.format(i+1, len(history_chunks), max_retrieval_length), flush=True)
+            kept_chunks.append(decode_history_tokens(chunk_tokens[:max_retrieval_length - n_tokens], tokenizer, tokenizer_backend))
+            break
+        kept_chunks.append(chunk)
+        n_tokens += len(chunk_tokens)
+    return ''.join(kept_chunks)
+
+
+# chain-of-note results keyed by (model, chunk, question); chunks retrieved for the same question again are not re-queried
+con_note_cache = {}
+
+
+def get_con_note(con_client, con_model, con_input):
+    cache_key = hashlib.sha256((con_model + '\n' + con_input).encode('utf-8')).hexdigest()
+    if cache_key not in con_note_cache:
+        kwargs = {
+            'model': con_model,
+            'messages':[
+                {"role": "user", "content": con_input}
+            ],
+            'n': 1,
+            'temperature': 0,
+            'max_tokens': 500,
+        }
+        completion = chat_completions_with_backoff(con_client, **kwargs)
+        con_note_cache[cache_key] = completion.choices[0].message.content.strip()
+    return con_note_cache[cache_key]
     
 
 @backoff.on_exception(backoff.constant, (openai.RateLimitError), 
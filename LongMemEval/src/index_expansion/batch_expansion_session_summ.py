@@ -1,14 +1,6 @@
-import os
 import json
-from tqdm import tqdm
 from openai import OpenAI
-import openai
-import backoff
-
-@backoff.on_exception(backoff.constant, (openai.RateLimitError), 
-                      interval=5)
-def chat_completions_with_backoff(client, **kwargs):
-    return client.chat.completions.create(**kwargs)
+from src.index_expansion.expansion_runner import ExpansionRunner, chat_completions_with_backoff, collect_todo_sessions
 
 
 client = OpenAI(
@@ -17,13 +9,16 @@ client = OpenAI(
 )
 
 
-def summarize_session(sess_entry, model_name):
-    # memorybank prompt
-    # summarization_prompt = "Below is a transcript of a conversation between a human user and an AI assistant. Please summarize the following dialogue as concisely as possible, extracting the main themes and key information. If there are multiple key events, you may summarize them separately. Dialogue content:\n"
-    summarization_prompt = "Below is a transcript of a conversation between a human user and an AI assistant. Please summarize the following dialogue as concisely as possible in a short paragraph, extracting the main themes and key information. In your summary, focus more on what the user mentioned or asked for. Dialogue content:\n"
+# memorybank prompt
+# SUMMARIZATION_PROMPT = "Below is a transcript of a conversation between a human user and an AI assistant. Please summarize the following dialogue as concisely as possible, extracting the main themes and key information. If there are multiple key events, you may summarize them separately. Dialogue content:\n{}"
+SUMMARIZATION_PROMPT = "Below is a transcript of a conversation between a human user and an AI assistant. Please summarize the following dialogue as concisely as possible in a short paragraph, extracting the main themes and key information. In your summary, focus more on what the user mentioned or asked for. Dialogue content:\n{}\n\nYour summary (be concise):"
+
+
+def summarize_session(sess_entry, model_name, prompt_template=SUMMARIZATION_PROMPT):
+    dialogue_string = ""
     for turn_entry in sess_entry:
-        summarization_prompt += f"\n{turn_entry['role']}：{turn_entry['content']}"
-    summarization_prompt += '\n\nYour summary (be concise):'
+        dialogue_string += f"\n{turn_entry['role']}：{turn_entry['content']}"
+    summarization_prompt = prompt_template.format(dialogue_string)
     # print(summarization_prompt)
 
     kwargs = {
@@ -47,32 +42,8 @@ if __name__ == '__main__':
     # in_file = '/home/diwu/ralm/long-mem-benchmark/data/userinfo_v2/6_session_cache/data_6_session_cache.json'
     cache_file = '/local2/diwu/long-mem-benchmark/index_expansion_logs/' + in_file.split('/')[-1] + '.session-summ.json'
     
-    if os.path.isfile(cache_file):
-        data = json.load(open(cache_file))
-        print('Loaded:', cache_file)
-    else:
-        data = {}
-
     in_data = json.load(open(in_file))
 
-    todo_sessions = []
-    for entry in in_data:
-        if 'session' in entry:
-            todo_sessions.append((entry['session_id'], entry['session']))
-        elif 'sessions' in entry:
-            for i, s in enumerate(entry['sessions']):
-                todo_sessions.append((entry['session_id'] + f'_{i+1}', s))
-        elif 'session_1' in entry and 'session_2' in entry:
-            todo_sessions.append((entry['session_id'] + '_1', entry['session_1']))
-            todo_sessions.append((entry['session_id'] + '_2', entry['session_2']))
-        elif 'old_session' in entry and 'new_session' in entry:
-            todo_sessions.append((entry['session_id'] + '_1', entry['old_session']))
-            todo_sessions.append((entry['session_id'] + '_2', entry['new_session']))
-
-    todo_sessions = [(i, s) for i, s in todo_sessions if i not in data]
-    for i, entry in tqdm(todo_sessions):
-        expansion = summarize_session(entry, model_name)
-        data[i] = expansion
-        print({i: expansion})
-        
-    json.dump(data, open(cache_file, 'w'))
+    runner = ExpansionRunner(cache_file, SUMMARIZATION_PROMPT, max_concurrency=32)
+    runner.run(collect_todo_sessions(in_data),
+               lambda sess_entry, prompt_template: summarize_session(sess_entry, model_name, prompt_template))
@@ -0,0 +1,119 @@
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tqdm import tqdm
+import openai
+import backoff
+
+
+@backoff.on_exception(backoff.constant, (openai.RateLimitError),
+                      interval=5)
+def chat_completions_with_backoff(client, **kwargs):
+    return client.chat.completions.create(**kwargs)
+
+
+def collect_todo_sessions(in_data):
+    todo_sessions = []
+    for entry in in_data:
+        if 'session' in entry:
+            todo_sessions.append((entry['session_id'], entry['session']))
+        elif 'sessions' in entry:
+            for i, s in enumerate(entry['sessions']):
+                todo_sessions.append((entry['session_id'] + f'_{i+1}', s))
+        elif 'session_1' in entry and 'session_2' in entry:
+            todo_sessions.append((entry['session_id'] + '_1', entry['session_1']))
+            todo_sessions.append((entry['session_id'] + '_2', entry['session_2']))
+        elif 'old_session' in entry and 'new_session' in entry:
+            todo_sessions.append((entry['session_id'] + '_1', entry['old_session']))
+            todo_sessions.append((entry['session_id'] + '_2', entry['new_session']))
+    return todo_sessions
+
+
+class ExpansionRunner:
+    """
+    Runs an expansion function over many items with bounded concurrency.
+    Every finished item is appended to a jsonl journal (cache_file + '.jsonl') right away, so an interrupted run
+    resumes without redoing work. Items are deduplicated by a hash of the prompt template and the item content;
+    identical sessions are expanded once and the result is shared across their ids.
+    The consolidated {item_id: expansion} dict is written to cache_file at the end, as before.
+    """
+    def __init__(self, cache_file, prompt_template, max_concurrency=32):
+        self.cache_file = cache_file
+        self.journal_file = cache_file + '.jsonl'
+        self.prompt_template = prompt_template
+        self.max_concurrency = max_concurrency
+        self.lock = threading.Lock()
+
+        self.id2expansion, self.hash2expansion = {}, {}
+        if os.path.isfile(self.cache_file):
+            # consolidated cache from a previous run (or from the older single-dump scripts)
+            self.id2expansion.update(json.load(open(self.cache_file)))
+            print('Loaded:', self.cache_file)
+        if os.path.isfile(self.journal_file):
+            n_loaded, valid_size = 0, 0
+            with open(self.journal_file, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # torn last line from an interrupted run
+                        break
+                    self.id2expansion[record['id']] = record['expansion']
+                    self.hash2expansion[record['hash']] = record['expansion']
+                    n_loaded += 1
+                    valid_size += len(line)
+            if valid_size < os.path.getsize(self.journal_file):
+                # drop the torn tail so new records start on a fresh line
+                with open(self.journal_file, 'r+b') as f:
+                    f.truncate(valid_size)
+            print('Loaded {} journaled expansions from {}'.format(n_loaded, self.journal_file))
+
+    def content_hash(self, item):
+        payload = self.prompt_template + '\n' + json.dumps(item, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _record(self, journal_f, item_ids, item_hash, expansion):
+        with self.lock:
+            self.hash2expansion[item_hash] = expansion
+            for item_id in item_ids:
+                self.id2expansion[item_id] = expansion
+                print(json.dumps({'id': item_id, 'hash': item_hash, 'expansion': expansion}), file=journal_f)
+            journal_f.flush()
+
+    def run(self, todo_items, expand_fn):
+        """
+        todo_items: list of (item_id, item) pairs.
+        expand_fn(item, prompt_template) -> json-serializable expansion.
+        Returns the {item_id: expansion} dict covering cached and newly expanded items.
+        """
+        hash2ids, hash2item = {}, {}
+        with open(self.journal_file, 'a') as journal_f:
+            for item_id, item in todo_items:
+                if item_id in self.id2expansion:
+                    continue
+                item_hash = self.content_hash(item)
+                if item_hash in self.hash2expansion:
+                    self._record(journal_f, [item_id], item_hash, self.hash2expansion[item_hash])
+                    continue
+                hash2ids.setdefault(item_hash, []).append(item_id)
+                hash2item[item_hash] = item
+            print('{} items to expand ({} unique contents)'.format(sum(len(v) for v in hash2ids.values()), len(hash2ids)))
+
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                futures = {executor.submit(expand_fn, hash2item[item_hash], self.prompt_template): item_hash
+                           for item_hash in hash2ids}
+                for future in tqdm(as_completed(futures), total=len(futures)):
+                    item_hash = futures[future]
+                    self._record(journal_f, hash2ids[item_hash], item_hash, future.result())
+
+        self.save()
+        return self.id2expansion
+
+    def save(self):
+        # atomic rename so a crash never leaves a half-written cache_file behind
+        tmp_file = self.cache_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self.id2expansion, f)
+        os.replace(tmp_file, self.cache_file)
@@ -45,3 +45,76 @@ def evaluate_retrieval_turn2session(rankings, correct_docs, corpus_ids, k=10):
 
     return evaluate_retrieval(rankings, correct_docs, corpus_ids, k=effective_k)
 
+
+def _strip_turn_id(docid):
+    return '_'.join(docid.split('_')[:-1])
+
+
+def _dcg_discounts(n):
+    return np.concatenate([np.ones(min(n, 1)), 1. / np.log2(np.arange(2, n + 1))])
+
+
+def evaluate_retrieval_multi_k(rankings, correct_docs, corpus_ids, ks=(1, 3, 5, 10, 30, 50), turn2session=False):
+    """
+    Vectorized equivalent of calling evaluate_retrieval (or evaluate_retrieval_turn2session if turn2session=True)
+    once per k in ks. Relevance is computed once per question as a boolean array over ranks.
+    Returns a dict with 'recall_any@k', 'recall_all@k' and 'ndcg_any@k' for every k.
+    """
+    if hasattr(rankings, 'cpu'):
+        rankings = rankings.cpu().numpy()
+    rankings = np.asarray(rankings, dtype=np.int64)
+    if turn2session:
+        correct_docs = set(_strip_turn_id(x) for x in correct_docs)
+        corpus_ids = [_strip_turn_id(x) for x in corpus_ids]
+    else:
+        correct_docs = set(correct_docs)
+
+    # integer codes for the (possibly session-level) ids, with correct docs first
+    id2code = {doc_id: i for i, doc_id in enumerate(correct_docs)}
+    codes = np.fromiter((id2code.setdefault(doc_id, len(id2code)) for doc_id in corpus_ids),
+                        dtype=np.int64, count=len(corpus_ids))
+    n_correct = len(correct_docs)
+    relevances = codes < n_correct
+    ranked_codes = codes[rankings]
+    ranked_relevances = relevances[rankings]
+    n = ranked_codes.size
+
+    # first rank at which each code is retrieved
+    not_retrieved = np.iinfo(np.int64).max
+    first_rank = np.full(len(id2code), not_retrieved, dtype=np.int64)
+    np.minimum.at(first_rank, ranked_codes, np.arange(n))
+    # recall_all@k holds iff every correct doc shows up before rank k
+    last_correct_rank = first_rank[:n_correct].max() if n_correct else -1
+    first_relevant_rank = np.argmax(ranked_relevances) if ranked_relevances.any() else not_retrieved
+
+    # same discounting as dcg: rank 1 is undiscounted, rank i >= 2 is divided by log2(i)
+    discounts = _dcg_discounts(n)
+    dcg_cumsum = np.cumsum(ranked_relevances * discounts)
+    n_relevant = int(relevances.sum())
+    ideal_cumsum = np.cumsum(_dcg_discounts(n_relevant))
+
+    if turn2session:
+        # unique session count among the top-e ranks, used to widen k to k unique sessions
+        is_first = np.zeros(n, dtype=bool)
+        is_first[first_rank[first_rank != not_retrieved]] = True
+        unique_cumsum = np.cumsum(is_first)
+
+    metrics = {}
+    for k in ks:
+        effective_k = k
+        if turn2session and k <= n:
+            effective_k = int(np.searchsorted(unique_cumsum, k)) + 1
+        cutoff = min(effective_k, n)
+        recall_any = float(n_correct > 0 and first_relevant_rank < effective_k)
+        recall_all = float(last_correct_rank < effective_k)
+        ideal_k = min(effective_k, n_relevant)
+        if ideal_k == 0:
+            ndcg_any = 0.
+        else:
+            ndcg_any = float(dcg_cumsum[cutoff - 1] / ideal_cumsum[ideal_k - 1])
+        metrics.update({
+            'recall_any@{}'.format(k): recall_any,
+            'recall_all@{}'.format(k): recall_all,
+            'ndcg_any@{}'.format(k): ndcg_any
+        })
+    return metrics
@@ -14,9 +14,7 @@ def fetch_expansion_from_cache(index_expansion_result_cache, cur_sess_id):
     return cur_expansion
     
 
-def resolve_expansion(expansion_type, resolution_strategy, 
-                      existing_corpus, existing_corpus_ids, existing_corpus_timestamps,
-                      cur_item_expansions, cur_sess_id, ts):
+def preprocess_expansion(expansion_type, resolution_strategy, cur_item_expansions):
     # preprocess and split expansion, if applicable
     if expansion_type == 'session-summ':
         # print(cur_item_expansions)
@@ -44,38 +42,71 @@ def resolve_expansion(expansion_type, resolution_strategy,
                 cur_item_expansions = []
     else:
         raise NotImplementedError
+    return cur_item_expansions
+
+
+def resolve_expansions(expansion_type, resolution_strategy,
+                       existing_corpus, existing_corpus_ids, existing_corpus_timestamps,
+                       expansions):
+    """
+    Apply all expansions of a haystack in a single pass over the corpus.
+    expansions: list of (cur_item_expansions, cur_sess_id, ts), in the order resolve_expansion would be called.
+    The output is identical to calling resolve_expansion once per expansion, but costs O(corpus + expansions)
+    instead of O(corpus * expansions).
+    """
+    expansions = [(preprocess_expansion(expansion_type, resolution_strategy, cur_item_expansions), cur_sess_id, ts)
+                  for cur_item_expansions, cur_sess_id, ts in expansions]
 
-    # merge expansion with the main items
     if 'separate' in resolution_strategy:
-        existing_corpus += [str(x) for x in cur_item_expansions]
-        existing_corpus_ids += [cur_sess_id for _ in cur_item_expansions]
-        existing_corpus_timestamps += [ts for _ in cur_item_expansions]
-    elif 'merge' in resolution_strategy or 'replace' in resolution_strategy:
-        out_corpus, out_corpus_ids, out_corpus_timestamps = [], [], []
-        N = len(existing_corpus_ids)
-        for i in range(N):
-            if existing_corpus_ids[i] == cur_sess_id:
-                if 'merge' in resolution_strategy:
-                    for expansion_item in cur_item_expansions:
-                        out_corpus.append(expansion_item + ' ' + existing_corpus[i])
-                        #print(existing_corpus[i], '--->', expansion_item + ' ' + existing_corpus[i])
-                        #print('\n\n+++\n\n')
-                        out_corpus_ids.append(existing_corpus_ids[i])
-                        out_corpus_timestamps.append(existing_corpus_timestamps[i])
-                elif 'replace' in resolution_strategy:
-                    for expansion_item in cur_item_expansions:
-                        out_corpus.append(expansion_item)  # different
-                        out_corpus_ids.append(existing_corpus_ids[i])
-                        out_corpus_timestamps.append(existing_corpus_timestamps[i])
-                else:
-                    raise NotImplementedError
-            else:
-                out_corpus.append(existing_corpus[i])
-                out_corpus_ids.append(existing_corpus_ids[i])
-                out_corpus_timestamps.append(existing_corpus_timestamps[i])
-        existing_corpus, existing_corpus_ids, existing_corpus_timestamps = out_corpus, out_corpus_ids, out_corpus_timestamps
+        out_corpus = list(existing_corpus)
+        out_corpus_ids = list(existing_corpus_ids)
+        out_corpus_timestamps = list(existing_corpus_timestamps)
+        for cur_item_expansions, cur_sess_id, ts in expansions:
+            out_corpus += [str(x) for x in cur_item_expansions]
+            out_corpus_ids += [cur_sess_id for _ in cur_item_expansions]
+            out_corpus_timestamps += [ts for _ in cur_item_expansions]
+        return out_corpus, out_corpus_ids, out_corpus_timestamps
+
+    if 'merge' in resolution_strategy:
+        merge = True
+    elif 'replace' in resolution_strategy:
+        merge = False
     else:
         raise NotImplementedError
-    
-    return existing_corpus, existing_corpus_ids, existing_corpus_timestamps
-    
+
+    # id -> positions index; an id expanded more than once has its expansions applied in call order
+    id2positions = {}
+    for i, doc_id in enumerate(existing_corpus_ids):
+        id2positions.setdefault(doc_id, []).append(i)
+    id2expansions = {}
+    for cur_item_expansions, cur_sess_id, _ in expansions:
+        if cur_sess_id in id2positions:
+            id2expansions.setdefault(cur_sess_id, []).append(cur_item_expansions)
+
+    out_corpus, out_corpus_ids, out_corpus_timestamps = [], [], []
+    for i, (doc, doc_id, doc_ts) in enumerate(zip(existing_corpus, existing_corpus_ids, existing_corpus_timestamps)):
+        if doc_id not in id2expansions:
+            out_corpus.append(doc)
+            out_corpus_ids.append(doc_id)
+            out_corpus_timestamps.append(doc_ts)
+            continue
+        cur_docs = [doc]
+        for cur_item_expansions in id2expansions[doc_id]:
+            if merge:
+                cur_docs = [expansion_item + ' ' + x for x in cur_docs for expansion_item in cur_item_expansions]
+            else:
+                cur_docs = [expansion_item for _ in cur_docs for expansion_item in cur_item_expansions]
+        out_corpus += cur_docs
+        out_corpus_ids += [doc_id for _ in cur_docs]
+        out_corpus_timestamps += [doc_ts for _ in cur_docs]
+
+    return out_corpus, out_corpus_ids, out_corpus_timestamps
+
+
+def resolve_expansion(expansion_type, resolution_strategy, 
+                      existing_corpus, existing_corpus_ids, existing_corpus_timestamps,
+                      cur_item_expansions, cur_sess_id, ts):
+    # single-item version of resolve_expansions; prefer the batched call when expanding a whole haystack
+    return resolve_expansions(expansion_type, resolution_strategy,
+                              existing_corpus, existing_corpus_ids, existing_corpus_timestamps,
+                              [(cur_item_expansions, cur_sess_id, ts)])
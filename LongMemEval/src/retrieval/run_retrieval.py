@@ -13,8 +13,8 @@ from sentence_transformers import SentenceTransformer, util
 from openai import OpenAI
 from transformers import AutoModel, AutoTokenizer
 from sklearn.preprocessing import normalize
-from src.retrieval.eval_utils import evaluate_retrieval, evaluate_retrieval_turn2session
-from src.retrieval.index_expansion_utils import fetch_expansion_from_cache, resolve_expansion
+from src.retrieval.eval_utils import evaluate_retrieval_multi_k
+from src.retrieval.index_expansion_utils import fetch_expansion_from_cache, resolve_expansions
 
 
 client = OpenAI(
@@ -248,24 +248,22 @@ def batch_get_retrieved_context_and_eval(entry_list, args, index_expansion_resul
 
         if args.index_expansion_method != 'none':
             if index_expansion_result_cache is not None:
+                expansions = []
                 if 'session' in args.index_expansion_method:
                     for cur_sess_id, sess_entry, ts in zip(entry['haystack_session_ids'], entry['haystack_sessions'], entry['haystack_dates']):
                         cur_item_expansions = fetch_expansion_from_cache(index_expansion_result_cache, cur_sess_id)
-                        #print(cur_sess_id)
-                        #print(cur_item_expansions)
-                        corpus, corpus_ids, corpus_timestamps = resolve_expansion(args.index_expansion_method, args.index_expansion_result_join_mode,
-                                                                                  corpus, corpus_ids, corpus_timestamps,
-                                                                                  cur_item_expansions, cur_sess_id, ts)
+                        expansions.append((cur_item_expansions, cur_sess_id, ts))
                 elif 'turn' in args.index_expansion_method:
                     for cur_sess_id, sess_entry, ts in zip(entry['haystack_session_ids'], entry['haystack_sessions'], entry['haystack_dates']):
                         for cur_turn_id, cur_turn_content in enumerate(sess_entry):
                             if cur_turn_content['role'] == 'user':
                                 cur_item_expansions = fetch_expansion_from_cache(index_expansion_result_cache, cur_sess_id + f'_{cur_turn_id+1}')
-                                corpus, corpus_ids, corpus_timestamps = resolve_expansion(args.index_expansion_method, args.index_expansion_result_join_mode,
-                                                                                          corpus, corpus_ids, corpus_timestamps,
-                                                                                          cur_item_expansions, cur_sess_id + f'_{cur_turn_id+1}', ts)
+                                expansions.append((cur_item_expansions, cur_sess_id + f'_{cur_turn_id+1}', ts))
                 else:
                     raise NotImplementedError
+                corpus, corpus_ids, corpus_timestamps = resolve_expansions(args.index_expansion_method, args.index_expansion_result_join_mode,
+                                                                           corpus, corpus_ids, corpus_timestamps,
+                                                                           expansions)
             else:
                 raise NotImplementedError
 
@@ -313,20 +311,11 @@ def batch_get_retrieved_context_and_eval(entry_list, args, index_expansion_resul
                 }
             }
         }
-        for k in [1, 3, 5, 10, 30, 50]:
-            recall_any, recall_all, ndcg_any = evaluate_retrieval(rankings, correct_docs, corpus_ids, k=k)
-            cur_results['retrieval_results']['metrics'][args.granularity].update({
-                'recall_any@{}'.format(k): recall_any,
-                'recall_all@{}'.format(k): recall_all,
-                'ndcg_any@{}'.format(k): ndcg_any
-            })
-            if args.granularity == 'turn':
-                recall_any, recall_all, ndcg_any = evaluate_retrieval_turn2session(rankings, correct_docs, corpus_ids, k=k)
-                cur_results['retrieval_results']['metrics']['session'].update({
-                    'recall_any@{}'.format(k): recall_any,
-                    'recall_all@{}'.format(k): recall_all,
-                    'ndcg_any@{}'.format(k): ndcg_any
-                })
+        cur_results['retrieval_results']['metrics'][args.granularity].update(
+            evaluate_retrieval_multi_k(rankings, correct_docs, corpus_ids, ks=[1, 3, 5, 10, 30, 50]))
+        if args.granularity == 'turn':
+            cur_results['retrieval_results']['metrics']['session'].update(
+                evaluate_retrieval_multi_k(rankings, correct_docs, corpus_ids, ks=[1, 3, 5, 10, 30, 50], turn2session=True))
 
         results.append(cur_results)
 
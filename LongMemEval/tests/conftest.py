@@ -0,0 +1,6 @@
+# conftest.py
+import os
+import sys
+
+# the retrieval modules import each other as src.retrieval.*, relative to the LongMemEval root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
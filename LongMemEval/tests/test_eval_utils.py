@@ -0,0 +1,61 @@
+"""
+Unit tests for evaluate_retrieval_multi_k against the per-k evaluate_retrieval functions.
+
+Run with:
+    pytest LongMemEval/tests/test_eval_utils.py -v
+"""
+
+import numpy as np
+import pytest
+
+from src.retrieval.eval_utils import (
+    evaluate_retrieval,
+    evaluate_retrieval_multi_k,
+    evaluate_retrieval_turn2session,
+)
+
+
+def reference_metrics(rankings, correct_docs, corpus_ids, ks, turn2session=False):
+    evaluate = evaluate_retrieval_turn2session if turn2session else evaluate_retrieval
+    metrics = {}
+    for k in ks:
+        recall_any, recall_all, ndcg_any = evaluate(rankings, correct_docs, corpus_ids, k=k)
+        metrics.update({
+            'recall_any@{}'.format(k): recall_any,
+            'recall_all@{}'.format(k): recall_all,
+            'ndcg_any@{}'.format(k): ndcg_any
+        })
+    return metrics
+
+
+def assert_metrics_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key in expected:
+        assert actual[key] == pytest.approx(expected[key]), key
+
+
+@pytest.mark.parametrize("turn2session", [False, True])
+def test_no_relevant_hits_with_k_beyond_ranking(turn2session):
+    corpus_ids = ['s1_0', 's1_1', 's2_0']
+    correct_docs = ['s3_0']  # not in the corpus, so nothing relevant is ever retrieved
+    rankings = [2, 0, 1]
+    ks = (1, 3, 5, 10)
+
+    metrics = evaluate_retrieval_multi_k(rankings, correct_docs, corpus_ids, ks=ks, turn2session=turn2session)
+
+    assert_metrics_equal(metrics, reference_metrics(rankings, correct_docs, corpus_ids, ks, turn2session))
+    assert metrics['recall_any@10'] == 0.
+
+
+@pytest.mark.parametrize("turn2session", [False, True])
+def test_matches_per_k_evaluation(turn2session):
+    rng = np.random.default_rng(0)
+    ks = (1, 3, 5, 10, 30, 50)
+    for _ in range(50):
+        corpus_ids = ['s{}_{}'.format(rng.integers(8), turn) for turn in range(rng.integers(1, 40))]
+        correct_docs = list(rng.choice(corpus_ids + ['missing_0'], size=rng.integers(0, 4)))
+        rankings = rng.permutation(len(corpus_ids))
+
+        metrics = evaluate_retrieval_multi_k(rankings, correct_docs, corpus_ids, ks=ks, turn2session=turn2session)
+
+        assert_metrics_equal(metrics, reference_metrics(rankings, correct_docs, corpus_ids, ks, turn2session))
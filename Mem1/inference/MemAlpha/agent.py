@@ -157,18 +157,16 @@ class MemoryAgent:
                 self.memory.episodic = state.get('episodic', [])
                 self.conversation_history = state.get('conversation_history', [])
 
-                # Load embedding IDs
-                self.memory.semantic_embedding_ids = state.get('semantic_embedding_ids', [])
-                self.memory.episodic_embedding_ids = state.get('episodic_embedding_ids', [])
-
-                # Load embeddings from npz file if available
+                # Load embeddings (and their IDs) from npz file if available
                 embeddings_file = f"{out_dir}/embeddings.npz"
                 if os.path.exists(embeddings_file):
                     import numpy as np
                     try:
                         embeddings_data = np.load(embeddings_file)
-                        self.memory.semantic_embedding_matrix = embeddings_data.get('semantic_matrix', np.empty((0, 1536)))
-                        self.memory.episodic_embedding_matrix = embeddings_data.get('episodic_matrix', np.empty((0, 1536)))
+                        self.memory.set_embeddings('semantic', state.get('semantic_embedding_ids', []),
+                                                   embeddings_data.get('semantic_matrix', np.empty((0, 1536))))
+                        self.memory.set_embeddings('episodic', state.get('episodic_embedding_ids', []),
+                                                   embeddings_data.get('episodic_matrix', np.empty((0, 1536))))
                         print(f"Loaded embeddings from {embeddings_file}")
                     except Exception as e:
                         print(f"Error loading embeddings from {embeddings_file}: {e}")
@@ -358,6 +356,8 @@ Please only return the query, no other text."""
                         })
                         num_tool_calls += 1
 
+                    # Embed everything the tool calls wrote in one batched request
+                    self.memory.flush_embeddings()
                     print(f"num_tool_calls: {num_tool_calls}")
 
                     # If we're memorizing, return the content from the first message
@@ -398,6 +398,9 @@ Please only return the query, no other text."""
                             }
                         )
 
+                    # Embed everything the tool calls wrote in one batched request
+                    self.memory.flush_embeddings()
+
                     if status == 'memorie':
                         final_response = assistant_msg.content
                         if return_step_info:
@@ -913,30 +916,14 @@ Please only return the query, no other text."""
 
     def _recalculate_embeddings(self, memory_type: str):
         """Recalculate embeddings for a specific memory type"""
-        import numpy as np
-
         memory_list = getattr(self.memory, memory_type)
         if not memory_list:
             return
 
         print(f"Recalculating embeddings for {memory_type} memory ({len(memory_list)} items)...")
 
-        # Reset embedding data
-        setattr(self.memory, f"{memory_type}_embedding_matrix", np.empty((0, 1536)))
-        setattr(self.memory, f"{memory_type}_embedding_ids", [])
-
-        # Recalculate embeddings for each memory item
-        for memory_item in memory_list:
-            for memory_id, content in memory_item.items():
-                embedding = self.memory._get_embedding(content)
-
-                # Add to embedding matrix
-                embedding_matrix = getattr(self.memory, f"{memory_type}_embedding_matrix")
-                embedding_ids = getattr(self.memory, f"{memory_type}_embedding_ids")
-
-                new_matrix = np.vstack([embedding_matrix, embedding.reshape(1, -1)])
-                setattr(self.memory, f"{memory_type}_embedding_matrix", new_matrix)
-                embedding_ids.append(memory_id)
+        # Reset embedding data and re-embed all items in batched requests
+        self.memory.recalculate_embeddings(memory_type)
 
         print(f"Finished recalculating {memory_type} embeddings")
 
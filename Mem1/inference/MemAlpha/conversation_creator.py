@@ -14,6 +14,8 @@ import json
 
 from tqdm import tqdm
 
+from memalpha.chunking import ensure_punkt, get_sentence_chunker
+
 class ConversationCreator():
 
     def __init__(self, dataset, chunk_size=4096):
@@ -90,48 +92,12 @@ class ConversationCreator():
         :return: A list of text chunks, each within the specified token limit.
         """
 
-        # Initialize the tokenizer/encoding for the model
-        try:
-            encoding = tiktoken.encoding_for_model(model_name)
-        except KeyError:
-            # Fallback if the model is not recognized by tiktoken
-            encoding = tiktoken.encoding_for_model("gpt-4o-mini")
-
-        # Break the text into sentences
-        sentences = nltk.sent_tokenize(text)
-
-        chunks = []
-        current_chunk = []
-        current_chunk_token_count = 0
-
-        for sentence in sentences:
-            # Count tokens in this sentence
-            sentence_tokens = encoding.encode(sentence, allowed_special={'<|endoftext|>'})
-            sentence_token_count = len(sentence_tokens)
-
-            # If adding this sentence exceeds the chunk_size, start a new chunk
-            if current_chunk_token_count + sentence_token_count > chunk_size:
-                # Push the current chunk as a single string
-                chunks.append(" ".join(current_chunk))
-                # Start a new chunk
-                current_chunk = [sentence]
-                current_chunk_token_count = sentence_token_count
-            else:
-                # Add this sentence to the current chunk
-                current_chunk.append(sentence)
-                current_chunk_token_count += sentence_token_count
-
-        # Add the last chunk if there is any leftover
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
-
-        return chunks
+        return get_sentence_chunker(model_name).chunk_text(text, chunk_size, separator=" ", count_separator=False)
 
     def chunks(self):
 
-        # Ensure the NLTK Punkt tokenizer is downloaded
-        nltk.download('punkt', quiet=True)
-        nltk.download('punkt_tab')
+        # Ensure the NLTK Punkt tokenizer is available (downloaded only if missing)
+        ensure_punkt()
 
         if self.dataset_name == 'memalpha' or self.dataset_name == 'memalpha_train' or self.dataset_name == 'memalpha_sample':
 
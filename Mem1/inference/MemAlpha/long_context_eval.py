@@ -11,13 +11,12 @@ import numpy as np
 import pandas as pd
 from tqdm import tqdm
 from datetime import datetime
-from rank_bm25 import BM25Okapi
 from typing import List, Dict, Any
 from openai import AzureOpenAI, OpenAI
-import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from memalpha.utils import evaluate_eurlex
+from memalpha.bm25_index import BM25Index
 from memalpha.llm_agent.metrics import evaluate_wrt_source, _extract_answer_from_response
-from openrouter_worker import init_openrouter_worker, run_openrouter_completion
 
 import aiohttp
 import asyncio
@@ -59,6 +58,12 @@ class LongContextEvaluator:
         self.force_rescore = force_rescore
         self.token_counter = AutoTokenizer.from_pretrained("Qwen/Qwen3-32B")
 
+        # call_model_batch dispatch: mini-batches (local server) or single prompts (OpenRouter) kept in
+        # flight on long-lived worker threads that share self.client and its connection pool
+        self.max_inflight_batches = 4
+        self.openrouter_concurrency = 32
+        self._dispatch_executors = {}
+
         # Load data source specific prompts
         try:
             with open('config/prompts_wrt_datasource.yaml', 'r') as f:
@@ -190,6 +195,8 @@ Your answer:
         # Checkpoint functionality
         self.checkpoint_dir = "results/checkpoints"
         os.makedirs(self.checkpoint_dir, exist_ok=True)
+        # Per data type: scores as last journaled (one per result) and number of records in the journal
+        self._checkpoint_state = {}
 
         # Results functionality
         self.results_dir = "results"
@@ -206,33 +213,49 @@ Your answer:
 
     def _bm25_search_chunks(self, chunks: List[str], query: str, top_k: int = 2) -> List[str]:
         """Search for top-k chunks using BM25 ranking algorithm."""
-        if not chunks or not query.strip():
-            return chunks[:top_k] if chunks else []
-
-        # Tokenize query
-        query_tokens = self._tokenize(query)
-        if not query_tokens:
-            return chunks[:top_k] if chunks else []
-
-        # Tokenize all chunks
-        tokenized_chunks = [self._tokenize(chunk) for chunk in chunks]
-
-        # Create BM25 object
-        bm25 = BM25Okapi(tokenized_chunks)
-
-        # Get scores for the query
-        chunk_scores = bm25.get_scores(query_tokens)
-
-        # Create list of (chunk, score) pairs
-        chunk_score_pairs = list(zip(chunks, chunk_scores))
-
-        # Sort by score descending
-        chunk_score_pairs.sort(key=lambda x: x[1], reverse=True)
-
-        # Return top-k chunks
-        top_chunks = [chunk for chunk, score in chunk_score_pairs[:top_k]]
+        return self._bm25_search_chunks_batch(chunks, [query], top_k=top_k)[0]
+
+    def _bm25_search_chunks_batch(self, chunks: List[str], queries: List[str], top_k: int = 2) -> List[List[str]]:
+        """Top-k chunks for each query, scoring all queries against one BM25 index of the sample's chunks.
+
+        Same ranking as sorting BM25Okapi scores in descending order (ties keep chunk order), but the
+        chunks are tokenized and indexed once per sample instead of once per question.
+        """
+        if not chunks:
+            return [[] for _ in queries]
+
+        # Queries without any token fall back to the first chunks, as before
+        scored_queries = [query for query in queries if self._tokenize(query)]
+        index = BM25Index()
+        index.sync(chunks)
+        batch_scores = iter(index.get_batch_scores(scored_queries))
+
+        # Identical chunks share one index entry and score
+        chunk_positions = {}
+        for i, chunk in enumerate(chunks):
+            chunk_positions.setdefault(chunk, []).append(i)
+
+        results = []
+        for query in queries:
+            if not self._tokenize(query):
+                results.append(chunks[:top_k])
+                continue
+            chunk_scores = np.zeros(len(chunks))
+            for chunk, score in next(batch_scores).items():
+                chunk_scores[chunk_positions[chunk]] = score
+            results.append([chunks[i] for i in self._top_k_indices(chunk_scores, top_k)])
+        return results
 
-        return top_chunks
+    @staticmethod
+    def _top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+        """Indices of the top_k scores in descending order (stable), via a partial selection"""
+        if top_k >= len(scores):
+            return np.argsort(-scores, kind='stable')
+        kth_score = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+        above = np.flatnonzero(scores > kth_score)
+        ties = np.flatnonzero(scores == kth_score)[:top_k - len(above)]
+        candidates = np.concatenate([above, ties])
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
 
     def _get_results_filename(self, dataset):
         """Get results filename based on model and dataset"""
@@ -316,38 +339,27 @@ Your answer:
         dataset_suffix = f"_{self.dataset_name}" if getattr(self, "dataset_name", None) else ""
         return os.path.join(
             self.checkpoint_dir,
-            f"{safe_model_name}{chunks_suffix}{dataset_suffix}_{data_type}_checkpoint.json"
+            f"{safe_model_name}{chunks_suffix}{dataset_suffix}_{data_type}_checkpoint.jsonl"
         )
 
-    def _save_checkpoint(self, results, data_type="test"):
-        """Save current progress to checkpoint file with backup and atomic write"""
-        checkpoint_data = {
+    def _compact_checkpoint(self, results, data_type="test"):
+        """Rewrite the checkpoint journal as a header plus one record per result, with an atomic rename"""
+        checkpoint_file = self._get_checkpoint_filename(data_type)
+        temp_file = checkpoint_file + ".tmp"
+        header = {
             "model": self.model,
             "without_chunks": self.without_chunks,
-            "results": results,
             "timestamp": datetime.now().isoformat()
         }
 
-        checkpoint_file = self._get_checkpoint_filename(data_type)
-        temp_file = checkpoint_file + ".tmp"
-        backup_file = checkpoint_file + ".backup"
-
         try:
-            # Write to temporary file first
             with open(temp_file, "w") as f:
-                json.dump(checkpoint_data, f, indent=2)
-
-            # Create backup of existing checkpoint if it exists
-            if os.path.exists(checkpoint_file):
-                if os.path.exists(backup_file):
-                    os.remove(backup_file)  # Remove old backup
-                os.rename(checkpoint_file, backup_file)
-
-            # Atomically move temp file to final location
-            os.rename(temp_file, checkpoint_file)
-
-            print(f"Checkpoint saved: {len(results)} results")
-
+                f.write(json.dumps(header) + "\n")
+                for i, result in enumerate(results):
+                    f.write(json.dumps({"i": i, "result": result}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, checkpoint_file)
         except Exception as e:
             print(f"Error saving checkpoint: {str(e)}")
             # Clean up temp file if it exists
@@ -355,93 +367,161 @@ Your answer:
                 os.remove(temp_file)
             raise
 
+        self._checkpoint_state[data_type] = {
+            "scores": [result.get('score') for result in results],
+            "num_records": len(results)
+        }
+
+    def _save_checkpoint(self, results, data_type="test"):
+        """Save current progress by appending new and newly scored results to the checkpoint journal.
+
+        The journal (jsonl) is a header line followed by {"i": position, "result": ...} records; a later
+        record for the same position replaces an earlier one. Results are only appended to the list and
+        later get their score filled in, so a result is journaled again only when it is new or its score
+        changed, and a save costs O(new results) in I/O. The journal is compacted once stale records
+        outnumber live ones.
+        """
+        checkpoint_file = self._get_checkpoint_filename(data_type)
+        state = self._checkpoint_state.get(data_type)
+        if state is None or len(results) < len(state["scores"]) or not os.path.exists(checkpoint_file):
+            # No journal for this list of results yet
+            self._compact_checkpoint(results, data_type)
+            print(f"Checkpoint saved: {len(results)} results")
+            return
+
+        journaled_scores = state["scores"]
+        positions = [i for i in range(len(journaled_scores)) if results[i].get('score') != journaled_scores[i]]
+        positions.extend(range(len(journaled_scores), len(results)))
+        if positions:
+            with open(checkpoint_file, "a") as f:
+                f.write("".join(json.dumps({"i": i, "result": results[i]}) + "\n" for i in positions))
+                f.flush()
+                os.fsync(f.fileno())
+            journaled_scores.extend([None] * (len(results) - len(journaled_scores)))
+            for i in positions:
+                journaled_scores[i] = results[i].get('score')
+            state["num_records"] += len(positions)
+
+        if state["num_records"] > 2 * max(len(results), 1000):
+            self._compact_checkpoint(results, data_type)
+
+        print(f"Checkpoint saved: {len(results)} results ({len(positions)} records appended)")
+
+    def _read_checkpoint(self, checkpoint_file):
+        """Stream a checkpoint journal into (header, results, number of records).
+
+        A torn final line from an interrupted save is dropped and truncated away.
+        """
+        results = []
+        num_records = 0
+        with open(checkpoint_file, "rb") as f:
+            header_line = f.readline()
+            if not header_line.endswith(b"\n"):
+                raise ValueError("Checkpoint header is incomplete")
+            header = json.loads(header_line)
+            valid_size = len(header_line)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                i = record["i"]
+                if i < len(results):
+                    results[i] = record["result"]
+                elif i == len(results):
+                    results.append(record["result"])
+                else:
+                    raise KeyError(f"Checkpoint record for position {i} precedes position {len(results)}")
+                num_records += 1
+                valid_size += len(line)
+
+        if valid_size < os.path.getsize(checkpoint_file):
+            print(f"Truncating torn checkpoint record in {checkpoint_file}")
+            with open(checkpoint_file, "r+b") as f:
+                f.truncate(valid_size)
+        return header, results, num_records
+
     def _load_checkpoint(self, data_type="test"):
         """Load existing checkpoint if available"""
         checkpoint_file = self._get_checkpoint_filename(data_type)
+        legacy_file = os.path.splitext(checkpoint_file)[0] + ".json"
+        results = None
 
         if os.path.exists(checkpoint_file):
             try:
-                with open(checkpoint_file, "r") as f:
+                header, journal_results, num_records = self._read_checkpoint(checkpoint_file)
+                if (header.get("model") == self.model and
+                    header.get("without_chunks") == self.without_chunks):
+                    results = journal_results
+                    self._checkpoint_state[data_type] = {
+                        "scores": [result.get('score') for result in results],
+                        "num_records": num_records
+                    }
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Warning: Corrupted checkpoint file detected: {str(e)}")
+                corrupted_file = checkpoint_file + f".corrupted.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                os.rename(checkpoint_file, corrupted_file)
+                print(f"Moved corrupted checkpoint to: {corrupted_file}")
+                print("Starting fresh without checkpoint...")
+        elif os.path.exists(legacy_file):
+            # Checkpoint written as a single JSON document by older versions; continue it as a journal
+            try:
+                with open(legacy_file, "r") as f:
                     checkpoint_data = json.load(f)
-
                 if (checkpoint_data.get("model") == self.model and
                     checkpoint_data.get("without_chunks") == self.without_chunks):
                     results = checkpoint_data.get("results", [])
-                    print(f"Loading checkpoint: {len(results)} results")
-
-                    # Force rescore if requested - set all scores to None
-                    if self.force_rescore:
-                        for result in results:
-                            if result.get('predicted_answer'):  # Only rescore if we have a predicted answer
-                                result['score'] = None
-                        print(f"Force rescore enabled: will recompute scores for all {len(results)} results")
-                    else:
-                        # Check if any results need score computation
-                        missing_scores = sum(1 for r in results if r.get('score') is None)
-                        if missing_scores > 0:
-                            print(f"Found {missing_scores} results without scores, will recompute them")
-
-                    return results
+                    self._compact_checkpoint(results, data_type)
+                    print(f"Converted checkpoint {legacy_file} to journal {checkpoint_file}")
             except (json.JSONDecodeError, KeyError, TypeError) as e:
-                print(f"Warning: Corrupted checkpoint file detected: {str(e)}")
+                print(f"Warning: Could not read checkpoint {legacy_file}: {str(e)}")
 
-                # Try to recover from backup if it exists
-                backup_file = checkpoint_file + ".backup"
-                if os.path.exists(backup_file):
-                    try:
-                        print(f"Attempting to load backup checkpoint: {backup_file}")
-                        with open(backup_file, "r") as f:
-                            backup_data = json.load(f)
-
-                        if (backup_data.get("model") == self.model and
-                            backup_data.get("without_chunks") == self.without_chunks):
-                            results = backup_data.get("results", [])
-                            print(f"Successfully loaded backup checkpoint: {len(results)} results")
-
-                            # Move corrupted file to .corrupted extension
-                            corrupted_file = checkpoint_file + ".corrupted"
-                            os.rename(checkpoint_file, corrupted_file)
-                            print(f"Moved corrupted file to: {corrupted_file}")
+        if results is None:
+            return []
 
-                            return results
-                    except Exception as backup_e:
-                        print(f"Backup checkpoint also corrupted: {str(backup_e)}")
+        print(f"Loading checkpoint: {len(results)} results")
 
-                # If no backup or backup also corrupted, move corrupted file and start fresh
-                corrupted_file = checkpoint_file + f".corrupted.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                os.rename(checkpoint_file, corrupted_file)
-                print(f"Moved corrupted checkpoint to: {corrupted_file}")
-                print("Starting fresh without checkpoint...")
+        # Force rescore if requested - set all scores to None
+        if self.force_rescore:
+            for result in results:
+                if result.get('predicted_answer'):  # Only rescore if we have a predicted answer
+                    result['score'] = None
+            print(f"Force rescore enabled: will recompute scores for all {len(results)} results")
+        else:
+            # Check if any results need score computation
+            missing_scores = sum(1 for r in results if r.get('score') is None)
+            if missing_scores > 0:
+                print(f"Found {missing_scores} results without scores, will recompute them")
 
-        return []
+        return results
 
     def _validate_checkpoint_integrity(self, checkpoint_file):
-        """Validate that a checkpoint file is not corrupted"""
+        """Validate that a checkpoint file is not corrupted (a torn final record is tolerated)"""
         if not os.path.exists(checkpoint_file):
             return False
 
         try:
-            with open(checkpoint_file, "r") as f:
-                data = json.load(f)
-
-            # Check required fields
-            required_fields = ["model", "without_chunks", "results", "timestamp"]
-            for field in required_fields:
-                if field not in data:
-                    return False
-
-            # Check that results is a list
-            if not isinstance(data["results"], list):
-                return False
-
-            # Check that each result has required fields
-            for result in data["results"]:
-                if not isinstance(result, dict):
-                    return False
+            with open(checkpoint_file, "rb") as f:
+                header = json.loads(f.readline())
+
+                # Check required header fields
+                for field in ["model", "without_chunks", "timestamp"]:
+                    if field not in header:
+                        return False
+
+                # Check that each result has required fields, streaming one record at a time
                 required_result_fields = ["data_source", "question", "answer", "predicted_answer"]
-                for field in required_result_fields:
-                    if field not in result:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    result = json.loads(line)["result"]
+                    if not isinstance(result, dict):
                         return False
+                    for field in required_result_fields:
+                        if field not in result:
+                            return False
 
             return True
         except Exception:
@@ -871,21 +951,7 @@ Your answer:
         """Call the Azure OpenAI or Qwen model"""
         if self.model == "qwen3-32b" or self.model == "qwen3-32b-bm25":
             # For Qwen model, convert messages to prompt using tokenizer
-            prompt = self.tokenizer.apply_chat_template(
-                messages,
-                tokenize=False,
-                add_generation_prompt=True
-            )
-
-            # Check token length and truncate if necessary (30k token limit)
-            max_input_tokens = 30000
-            prompt_tokens = self.tokenizer(prompt, return_tensors=None, add_special_tokens=False)['input_ids']
-
-            if len(prompt_tokens) > max_input_tokens:
-                print(f"Warning: Input length ({len(prompt_tokens)} tokens) exceeds 30k limit, truncating to last 30k tokens")
-                # Keep the last 30k tokens
-                truncated_tokens = prompt_tokens[-max_input_tokens:]
-                prompt = self.tokenizer.decode(truncated_tokens, skip_special_tokens=False)
+            prompt = self._render_qwen_prompt(messages)
 
             response = self.client.completions.create(
                 model=self.model_name,
@@ -935,6 +1001,53 @@ Your answer:
             )
             return response.choices[0].message.content
 
+    def _render_qwen_prompt(self, messages: List[Dict], max_input_tokens=30000) -> str:
+        """Apply the chat template and keep the last max_input_tokens tokens of the prompt"""
+        prompt = self.tokenizer.apply_chat_template(
+            messages,
+            tokenize=False,
+            add_generation_prompt=True
+        )
+
+        # Check token length and truncate if necessary (30k token limit)
+        prompt_tokens = self.tokenizer(prompt, return_tensors=None, add_special_tokens=False)['input_ids']
+
+        if len(prompt_tokens) > max_input_tokens:
+            print(f"Warning: Input length ({len(prompt_tokens)} tokens) exceeds 30k limit, truncating to last 30k tokens")
+            # Keep the last 30k tokens
+            truncated_tokens = prompt_tokens[-max_input_tokens:]
+            prompt = self.tokenizer.decode(truncated_tokens, skip_special_tokens=False)
+        return prompt
+
+    def _get_dispatch_executor(self, max_workers: int) -> ThreadPoolExecutor:
+        """Long-lived worker threads for in-flight requests, created once per concurrency level"""
+        if max_workers not in self._dispatch_executors:
+            self._dispatch_executors[max_workers] = ThreadPoolExecutor(max_workers=max_workers)
+        return self._dispatch_executors[max_workers]
+
+    def _complete_prompts(self, prompts: List[str], max_tokens=2048, temperature=0.1) -> List[str]:
+        """One completions request for a mini-batch of prompts"""
+        resp = self.client.completions.create(
+            model=self.model_name,
+            prompt=prompts,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=False
+        )
+        return [choice.text for choice in resp.choices]
+
+    def _complete_prompt(self, prompts: List[str], max_tokens=2048, temperature=0.1) -> List[str]:
+        """One completions request for a single prompt, sent as a plain string (OpenRouter's prompt format)"""
+        prompt, = prompts
+        resp = self.client.completions.create(
+            model=self.model_name,
+            prompt=prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=False
+        )
+        return [resp.choices[0].text]
+
     def call_model_batch(self, all_messages: List[List[Dict]], max_tokens=2048, temperature=0.1,
                          qwen_batch_size=1024, azure_batch_size=20, memagent_sample_data=None):
         """Call the model in batch mode for better efficiency"""
@@ -953,99 +1066,33 @@ Your answer:
 
         # Prepare prompts based on model type
         if self.model in ["qwen3-32b"] or self.model == "qwen3-32b-bm25" or self.model == 'mem1':
-            # Convert all messages to prompts for Qwen
-            all_prompts = []
-            max_input_tokens = 30000
-
             base_url_obj = getattr(self.client, "base_url", "")
             base_url_str = str(base_url_obj) if base_url_obj else ""
             is_openrouter = self.qwen_is_openrouter or ("openrouter" in base_url_str.lower())
-            openrouter_api_key = self.openrouter_api_key or os.getenv("OPENROUTER_API_KEY", "EMPTY")
 
+            # OpenRouter takes one prompt per request; a local server takes mini-batches
+            batch_size = 1 if is_openrouter else qwen_batch_size
+            max_inflight = self.openrouter_concurrency if is_openrouter else self.max_inflight_batches
+            complete = self._complete_prompt if is_openrouter else self._complete_prompts
+            executor = self._get_dispatch_executor(max_inflight)
+            total_batches = (len(all_messages) + batch_size - 1) // batch_size
+            print(f"Processing {len(all_messages)} prompts in {total_batches} mini-batches of up to {batch_size} "
+                  f"({max_inflight} in flight)")
+
+            # Render and truncate prompts while earlier mini-batches are already in flight
+            futures = []
+            batch_prompts = []
             for messages in tqdm(all_messages, total=len(all_messages)):
-                prompt = self.tokenizer.apply_chat_template(
-                    messages,
-                    tokenize=False,
-                    add_generation_prompt=True
-                )
-
-                # Check token length and truncate if necessary (30k token limit)
-                prompt_tokens = self.tokenizer(prompt, return_tensors=None, add_special_tokens=False)['input_ids']
-
-                if len(prompt_tokens) > max_input_tokens:
-                    print(f"Warning: Input length ({len(prompt_tokens)} tokens) exceeds 30k limit, truncating to last 30k tokens")
-                    # Keep the last 30k tokens
-                    truncated_tokens = prompt_tokens[-max_input_tokens:]
-                    prompt = self.tokenizer.decode(truncated_tokens, skip_special_tokens=False)
-
-                all_prompts.append(prompt)
+                batch_prompts.append(self._render_qwen_prompt(messages))
+                if len(batch_prompts) == batch_size:
+                    futures.append(executor.submit(complete, batch_prompts, max_tokens, temperature))
+                    batch_prompts = []
+            if batch_prompts:
+                futures.append(executor.submit(complete, batch_prompts, max_tokens, temperature))
 
-            # Process in mini-batches to avoid API limits
-            batch_size = qwen_batch_size if not is_openrouter else 32
             all_results = []
-
-            if len(all_prompts) > batch_size:
-                # Process in mini-batches
-                print(f"Processing {len(all_prompts)} prompts in mini-batches of {batch_size}")
-
-                for i in range(0, len(all_prompts), batch_size):
-                    batch_prompts = all_prompts[i:i + batch_size]
-                    batch_num = (i // batch_size) + 1
-                    total_batches = (len(all_prompts) + batch_size - 1) // batch_size
-
-                    print(f"Processing mini-batch {batch_num}/{total_batches} ({len(batch_prompts)} prompts)")
-                    if is_openrouter:
-                        cpu_total = os.cpu_count() or 1
-                        max_workers = max(1, min(len(batch_prompts), max(cpu_total - 1, 1)))
-                        task_args = [
-                            (prompt, max_tokens, temperature) for prompt in batch_prompts
-                        ]
-                        ctx = multiprocessing.get_context("spawn")
-                        with ctx.Pool(
-                            processes=max_workers,
-                            initializer=init_openrouter_worker,
-                            initargs=(base_url_str, openrouter_api_key, self.model_name),
-                        ) as pool:
-                            batch_results = pool.map(run_openrouter_completion, task_args)
-                    else:
-                        resp = self.client.completions.create(
-                            model=self.model_name,
-                            prompt=batch_prompts,
-                            max_tokens=max_tokens,
-                            temperature=temperature,
-                            stream=False
-                        )
-                        # Extract results from this batch
-                        batch_results = [choice.text for choice in resp.choices]
-                    all_results.extend(batch_results)
-            else:
-                # Process all at once if batch size is acceptable
-                print(f"Processing {len(all_prompts)} prompts in single batch")
-                if is_openrouter:
-                    cpu_total = os.cpu_count() or 1
-                    max_workers = max(1, min(len(all_prompts), max(cpu_total - 1, 1)))
-                    task_args = [
-                        (prompt, max_tokens, temperature) for prompt in all_prompts
-                    ]
-                    ctx = multiprocessing.get_context("spawn")
-                    with ctx.Pool(
-                        processes=max_workers,
-                        initializer=init_openrouter_worker,
-                        initargs=(base_url_str, openrouter_api_key, self.model_name),
-                    ) as pool:
-                        all_results = pool.map(run_openrouter_completion, task_args)
-                else:
-                    resp = self.client.completions.create(
-                        model=self.model_name,
-                        prompt=all_prompts,
-                        max_tokens=max_tokens,
-                        temperature=temperature,
-                        stream=False
-                    )
-
-                    # Extract results from response
-                    all_results = [choice.text for choice in resp.choices]
-
+            for future in futures:
+                all_results.extend(future.result())
             return all_results
 
 
@@ -1333,6 +1380,13 @@ Your answer:
                 qa_pairs = json.loads(row['questions_and_answers']) if isinstance(row['questions_and_answers'], str) else row['questions_and_answers']
                 data_source = row.get('data_source', dataset_name)
 
+                if not self.without_chunks and (self.model == "qwen3-32b-bm25" or self.model == "gpt-4o-mini-bm25"):
+                    # BM25 mode: rank this sample's chunks for all of its new questions at once
+                    bm25_questions = [qa_pair.get('question', '') for qa_pair in qa_pairs]
+                    bm25_questions = [question for question in bm25_questions
+                                      if question and self._get_existing_answer(question, data_source) is None]
+                    bm25_top_chunks = dict(zip(bm25_questions, self._bm25_search_chunks_batch(chunks, bm25_questions, top_k=2)))
+
                 # Evaluate each question for this sample
                 for qa_idx, qa_pair in enumerate(qa_pairs):  # Limit to first 5 questions per sample
                     question = qa_pair.get('question', '')
@@ -1366,7 +1420,7 @@ Your answer:
                                 # Standard mode: construct the long-context prompt
                                 if self.model == "qwen3-32b-bm25" or self.model == "gpt-4o-mini-bm25":
                                     # BM25 mode: use BM25 to select top 2 chunks
-                                    context_parts = self._bm25_search_chunks(chunks, question, top_k=2)
+                                    context_parts = bm25_top_chunks[question]
                                 elif self.model == 'mem1':
                                     context_parts = self.mem1_memories[idx]
                                 elif data_source == 'friends':
@@ -9,12 +9,17 @@ import requests
 import openai
 import time
 import multiprocessing as mp
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 from conversation_creator import ConversationCreator
 from agent import MemoryAgent
 from memory import Memory
 from functions import get_memory_tool_schemas
+from memalpha.memory_sessions import apply_memory_changes
+
+# Per-instance log of processed chunks, appended after every chunk and replayed on resume
+CHECKPOINT_FILE = "chunk_checkpoints.jsonl"
 
 def load_agent_config(config_path):
     """Load agent configuration from YAML file."""
@@ -107,7 +112,7 @@ def parse_args():
     parser.add_argument("--load_db_from", type=str, default=None) # Memory databse
     parser.add_argument("--chunk_size", type=int, default=4096, help="Chunk size for MemAgent_Bench dataset")  # add parameter chunk_size
     parser.add_argument("--save_process", action="store_true", help="Enable process tracking for Qwen models (saves detailed logs)")
-    parser.add_argument("--batch_size", type=int, default=32, help="Batch size for batch processing")
+    parser.add_argument("--batch_size", type=int, default=32, help="Number of instances processed concurrently (continuous batching slots)")
     parser.add_argument("--agentic_search", action="store_true", help="Use agentic memory search instead of simple batch processing")
     parser.add_argument("--rollout_label", type=str, default=None, help="Label to append to output directory path, e.g., rollout_1")
     parser.add_argument("--force_reanswer_questions", action="store_true", help="Force reanswering all questions even if results file already exists")
@@ -133,461 +138,403 @@ def parse_args():
     args.exclude_memory = set(normalized_exclusions)
     return args
 
-def run_with_chunks_and_questions_batch(
-        args,
-        agent_config,
-        batch_indices,
-        batch_chunks,
-        batch_queries_and_answers,
-        batch_sources):
-
-    with open('config/prompts_wrt_datasource.yaml', 'r') as f:
-        prompts_wrt_datasource = yaml.safe_load(f)
-
-    batch_size = len(batch_chunks)
-
-    # Get including_core parameter from agent_config, default to False
-    # including_core = agent_config.get('including_core', False)
-    batch_memories = [
-        Memory(
-            including_core=prompts_wrt_datasource[batch_sources[idx]]['including_core'],
-            disabled_memory_types=args.exclude_memory
-        )
-        for idx in range(batch_size)
-    ]
-    memory_agent_template = MemoryAgent(agent_config=agent_config)
-
-    # Check if agent_state.json exists for all batch items
-    batch_out_dirs = []
-    all_states_exist = True
-
-    for i in range(batch_size):
-
-        batch_idx = batch_indices[i]
-
-        # Create output directory path
-        if agent_config.get("model_name") is not None:
-            out_dir = f"./agents/{agent_config['agent_name']}_{agent_config['model_name'].replace('/', '_')}_{args.dataset}"
-        else:
-            out_dir = f"./agents/{agent_config['agent_name']}_{args.dataset}"
-
-        # Add external model info if using external model for question answering
-        if agent_config.get('infer_with_full_memory', False) and agent_config.get('external_model_url'):
-            external_model_name = agent_config.get('external_model_name', 'qwen3-32b').replace('/', '_')
-            out_dir = out_dir + f"_ext_{external_model_name}"
-
-        if not agent_config['enable_thinking']:
-            out_dir = out_dir + "_no_thinking"
-
-        if args.exclude_memory:
-            out_dir = out_dir + "_exclude_" + "_".join(args.exclude_memory)
-
-        # Add max_new_tokens to the directory name
-        max_new_tokens = agent_config.get('max_new_tokens', 2048)
-        out_dir = out_dir + f"_tokens_{max_new_tokens}"
-
-        # Add rollout label if provided
-        if args.rollout_label is not None:
-            out_dir = out_dir + f"_rollout_{args.rollout_label}"
-
-        out_dir += f"/{batch_idx}"
-        batch_out_dirs.append(out_dir)
+class InstanceRun:
+    """Progress of one instance (conversation) through chunk processing and question answering."""
+
+    def __init__(self, batch_idx, chunks, queries_and_answers, source, memory, out_dir):
+        self.batch_idx = batch_idx
+        self.chunks = chunks
+        self.queries_and_answers = queries_and_answers
+        self.source = source
+        self.memory = memory
+        self.out_dir = out_dir
+        self.next_chunk = 0  # index of the next chunk to process
+        self.function_calls_log = []
+        self.final_responses = []
+        self.num_checkpointed_calls = 0  # function calls already written to the checkpoint log
+
+    @property
+    def done(self):
+        return self.next_chunk >= len(self.chunks)
+
+
+def get_instance_out_dir(args, agent_config, batch_idx):
+    """Output directory of one instance."""
+    if agent_config.get("model_name") is not None:
+        out_dir = f"./agents/{agent_config['agent_name']}_{agent_config['model_name'].replace('/', '_')}_{args.dataset}"
+    else:
+        out_dir = f"./agents/{agent_config['agent_name']}_{args.dataset}"
 
-    for i in range(batch_size):
-        out_dir = batch_out_dirs[i]
-        # Check if agent_state.json exists for this batch item
-        if not os.path.exists(f"{out_dir}/agent_state.json"):
-            all_states_exist = False
-            break
+    # Add external model info if using external model for question answering
+    if agent_config.get('infer_with_full_memory', False) and agent_config.get('external_model_url'):
+        external_model_name = agent_config.get('external_model_name', 'qwen3-32b').replace('/', '_')
+        out_dir = out_dir + f"_ext_{external_model_name}"
 
-    # Load existing states if all exist, otherwise process chunks
-    if all_states_exist:
-        print(f"[DEBUG] Loading existing agent states for all batch items, skipping chunk processing...")
+    if not agent_config['enable_thinking']:
+        out_dir = out_dir + "_no_thinking"
 
-        for i in range(batch_size):
-            out_dir = batch_out_dirs[i]
+    if args.exclude_memory:
+        out_dir = out_dir + "_exclude_" + "_".join(args.exclude_memory)
 
-            # Load agent state
-            with open(f"{out_dir}/agent_state.json", "r") as f:
-                state = json.load(f)
+    # Add max_new_tokens to the directory name
+    max_new_tokens = agent_config.get('max_new_tokens', 2048)
+    out_dir = out_dir + f"_tokens_{max_new_tokens}"
 
-            # Restore memory state
-            memory = batch_memories[i]
-            # Only restore core memory if it's available in the memory object
-            if memory.including_core and memory.core is not None:
-                memory.core = state.get('core', [])
+    # Add rollout label if provided
+    if args.rollout_label is not None:
+        out_dir = out_dir + f"_rollout_{args.rollout_label}"
 
-            if memory.is_memory_type_enabled('semantic'):
-                memory.semantic = state.get('semantic', [])
-                memory.semantic_embedding_ids = state.get('semantic_embedding_ids', [])
-            else:
-                memory.semantic = []
-                memory.semantic_embedding_ids = []
+    return out_dir + f"/{batch_idx}"
 
-            if memory.is_memory_type_enabled('episodic'):
-                memory.episodic = state.get('episodic', [])
-                memory.episodic_embedding_ids = state.get('episodic_embedding_ids', [])
-            else:
-                memory.episodic = []
-                memory.episodic_embedding_ids = []
-
-            # Load embeddings if available
-            embeddings_file = f"{out_dir}/embeddings.npz"
-            if os.path.exists(embeddings_file):
-                embeddings = np.load(embeddings_file)
-                if memory.is_memory_type_enabled('semantic'):
-                    memory.semantic_embedding_matrix = embeddings['semantic_matrix']
-                else:
-                    memory.semantic_embedding_matrix = np.array([])
 
-                if memory.is_memory_type_enabled('episodic'):
-                    memory.episodic_embedding_matrix = embeddings['episodic_matrix']
-                else:
-                    memory.episodic_embedding_matrix = np.array([])
-            else:
-                memory.semantic_embedding_matrix = np.array([])
-                memory.episodic_embedding_matrix = np.array([])
+def load_agent_state(memory, out_dir):
+    """Restore memory (and embeddings if saved) from out_dir/agent_state.json."""
+    with open(f"{out_dir}/agent_state.json", "r") as f:
+        state = json.load(f)
 
-        max_chunks = max(len(chunk_list) for chunk_list in batch_chunks) if len(batch_chunks) > 0 else 0
-        print(f"[DEBUG] Loaded existing states, proceeding directly to question answering...")
+    # Only restore core memory if it's available in the memory object
+    if memory.including_core and memory.core is not None:
+        memory.core = state.get('core', [])
 
+    if memory.is_memory_type_enabled('semantic'):
+        memory.semantic = state.get('semantic', [])
     else:
-        print(f"[DEBUG] Not all agent states exist, proceeding with chunk processing...")
-
-        max_chunks = max(len(chunk_list) for chunk_list in batch_chunks) if len(batch_chunks) > 0 else 0
-
-        # Initialize function calls storage for each batch item
-        batch_function_calls_log = [[] for _ in range(batch_size)]
-        batch_final_responses = {i: [] for i in range(batch_size)}
-
-        # Check if we're using gpt-4.1-mini (detected by model_name containing "4.1-mini")
-        use_gpt4_mini = agent_config.get('model_name', '').lower().find('4.1-mini') != -1
-
-        for chunk_idx in range(max_chunks):
+        memory.semantic = []
 
-            print(f"[DEBUG] Processing chunk {chunk_idx + 1}/{max_chunks}")
-
-            max_new_tokens = agent_config.get('max_new_tokens', 2048)
-
-            remaining_indices = []
-            current_chunks = []
-            for i, chunk_list in enumerate(batch_chunks):
-                if chunk_idx < len(chunk_list):
-                    # current_chunks.append(f"\n\nHere is new information to process:\n{chunk_list[chunk_idx]}\n\nPlease analyze this information and decide what memory operations to perform. Maximum response length is {max_new_tokens}, the above chunk has {len(memory_agent_template.tokenizer(chunk_list[chunk_idx]))} tokens.")
-                    # current_chunks.append(prompts_wrt_datasource[batch_sources[i]]['prompt'].format(context=chunk_list[chunk_idx], max_new_tokens=int(max_new_tokens * 0.8)))
-                    current_chunks.append(prompts_wrt_datasource['unified_prompt'].format(context=chunk_list[chunk_idx], max_new_tokens=int(max_new_tokens * 0.8)))
-                    # current_chunks.append(prompts_wrt_datasource['unified_prompt'].format(timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), context=chunk_list[chunk_idx],
-                                # max_new_tokens=int(max_new_tokens * 0.8)))
-                    remaining_indices.append(i)
-
-            if len(remaining_indices) == 0:
+    if memory.is_memory_type_enabled('episodic'):
+        memory.episodic = state.get('episodic', [])
+    else:
+        memory.episodic = []
+
+    # Load embeddings if available
+    embeddings_file = f"{out_dir}/embeddings.npz"
+    embeddings = np.load(embeddings_file) if os.path.exists(embeddings_file) else None
+    for memory_type in ['semantic', 'episodic']:
+        if embeddings is not None and memory.is_memory_type_enabled(memory_type):
+            memory.set_embeddings(memory_type, state.get(f'{memory_type}_embedding_ids', []),
+                                  embeddings[f'{memory_type}_matrix'])
+        else:
+            memory.set_embeddings(memory_type)
+
+
+def _atomic_json_dump(obj, path):
+    # Write to a temporary file and rename, so a crash never leaves a half-written file behind
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def save_agent_state(run):
+    """Save memory state, chunk logs and embeddings of an instance whose chunks are all processed.
+
+    agent_state.json marks the instance as done, so it is written last; the checkpoint log is
+    removed afterwards.
+    """
+    memory = run.memory
+    out_dir = run.out_dir
+
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    # Save memory state
+    state = {
+        'semantic': memory.semantic,
+        'episodic': memory.episodic,
+        'conversation_history': [],
+        'step': len(run.chunks),
+        'semantic_embedding_ids': memory.semantic_embedding_ids,
+        'episodic_embedding_ids': memory.episodic_embedding_ids
+    }
+
+    # Only save core memory if it's available
+    if memory.including_core and memory.core is not None:
+        state['core'] = memory.core
+
+    # Save data instance info
+    data_instance_info = {
+        'data_source': run.source,
+        'global_idx': run.batch_idx
+    }
+    _atomic_json_dump(data_instance_info, f"{out_dir}/data_instance_info.json")
+
+    # Save chunks with their corresponding function calls in a single file
+    chunks_with_function_calls = []
+    for chunk_idx, chunk in enumerate(run.chunks):
+        # Get function calls for this specific chunk
+        chunk_function_calls = [
+            fc for fc in run.function_calls_log
+            if fc.get('chunk_idx') == chunk_idx
+        ]
+
+        chunks_with_function_calls.append({
+            'chunk_idx': chunk_idx,
+            'raw_chunk': chunk,
+            'function_calls': chunk_function_calls
+        })
+
+    _atomic_json_dump(chunks_with_function_calls, f"{out_dir}/chunks_and_function_calls.json")
+    _atomic_json_dump(run.final_responses, f"{out_dir}/final_responses.json")
+
+    # Save embeddings if available
+    if (memory.semantic_embedding_matrix.size > 0 or
+        memory.episodic_embedding_matrix.size > 0):
+        np.savez_compressed(f"{out_dir}/embeddings.tmp.npz",
+                          semantic_matrix=memory.semantic_embedding_matrix,
+                          episodic_matrix=memory.episodic_embedding_matrix)
+        os.replace(f"{out_dir}/embeddings.tmp.npz", f"{out_dir}/embeddings.npz")
+
+    _atomic_json_dump(state, f"{out_dir}/agent_state.json")
+
+    if os.path.exists(f"{out_dir}/{CHECKPOINT_FILE}"):
+        os.remove(f"{out_dir}/{CHECKPOINT_FILE}")
+
+
+def checkpoint_chunk(run):
+    """Append the chunk just processed (memory operations, function calls, response) to the checkpoint log."""
+    if not os.path.exists(run.out_dir):
+        os.makedirs(run.out_dir)
+
+    # Memory records its insert/update/delete operations in checkpoint_changes (replayed with
+    # memalpha/memory_sessions.apply_memory_changes); after a whole-list assignment it has no
+    # operations to replay, and the record holds a full snapshot instead
+    record = {
+        'chunk_idx': run.next_chunk - 1,
+        'function_calls': run.function_calls_log[run.num_checkpointed_calls:],
+        'final_response': run.final_responses[-1]
+    }
+    if run.memory.checkpoint_changes is None:
+        record['memory'] = run.memory.snapshot()
+    else:
+        record['changes'] = run.memory.checkpoint_changes
+    with open(f"{run.out_dir}/{CHECKPOINT_FILE}", "a") as f:
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    run.memory.checkpoint_changes = []
+    run.num_checkpointed_calls = len(run.function_calls_log)
+
+
+def restore_chunk_checkpoints(run):
+    """Replay the checkpoint log of an interrupted instance so it continues from the next unprocessed chunk."""
+    checkpoint_file = f"{run.out_dir}/{CHECKPOINT_FILE}"
+    memory = run.memory
+    memory.checkpoint_changes = []
+    if not os.path.exists(checkpoint_file):
+        return
+
+    snapshot = memory.snapshot()
+    memory_data = {'core': snapshot['core'], 'semantic': list(snapshot['semantic']), 'episodic': list(snapshot['episodic'])}
+    valid_size = 0
+    with open(checkpoint_file, 'rb') as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                # torn last line from an interrupted run
                 break
-
-            if use_gpt4_mini:
-
-                print(f"[DEBUG] Using GPT-4.1-mini with fake batch processing (multiprocessing) for chunk {chunk_idx + 1}")
-
-                # Prepare data for multiprocessing
-                chunk_data_list = []
-                for i, chunk in enumerate(current_chunks):
-                    memory_idx = remaining_indices[i]
-                    memory = batch_memories[memory_idx]
-                    chunk_data_list.append((chunk, memory, agent_config, memory_agent_template))
-
-                # Use ThreadPoolExecutor for fake batch processing (simulating multiprocessing)
-                final_responses = []
-                gpt4_function_calls_list = []
-                with ThreadPoolExecutor(max_workers=min(len(chunk_data_list), 16)) as executor:
-                    futures = [executor.submit(process_chunk_with_gpt4_mini, data) for data in chunk_data_list]
-                    for future in tqdm(futures, desc="Processing chunks", unit="chunk", total=len(futures)):
-                        response, function_calls = future.result()
-                        final_responses.append(response)
-                        gpt4_function_calls_list.append(function_calls)
-
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            if 'memory' in record:
+                memory_data = {'core': record['memory']['core'], 'semantic': record['memory']['semantic'],
+                               'episodic': record['memory']['episodic']}
             else:
+                apply_memory_changes(memory_data, record['changes'])
+            run.function_calls_log.extend(record['function_calls'])
+            run.final_responses.append(record['final_response'])
+            run.next_chunk = record['chunk_idx'] + 1
+            valid_size += len(line)
+    if valid_size < os.path.getsize(checkpoint_file):
+        # drop the torn tail so new records start on a fresh line
+        with open(checkpoint_file, 'r+b') as f:
+            f.truncate(valid_size)
+
+    if memory.including_core and memory.core is not None:
+        memory.core = memory_data['core']
+    memory.semantic = memory_data['semantic']
+    memory.episodic = memory_data['episodic']
+    for memory_type in ['semantic', 'episodic']:
+        if memory.is_memory_type_enabled(memory_type):
+            memory.recalculate_embeddings(memory_type)
+    memory.checkpoint_changes = []
+    run.num_checkpointed_calls = len(run.function_calls_log)
+    print(f"[DEBUG] Restored {run.next_chunk}/{len(run.chunks)} processed chunks of instance {run.batch_idx} from {checkpoint_file}")
+
+
+def generate_chunk_responses(agent_config, memory_agent_template, prompts):
+    """Generate memory agent responses for chunk prompts with vLLM, honoring the thinking budget."""
+    # Import SamplingParams from vLLM for batch processing
+    from vllm import SamplingParams
+
+    if agent_config['enable_thinking']:
+        # First generation until thinking budget
+        thinking_budget = agent_config.get('thinking_budget', 1024)
+        max_new_tokens = agent_config.get('max_new_tokens', 2048)
 
-                prompts = []
-                for chunk, memory in zip(current_chunks, [batch_memories[i] for i in remaining_indices]):
-                    processed_text = MemoryAgent.process_text_with_qwen_pipeline(
-                        text=chunk,
-                        tokenizer=memory_agent_template.tokenizer,
-                        functions=[tool["function"] for tool in get_memory_tool_schemas(memory)],
-                        status='memorie',
-                        enable_thinking=agent_config['enable_thinking'],
-                        return_text=True,
-                        memory=memory
-                    )
-                    prompts.append(processed_text)
-
-                assert agent_config['vllm']
-
-                # Import SamplingParams from vLLM for batch processing
-                from vllm import SamplingParams
-
-                if agent_config['enable_thinking']:
-                    # First generation until thinking budget
-                    thinking_budget = agent_config.get('thinking_budget', 1024)
-                    max_new_tokens = agent_config.get('max_new_tokens', 2048)
-
-                    thinking_sampling_params = SamplingParams(
-                        temperature=0.7,
-                        max_tokens=thinking_budget,
-                        stop_token_ids=[memory_agent_template.tokenizer.eos_token_id]
-                    )
-
-                    outputs = memory_agent_template.model.generate(prompts, thinking_sampling_params)
-                    first_responses = [output.outputs[0].text for output in outputs]
-
-                    # Collect all texts that need second generation
-                    second_gen_indices = []
-                    second_gen_texts = []
-                    has_early_stopping = []  # Track which ones have early stopping text
-                    finished_indices = []
-
-                    early_stopping_text = "\n\nConsidering the limited time by the user, I have to give the solution based on the thinking directly now.\n</think>\n\n"
-
-                    for i, (first_response, prompt) in enumerate(zip(first_responses, prompts)):
-                        # Check if the generation has already finished or thinking process is complete
-                        if (memory_agent_template.tokenizer.eos_token_id not in memory_agent_template.tokenizer(first_response).input_ids
-                            and "</think>" not in first_response):
-                            print(f"thinking budget is reached for prompt {i}")
-                            # Add early stopping text and prepare for batch second generation
-                            continued_text = prompt + first_response + early_stopping_text
-                            second_gen_indices.append(i)
-                            second_gen_texts.append(continued_text)
-                            has_early_stopping.append(True)
-                        elif ("</think>" in first_response
-                              and memory_agent_template.tokenizer.eos_token_id not in memory_agent_template.tokenizer(first_response).input_ids):
-                            # Thinking completed, continue generation after thinking
-                            continued_text = prompt + first_response
-                            second_gen_indices.append(i)
-                            second_gen_texts.append(continued_text)
-                            has_early_stopping.append(False)
-                        else:
-                            # Generation finished or no continuation needed
-                            finished_indices.append(i)
-
-                    # Batch second generation for all texts that need it
-                    second_gen_responses = []
-                    if second_gen_texts:
-                        remaining_sampling_params = SamplingParams(
-                            temperature=0.7,
-                            max_tokens=max_new_tokens - thinking_budget,
-                            stop_token_ids=[memory_agent_template.tokenizer.eos_token_id]
-                        )
-                        second_outputs = memory_agent_template.model.generate(second_gen_texts, remaining_sampling_params)
-                        second_gen_responses = [output.outputs[0].text.strip() for output in second_outputs]
-
-                    # Combine all responses in correct order
-                    final_responses = [None] * len(first_responses)
-
-                    # Fill in second generation responses
-                    for i, idx in enumerate(second_gen_indices):
-                        if has_early_stopping[i]:
-                            # Budget reached case: include early stopping text
-                            final_responses[idx] = first_responses[idx] + early_stopping_text + second_gen_responses[i]
-                        else:
-                            # Thinking complete case: no early stopping text
-                            final_responses[idx] = first_responses[idx] + second_gen_responses[i]
-
-                    # Fill in finished responses
-                    for idx in finished_indices:
-                        final_responses[idx] = first_responses[idx].strip()
-                else:
-                    # Single generation without thinking budget
-                    max_new_tokens = agent_config.get('max_new_tokens', 2048)
-                    sampling_params = SamplingParams(
-                        temperature=0.0,
-                        max_tokens=max_new_tokens,
-                        stop_token_ids=[memory_agent_template.tokenizer.eos_token_id]
-                    )
-                    outputs = memory_agent_template.model.generate(prompts, sampling_params)
-                    final_responses = [output.outputs[0].text.strip() for output in outputs]
-
-            # Batch process responses and execute function calls
-            batch_assistant_messages = []
-            batch_function_calls = []
-
-            # Parse all responses in batch
-            if use_gpt4_mini:
-                # For GPT-4.1-mini, function calls are already executed, just store them
-                for i, (response, memory_idx) in enumerate(zip(final_responses, remaining_indices)):
-                    batch_final_responses[memory_idx].append(response)
-
-                    # Store the already executed function calls
-                    function_calls = gpt4_function_calls_list[i]
-                    for function_call_record in function_calls:
-                        function_call_record['chunk_idx'] = chunk_idx
-                        batch_function_calls_log[memory_idx].append(function_call_record)
+        thinking_sampling_params = SamplingParams(
+            temperature=0.7,
+            max_tokens=thinking_budget,
+            stop_token_ids=[memory_agent_template.tokenizer.eos_token_id]
+        )
 
+        outputs = memory_agent_template.model.generate(prompts, thinking_sampling_params)
+        first_responses = [output.outputs[0].text for output in outputs]
+
+        # Collect all texts that need second generation
+        second_gen_indices = []
+        second_gen_texts = []
+        has_early_stopping = []  # Track which ones have early stopping text
+        finished_indices = []
+
+        early_stopping_text = "\n\nConsidering the limited time by the user, I have to give the solution based on the thinking directly now.\n</think>\n\n"
+
+        for i, (first_response, prompt) in enumerate(zip(first_responses, prompts)):
+            # Check if the generation has already finished or thinking process is complete
+            if (memory_agent_template.tokenizer.eos_token_id not in memory_agent_template.tokenizer(first_response).input_ids
+                and "</think>" not in first_response):
+                print(f"thinking budget is reached for prompt {i}")
+                # Add early stopping text and prepare for batch second generation
+                continued_text = prompt + first_response + early_stopping_text
+                second_gen_indices.append(i)
+                second_gen_texts.append(continued_text)
+                has_early_stopping.append(True)
+            elif ("</think>" in first_response
+                  and memory_agent_template.tokenizer.eos_token_id not in memory_agent_template.tokenizer(first_response).input_ids):
+                # Thinking completed, continue generation after thinking
+                continued_text = prompt + first_response
+                second_gen_indices.append(i)
+                second_gen_texts.append(continued_text)
+                has_early_stopping.append(False)
             else:
-                # For qwen, parse responses and execute function calls
-                for i, (response, memory_idx) in enumerate(zip(final_responses, remaining_indices)):
-                    assistant_messages = memory_agent_template._parse_response(response)
-                    batch_assistant_messages.append((assistant_messages, memory_idx))
-                    batch_final_responses[memory_idx].append(response)
-
-                    # Collect function calls for batch execution
-                    function_calls_messages = [msg for msg in assistant_messages if msg.get("function_call")]
-                    if function_calls_messages:
-                        for assistant_msg in function_calls_messages:
-                            batch_function_calls.append((assistant_msg["function_call"], memory_idx))
-
-            # Execute function calls in batch and collect results (only for qwen)
-            if batch_function_calls and not use_gpt4_mini:
-                for function_call, memory_idx in batch_function_calls:
-                    tool_result = memory_agent_template._run_tool_from_function_call(
-                        function_call,
-                        batch_memories[memory_idx]
-                    )
-                    # Store the function call and result in the appropriate batch item log
-                    function_call_record = {
-                        'function_call': function_call,
-                        'tool_result': tool_result,
-                        'chunk_idx': chunk_idx,
-                        'timestamp': time.time()
-                    }
-                    batch_function_calls_log[memory_idx].append(function_call_record)
-
-        # Save all memory states after chunk processing
-        for i in range(batch_size):
-            batch_idx = batch_indices[i]
-            memory = batch_memories[i]
-            out_dir = batch_out_dirs[i]
-
-            if not os.path.exists(out_dir):
-                os.makedirs(out_dir)
-
-            # Save memory state
-            state = {
-                'semantic': memory.semantic,
-                'episodic': memory.episodic,
-                'conversation_history': [],
-                'step': max_chunks,
-                'semantic_embedding_ids': memory.semantic_embedding_ids,
-                'episodic_embedding_ids': memory.episodic_embedding_ids
-            }
+                # Generation finished or no continuation needed
+                finished_indices.append(i)
+
+        # Batch second generation for all texts that need it
+        second_gen_responses = []
+        if second_gen_texts:
+            remaining_sampling_params = SamplingParams(
+                temperature=0.7,
+                max_tokens=max_new_tokens - thinking_budget,
+                stop_token_ids=[memory_agent_template.tokenizer.eos_token_id]
+            )
+            second_outputs = memory_agent_template.model.generate(second_gen_texts, remaining_sampling_params)
+            second_gen_responses = [output.outputs[0].text.strip() for output in second_outputs]
+
+        # Combine all responses in correct order
+        final_responses = [None] * len(first_responses)
+
+        # Fill in second generation responses
+        for i, idx in enumerate(second_gen_indices):
+            if has_early_stopping[i]:
+                # Budget reached case: include early stopping text
+                final_responses[idx] = first_responses[idx] + early_stopping_text + second_gen_responses[i]
+            else:
+                # Thinking complete case: no early stopping text
+                final_responses[idx] = first_responses[idx] + second_gen_responses[i]
+
+        # Fill in finished responses
+        for idx in finished_indices:
+            final_responses[idx] = first_responses[idx].strip()
+        return final_responses
+
+    # Single generation without thinking budget
+    max_new_tokens = agent_config.get('max_new_tokens', 2048)
+    sampling_params = SamplingParams(
+        temperature=0.0,
+        max_tokens=max_new_tokens,
+        stop_token_ids=[memory_agent_template.tokenizer.eos_token_id]
+    )
+    outputs = memory_agent_template.model.generate(prompts, sampling_params)
+    return [output.outputs[0].text.strip() for output in outputs]
 
-            # Only save core memory if it's available
-            if memory.including_core and memory.core is not None:
-                state['core'] = memory.core
 
-            with open(f"{out_dir}/agent_state.json", "w") as f:
-                json.dump(state, f, indent=2)
+def process_chunk_step(agent_config, prompts_wrt_datasource, memory_agent_template, runs, use_gpt4_mini):
+    """Process the next chunk of every run in one generation batch and execute the resulting tool calls."""
+    max_new_tokens = agent_config.get('max_new_tokens', 2048)
+    current_chunks = [
+        prompts_wrt_datasource['unified_prompt'].format(context=run.chunks[run.next_chunk], max_new_tokens=int(max_new_tokens * 0.8))
+        for run in runs
+    ]
 
-            # Save data instance info
-            data_instance_info = {
-                'data_source': batch_sources[i],
-                'global_idx': batch_idx
-            }
-            with open(f"{out_dir}/data_instance_info.json", "w") as f:
-                json.dump(data_instance_info, f, indent=2)
-
-            # Save chunks with their corresponding function calls in a single file
-            chunks_with_function_calls = []
-            for chunk_idx, chunk in enumerate(batch_chunks[i]):
-                # Get function calls for this specific chunk
-                chunk_function_calls = [
-                    fc for fc in batch_function_calls_log[i]
-                    if fc.get('chunk_idx') == chunk_idx
-                ]
-
-                chunks_with_function_calls.append({
-                    'chunk_idx': chunk_idx,
-                    'raw_chunk': chunk,
-                    'function_calls': chunk_function_calls
+    if use_gpt4_mini:
+        # Use ThreadPoolExecutor for fake batch processing (simulating multiprocessing)
+        chunk_data_list = [(chunk, run.memory, agent_config, memory_agent_template) for chunk, run in zip(current_chunks, runs)]
+        with ThreadPoolExecutor(max_workers=min(len(chunk_data_list), 16)) as executor:
+            futures = [executor.submit(process_chunk_with_gpt4_mini, data) for data in chunk_data_list]
+            for run, future in zip(runs, futures):
+                # For GPT-4.1-mini, function calls are already executed, just store them
+                response, function_calls = future.result()
+                run.final_responses.append(response)
+                for function_call_record in function_calls:
+                    function_call_record['chunk_idx'] = run.next_chunk
+                    run.function_calls_log.append(function_call_record)
+    else:
+        prompts = []
+        for chunk, run in zip(current_chunks, runs):
+            processed_text = MemoryAgent.process_text_with_qwen_pipeline(
+                text=chunk,
+                tokenizer=memory_agent_template.tokenizer,
+                functions=[tool["function"] for tool in get_memory_tool_schemas(run.memory)],
+                status='memorie',
+                enable_thinking=agent_config['enable_thinking'],
+                return_text=True,
+                memory=run.memory
+            )
+            prompts.append(processed_text)
+
+        assert agent_config['vllm']
+        final_responses = generate_chunk_responses(agent_config, memory_agent_template, prompts)
+
+        # For qwen, parse responses and execute function calls
+        for run, response in zip(runs, final_responses):
+            assistant_messages = memory_agent_template._parse_response(response)
+            run.final_responses.append(response)
+
+            for assistant_msg in assistant_messages:
+                if not assistant_msg.get("function_call"):
+                    continue
+                tool_result = memory_agent_template._run_tool_from_function_call(
+                    assistant_msg["function_call"],
+                    run.memory
+                )
+                run.function_calls_log.append({
+                    'function_call': assistant_msg["function_call"],
+                    'tool_result': tool_result,
+                    'chunk_idx': run.next_chunk,
+                    'timestamp': time.time()
                 })
 
-            with open(f"{out_dir}/chunks_and_function_calls.json", "w") as f:
-                json.dump(chunks_with_function_calls, f, indent=2)
+    # Embed everything this step's tool calls wrote in one batched request
+    Memory.flush_all_embeddings([run.memory for run in runs])
+    for run in runs:
+        run.next_chunk += 1
 
-            with open(f"{out_dir}/final_responses.json", "w") as f:
-                json.dump(batch_final_responses[i], f, indent=2)
 
-            # Save embeddings if available
-            if (memory.semantic_embedding_matrix.size > 0 or
-                memory.episodic_embedding_matrix.size > 0):
-                np.savez_compressed(f"{out_dir}/embeddings.npz",
-                                  semantic_matrix=memory.semantic_embedding_matrix,
-                                  episodic_matrix=memory.episodic_embedding_matrix)
-
-
-    # TODO: check if the results file exists for all batch items
+def answer_questions(args, agent_config, prompts_wrt_datasource, runs):
+    """Answer the questions of finished runs with the memory server; returns {batch_idx: results}."""
     results_filename = get_results_filename(args.agentic_search)
-    all_results_exist = True
-    if not args.force_reanswer_questions:
-        for i in range(batch_size):
-            out_dir = batch_out_dirs[i]
-            if not os.path.exists(f"{out_dir}/{results_filename}"):
-                all_results_exist = False
-                break
-        if all_results_exist:
-            all_results = []
-            for i in range(batch_size):
-                out_dir = batch_out_dirs[i]
-                with open(f"{out_dir}/{results_filename}", "r") as f:
-                    all_results.extend(json.load(f))
-            return all_results
-    else:
-        all_results_exist = False
-
-    # First, save all memory states in parallel
-    all_results = []
-
-    for i in range(batch_size):
-        batch_idx = batch_indices[i]
-        memory = batch_memories[i]
-        out_dir = batch_out_dirs[i]
-
-        if not os.path.exists(out_dir):
-            os.makedirs(out_dir)
-
-        # Save memory state (in case it wasn't saved during chunk processing)
-        state = {
-            'semantic': memory.semantic,
-            'episodic': memory.episodic,
-            'conversation_history': [],
-            'step': max_chunks,
-            'semantic_embedding_ids': memory.semantic_embedding_ids,
-            'episodic_embedding_ids': memory.episodic_embedding_ids
-        }
-
-        # Only save core memory if it's available
-        if memory.including_core and memory.core is not None:
-            state['core'] = memory.core
+    results_by_idx = {}
 
-        with open(f"{out_dir}/agent_state.json", "w") as f:
-            json.dump(state, f, indent=2)
-
-        # Save data instance info
-        data_instance_info = {
-            'data_source': batch_sources[i],
-            'global_idx': batch_idx
-        }
-        with open(f"{out_dir}/data_instance_info.json", "w") as f:
-            json.dump(data_instance_info, f, indent=2)
-
-        # Save embeddings if available
-        if (memory.semantic_embedding_matrix.size > 0 or
-            memory.episodic_embedding_matrix.size > 0):
-            np.savez_compressed(f"{out_dir}/embeddings.npz",
-                              semantic_matrix=memory.semantic_embedding_matrix,
-                              episodic_matrix=memory.episodic_embedding_matrix)
+    todo_runs = []
+    for run in runs:
+        if not args.force_reanswer_questions and os.path.exists(f"{run.out_dir}/{results_filename}"):
+            with open(f"{run.out_dir}/{results_filename}", "r") as f:
+                results_by_idx[run.batch_idx] = json.load(f)
+        else:
+            todo_runs.append(run)
+    if not todo_runs:
+        return results_by_idx
 
     # Collect all questions for batch processing
     all_questions = []
     question_metadata = []  # Store metadata for each question
 
-    for i in range(batch_size):
-        batch_idx = batch_indices[i]
-        queries_and_answers = batch_queries_and_answers[i]
-        memory = batch_memories[i]
-
-        for item in queries_and_answers:
+    for i, run in enumerate(todo_runs):
+        for item in run.queries_and_answers:
             if args.dataset == "LOCOMO":
                 question_idx, question, answer, category = item
                 question_metadata.append({
-                    'batch_idx': batch_idx,
+                    'batch_idx': run.batch_idx,
                     'memory_idx': i,
                     'question': question,
                     'answer': answer,
@@ -597,7 +544,7 @@ def run_with_chunks_and_questions_batch(
             elif args.dataset == "MemAgent_Bench":
                 question_idx, question, answer, category, source = item
                 question_metadata.append({
-                    'batch_idx': batch_idx,
+                    'batch_idx': run.batch_idx,
                     'memory_idx': i,
                     'question': question,
                     'answer': answer,
@@ -608,7 +555,7 @@ def run_with_chunks_and_questions_batch(
             else:
                 question_idx, question, answer, data_source = item
                 question_metadata.append({
-                    'batch_idx': batch_idx,
+                    'batch_idx': run.batch_idx,
                     'memory_idx': i,
                     'question': question,
                     'answer': answer,
@@ -646,7 +593,7 @@ def run_with_chunks_and_questions_batch(
         questions_for_server = []
 
         for memory_idx in sorted(questions_by_memory.keys()):
-            memory = batch_memories[memory_idx]
+            memory = todo_runs[memory_idx].memory
             # Prepare memory dict for server
             memory_dict = {
                 'episodic': memory.episodic,
@@ -697,7 +644,7 @@ def run_with_chunks_and_questions_batch(
 
                 question_responses[metadata_idx] = response_text
                 step_info = {
-                    "step": max_chunks,
+                    "step": len(todo_runs[memory_idx].chunks),
                     "final_response": response_text,
                     "memory_server_used": True,
                     "batch_processed": True,
@@ -716,12 +663,8 @@ def run_with_chunks_and_questions_batch(
         raise NotImplementedError("Only memory server inference is supported for batch processing")
 
     # Group results by batch item and save
-    batch_results_dict = {}
+    batch_results_dict = {run.batch_idx: [] for run in todo_runs}
     for i, meta in enumerate(question_metadata):
-        batch_idx = meta['batch_idx']
-        if batch_idx not in batch_results_dict:
-            batch_results_dict[batch_idx] = []
-
         # Format result based on dataset type
         if meta['dataset_type'] == 'LOCOMO':
             result = {
@@ -748,19 +691,104 @@ def run_with_chunks_and_questions_batch(
                 'step_info': question_step_infos[i]
             }
 
-        batch_results_dict[batch_idx].append(result)
+        batch_results_dict[meta['batch_idx']].append(result)
 
     # Save results for each batch item
-    for i, batch_idx in enumerate(batch_indices):
-        batch_results = batch_results_dict[batch_idx]
-        out_dir = batch_out_dirs[i]
+    for run in todo_runs:
+        if not os.path.exists(run.out_dir):
+            os.makedirs(run.out_dir)
+        with open(f"{run.out_dir}/{results_filename}", "w") as f:
+            json.dump(batch_results_dict[run.batch_idx], f, indent=2)
+        results_by_idx[run.batch_idx] = batch_results_dict[run.batch_idx]
+
+    return results_by_idx
+
+
+def run_with_chunks_and_questions_batch(
+        args,
+        agent_config,
+        batch_indices,
+        batch_chunks,
+        batch_queries_and_answers,
+        batch_sources,
+        num_slots=None,
+        qa_workers=4):
+    """
+    Process instances with continuous batching: up to num_slots instances are active at a time and
+    every step generates the next chunk of each active instance in one batch. Each instance advances
+    independently; once its last chunk is processed it is saved, its questions are sent to the memory
+    server in the background and its slot is refilled from the queue, so short instances never wait
+    for the longest one. Instances with a saved agent_state.json skip chunk processing; interrupted
+    instances resume from their per-chunk checkpoint log (see checkpoint_chunk).
+    Returns the question results of all instances in the order of batch_indices.
+    """
+    with open('config/prompts_wrt_datasource.yaml', 'r') as f:
+        prompts_wrt_datasource = yaml.safe_load(f)
 
-        results_filename = get_results_filename(args.agentic_search)
-        with open(f"{out_dir}/{results_filename}", "w") as f:
-            json.dump(batch_results, f, indent=2)
+    num_slots = num_slots or len(batch_chunks)
+    memory_agent_template = MemoryAgent(agent_config=agent_config)
 
-        all_results.extend(batch_results)
+    # Check if we're using gpt-4.1-mini (detected by model_name containing "4.1-mini")
+    use_gpt4_mini = agent_config.get('model_name', '').lower().find('4.1-mini') != -1
+
+    pending = deque(range(len(batch_chunks)))
+    active = []
+    qa_futures = []
+    step = 0
+
+    with ThreadPoolExecutor(max_workers=qa_workers) as qa_executor:
+        while pending or active:
+            # Refill free slots from the queue; finished or restored instances go straight to question answering
+            finished = []
+            while pending and len(active) < num_slots:
+                i = pending.popleft()
+                run = InstanceRun(
+                    batch_idx=batch_indices[i],
+                    chunks=batch_chunks[i],
+                    queries_and_answers=batch_queries_and_answers[i],
+                    source=batch_sources[i],
+                    memory=Memory(
+                        including_core=prompts_wrt_datasource[batch_sources[i]]['including_core'],
+                        disabled_memory_types=args.exclude_memory
+                    ),
+                    out_dir=get_instance_out_dir(args, agent_config, batch_indices[i])
+                )
+                if os.path.exists(f"{run.out_dir}/agent_state.json"):
+                    print(f"[DEBUG] Loading existing agent state for instance {run.batch_idx}, skipping chunk processing...")
+                    load_agent_state(run.memory, run.out_dir)
+                    run.next_chunk = len(run.chunks)
+                else:
+                    # Resume an interrupted instance from its checkpoint log, if any
+                    restore_chunk_checkpoints(run)
+                    if run.done:
+                        save_agent_state(run)
+                if run.done:
+                    finished.append(run)
+                else:
+                    active.append(run)
+
+            if active:
+                step += 1
+                print(f"[DEBUG] Step {step}: processing {len(active)} active instances ({len(pending)} queued)")
+                process_chunk_step(agent_config, prompts_wrt_datasource, memory_agent_template, active, use_gpt4_mini)
+
+                for run in active:
+                    checkpoint_chunk(run)
+                    if run.done:
+                        save_agent_state(run)
+                        finished.append(run)
+                active = [run for run in active if not run.done]
 
+            if finished:
+                qa_futures.append(qa_executor.submit(answer_questions, args, agent_config, prompts_wrt_datasource, finished))
+
+        results_by_idx = {}
+        for future in qa_futures:
+            results_by_idx.update(future.result())
+
+    all_results = []
+    for batch_idx in batch_indices:
+        all_results.extend(results_by_idx[batch_idx])
     return all_results
 
 def main():
@@ -804,14 +832,10 @@ def main():
 
     print(f"Processing {len(all_chunks)} conversations for dataset {args.dataset}...")
 
-    # Process all conversations using batch processing
+    # Process all conversations with continuous batching over batch_size instance slots
     all_indices = list(range(len(all_chunks)))
-    for i in range(0, len(all_indices), args.batch_size):
-        batch_indices = all_indices[i:i+args.batch_size]
-        batch_chunks = [all_chunks[idx] for idx in batch_indices]
-        batch_sources = [all_sources[idx] for idx in batch_indices]
-        batch_queries_and_answers = [all_queries_and_answers[idx] for idx in batch_indices]
-        run_with_chunks_and_questions_batch(args, agent_config, batch_indices, batch_chunks, batch_queries_and_answers, batch_sources)
+    run_with_chunks_and_questions_batch(args, agent_config, all_indices, all_chunks, all_queries_and_answers, all_sources,
+                                        num_slots=args.batch_size)
 
 if __name__ == '__main__':
     main()
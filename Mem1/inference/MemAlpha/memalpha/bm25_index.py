@@ -0,0 +1,135 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List
+
+
+def tokenize(text: str) -> List[str]:
+    """Simple tokenization: lowercase, split on whitespace and punctuation."""
+    return re.findall(r'\b\w+\b', text.lower())
+
+
+class BM25Index:
+    """Incremental BM25 (Okapi) inverted index over memory contents.
+
+    Scores match rank_bm25.BM25Okapi built on the same corpus (up to float rounding of the
+    average idf), but documents are tokenized once when added instead of on every query, and
+    a query only touches the postings of its own terms. Documents are keyed by content, so
+    duplicate contents share one entry with a multiplicity and always receive the same score.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25) -> None:
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.doc_counts: Counter = Counter()  # content -> multiplicity
+        self.doc_tfs: Dict[str, Counter] = {}  # content -> term frequencies
+        self.doc_lens: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}  # term -> {content: term frequency}
+        self.doc_freqs: Counter = Counter()  # term -> number of documents containing it
+        self.df_hist: Counter = Counter()  # document frequency -> number of terms with it
+        self.corpus_size = 0
+        self.total_len = 0
+        self._eps_idf = None  # replacement idf for negative idfs, recomputed lazily after mutations
+
+    def __len__(self) -> int:
+        return self.corpus_size
+
+    def _set_doc_freq(self, term: str, delta: int) -> None:
+        old = self.doc_freqs[term]
+        new = old + delta
+        if old:
+            self.df_hist[old] -= 1
+            if not self.df_hist[old]:
+                del self.df_hist[old]
+        if new:
+            self.doc_freqs[term] = new
+            self.df_hist[new] += 1
+        else:
+            del self.doc_freqs[term]
+
+    def add(self, content: str, count: int = 1) -> None:
+        if content not in self.doc_counts:
+            tokens = tokenize(content)
+            self.doc_tfs[content] = Counter(tokens)
+            self.doc_lens[content] = len(tokens)
+            for term, tf in self.doc_tfs[content].items():
+                self.postings.setdefault(term, {})[content] = tf
+        for term in self.doc_tfs[content]:
+            self._set_doc_freq(term, count)
+        self.doc_counts[content] += count
+        self.corpus_size += count
+        self.total_len += self.doc_lens[content] * count
+        self._eps_idf = None
+
+    def remove(self, content: str, count: int = 1) -> None:
+        if self.doc_counts.get(content, 0) < count:
+            raise ValueError("Content not found in BM25 index")
+        for term in self.doc_tfs[content]:
+            self._set_doc_freq(term, -count)
+        self.doc_counts[content] -= count
+        self.corpus_size -= count
+        self.total_len -= self.doc_lens[content] * count
+        if not self.doc_counts[content]:
+            del self.doc_counts[content]
+            del self.doc_lens[content]
+            for term in self.doc_tfs.pop(content):
+                del self.postings[term][content]
+                if not self.postings[term]:
+                    del self.postings[term]
+        self._eps_idf = None
+
+    def sync(self, contents: Iterable[str]) -> None:
+        """Bring the index in line with the given corpus, touching only added and removed contents."""
+        target = Counter(contents)
+        for content, count in list(self.doc_counts.items()):
+            if target[content] < count:
+                self.remove(content, count - target[content])
+        for content, count in target.items():
+            if count > self.doc_counts.get(content, 0):
+                self.add(content, count - self.doc_counts.get(content, 0))
+
+    def _raw_idf(self, doc_freq: int) -> float:
+        return math.log(self.corpus_size - doc_freq + 0.5) - math.log(doc_freq + 0.5)
+
+    def idf(self, term: str) -> float:
+        doc_freq = self.doc_freqs.get(term, 0)
+        if not doc_freq:
+            return 0.0
+        idf = self._raw_idf(doc_freq)
+        if idf < 0:
+            if self._eps_idf is None:
+                # average idf over the vocabulary, computed per distinct document frequency
+                idf_sum = sum(num_terms * self._raw_idf(df) for df, num_terms in self.df_hist.items())
+                self._eps_idf = self.epsilon * idf_sum / len(self.doc_freqs)
+            idf = self._eps_idf
+        return idf
+
+    def _term_scores(self, term: str) -> Dict[str, float]:
+        postings = self.postings.get(term)
+        if not postings:
+            return {}
+        idf = self.idf(term)
+        avgdl = self.total_len / self.corpus_size
+        k1, b = self.k1, self.b
+        return {content: idf * (tf * (k1 + 1) / (tf + k1 * (1 - b + b * self.doc_lens[content] / avgdl)))
+                for content, tf in postings.items()}
+
+    def get_scores(self, query: str) -> Dict[str, float]:
+        """BM25 score per content; contents that share no term with the query score 0 and are omitted."""
+        return self.get_batch_scores([query])[0]
+
+    def get_batch_scores(self, queries: List[str]) -> List[Dict[str, float]]:
+        """Score many queries against the same corpus, walking the postings of each distinct term once."""
+        term_scores: Dict[str, Dict[str, float]] = {}
+        results = []
+        for query in queries:
+            scores: Dict[str, float] = {}
+            if self.corpus_size and self.total_len:
+                for term in tokenize(query):
+                    if term not in term_scores:
+                        term_scores[term] = self._term_scores(term)
+                    for content, score in term_scores[term].items():
+                        scores[content] = scores.get(content, 0.0) + score
+            results.append(scores)
+        return results
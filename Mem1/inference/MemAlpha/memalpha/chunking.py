@@ -0,0 +1,129 @@
+"""Sentence-boundary chunking shared by the MemAlpha data pipelines.
+
+Resources (the tiktoken encoding, the NLTK punkt model) are resolved once per process and never
+re-downloaded when present. Token counts of all sentences of a document come from one batched
+encode, and chunk boundaries are found by bisecting the cumulative token counts instead of
+re-counting sentence by sentence.
+"""
+
+import re
+import random
+import bisect
+import logging
+import functools
+import itertools
+import multiprocessing as mp
+from typing import Iterable, Iterator, List, Optional
+
+import nltk
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+_FALLBACK_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+@functools.lru_cache(maxsize=None)
+def ensure_punkt() -> bool:
+    """Make the punkt sentence tokenizer available; only downloads it if it is not installed.
+
+    Returns False when it is neither installed nor downloadable (e.g. no network), in which case
+    sentences are split on terminal punctuation instead.
+    """
+    for resource in ('tokenizers/punkt_tab', 'tokenizers/punkt'):
+        try:
+            nltk.data.find(resource)
+            return True
+        except LookupError:
+            pass
+    for package in ('punkt_tab', 'punkt'):
+        try:
+            if nltk.download(package, quiet=True):
+                return True
+        except Exception as e:
+            logger.warning(f"Failed to download NLTK {package}: {e}")
+    logger.warning("NLTK punkt is unavailable; splitting sentences on terminal punctuation")
+    return False
+
+
+class SentenceChunker:
+    """Greedy packing of sentences (or any text pieces) into chunks of at most max_tokens tokens."""
+
+    def __init__(self, model_name: str = "gpt-4o-mini") -> None:
+        try:
+            self.encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            # Fallback if the model is not recognized by tiktoken
+            self.encoding = tiktoken.encoding_for_model("gpt-4o-mini")
+        self.has_punkt = ensure_punkt()
+
+    def split_sentences(self, text: str) -> List[str]:
+        if self.has_punkt:
+            return nltk.sent_tokenize(text)
+        return [sentence for sentence in _FALLBACK_SENTENCE_RE.split(text.strip()) if sentence]
+
+    def count_tokens(self, pieces: List[str]) -> List[int]:
+        """Token count of every piece, from one batched encode."""
+        encoded = self.encoding.encode_batch(pieces, allowed_special={'<|endoftext|>'}, disallowed_special=())
+        return [len(tokens) for tokens in encoded]
+
+    def pack(self, pieces: List[str], max_tokens: int, separator: str = " ", count_separator: bool = True,
+             min_tokens: Optional[int] = None, variable_size: bool = False) -> List[str]:
+        """
+        Join consecutive pieces with separator into chunks of at most max_tokens tokens.
+
+        A piece is added to the current chunk if the chunk's tokens plus the piece's tokens fit the
+        target (with count_separator, the separators already in the chunk are counted too). A piece
+        that is larger than the target on its own becomes a chunk by itself. With variable_size, the
+        target of every chunk is drawn from [min_tokens, max_tokens] (default min: max(100, max_tokens // 20)).
+        """
+        if variable_size and min_tokens is None:
+            min_tokens = max(100, max_tokens // 20)
+        # one target per chunk, drawn when the chunk is started
+        next_target = lambda: random.randint(min_tokens, max_tokens) if variable_size else max_tokens
+        target_tokens = next_target()
+        if not pieces:
+            return []
+        sep_tokens = len(self.encoding.encode(separator)) if count_separator else 0
+
+        # prefix[k] = tokens of pieces[:k] plus one separator per piece; pieces[i:k] fit a target t
+        # iff prefix[k] - prefix[i] - 2 * sep_tokens <= t (the last separator is not part of the chunk,
+        # and the fit test runs before the separator in front of the new piece is added)
+        prefix = [0] + list(itertools.accumulate(count + sep_tokens for count in self.count_tokens(pieces)))
+        chunks = []
+        start = 0
+        while True:
+            end = bisect.bisect_right(prefix, prefix[start] + target_tokens + 2 * sep_tokens) - 1
+            end = max(end, start + 1)
+            chunks.append(separator.join(pieces[start:end]).strip())
+            start = end
+            if start == len(pieces):
+                return chunks
+            target_tokens = next_target()
+
+    def chunk_text(self, text: str, max_tokens: int, **kwargs) -> List[str]:
+        """Split text into sentences and pack them into chunks; see pack for the options."""
+        return self.pack(self.split_sentences(text), max_tokens, **kwargs)
+
+
+@functools.lru_cache(maxsize=None)
+def get_sentence_chunker(model_name: str = "gpt-4o-mini") -> SentenceChunker:
+    """Process-wide chunker per model."""
+    return SentenceChunker(model_name)
+
+
+def _chunk_document(text: str, model_name: str, max_tokens: int, kwargs: dict) -> List[str]:
+    return get_sentence_chunker(model_name).chunk_text(text, max_tokens, **kwargs)
+
+
+def chunk_documents(texts: Iterable[str], max_tokens: int, model_name: str = "gpt-4o-mini", num_workers: int = 0,
+                    **kwargs) -> Iterator[List[str]]:
+    """Chunks of every document of a stream, in order; sentence splitting is spread over num_workers processes."""
+    if num_workers <= 1:
+        chunker = get_sentence_chunker(model_name)
+        for text in texts:
+            yield chunker.chunk_text(text, max_tokens, **kwargs)
+        return
+    worker = functools.partial(_chunk_document, model_name=model_name, max_tokens=max_tokens, kwargs=kwargs)
+    with mp.Pool(num_workers) as pool:
+        yield from pool.imap(worker, texts, chunksize=16)
@@ -3,13 +3,16 @@ import re
 import yaml
 import time
 import torch
+import threading
 from typing import List, Dict, Any, Tuple
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 from .tensor_helper import TensorHelper, TensorConfig
 from verl import DataProto
 import requests
 from memory import Memory
 from memalpha.utils import count_tokens
+from memalpha.memory_sessions import MemorySessionClient
 
 
 @dataclass
@@ -39,6 +42,8 @@ class MemoryGenerationConfig:
     analyze_function_url: str = None
     enable_thinking: bool = True
     including_core: bool = False
+    use_memory_sessions: bool = False  # Keep memories in server-side sessions and send only deltas
+    tool_workers: int = 16  # Threads parsing and executing the batch items' memory tool calls
 
 class MemoryGenerationManager:
     """Generation manager for memory agent that processes chunks and performs memory operations."""
@@ -64,6 +69,28 @@ class MemoryGenerationManager:
             max_start_length=config.max_start_length
         ))
 
+        # Sessions live on the same server as respond_url (e.g. http://host:5000/sessions/sync)
+        self.memory_session_client = None
+        if config.use_memory_sessions and config.respond_url:
+            self.memory_session_client = MemorySessionClient(config.respond_url.rsplit('/', 1)[0])
+
+        # Tool-execution context shared by all chunk steps: the template agent (stateless for parsing and
+        # running tool calls on a given memory), the worker pool and the ids of the thinking-closure sentence
+        self._memory_agent_template = None
+        self._memory_agent_template_lock = threading.Lock()
+        self.tool_executor = ThreadPoolExecutor(max_workers=config.tool_workers)
+        self.thinking_closure = "\n\nConsidering the limited time by the user, I have to give the solution based on the thinking directly now.\n</think>\n\n"
+        self.thinking_closure_ids = torch.tensor(self.tokenizer.encode(self.thinking_closure, add_special_tokens=False), dtype=torch.long)
+
+    @property
+    def memory_agent_template(self):
+        # First read may come from several tool workers at once; build the agent only once
+        with self._memory_agent_template_lock:
+            if self._memory_agent_template is None:
+                from agent import MemoryAgent
+                self._memory_agent_template = MemoryAgent(agent_config={'model_name': 'Qwen/Qwen3-4B', 'vllm': False, 'including_core': self.config.including_core}, is_template=True)
+        return self._memory_agent_template
+
     def _batch_tokenize(self, responses: List[str]) -> torch.Tensor:
         """Tokenize a batch of responses."""
         return self.tokenizer(
@@ -268,12 +295,32 @@ class MemoryGenerationManager:
         result.meta_info = padded_result.meta_info
         return result
 
+    def _sync_memory_sessions(self, batch_memories, force_full=False):
+        """Push memory changes to the server sessions; returns False if the server could not be synced."""
+        try:
+            self.memory_session_client.sync(batch_memories, force_full=force_full)
+            return True
+        except Exception as e:
+            print(f"Memory session sync failed, sending full memories instead: {e}")
+            return False
+
     def _process_question_with_memory_using_server(self, batch_memories, questions_and_answers):
 
-        payload = {
+        use_sessions = self.memory_session_client is not None and self._sync_memory_sessions(batch_memories)
+        # Whether the server holds sessions of this batch that should be freed once it is answered
+        sessions_created = use_sessions
+        inline_payload = lambda: {
             "memories": [{'core': memory.core, 'episodic': memory.episodic, 'semantic': memory.semantic} for memory in batch_memories],
             'questions': [[qa['question'] for qa in qa_list] for qa_list in questions_and_answers]
         }
+        if use_sessions:
+            # The server already holds every memory; only reference them
+            payload = {
+                "session_ids": [memory.session_id for memory in batch_memories],
+                'questions': [[qa['question'] for qa in qa_list] for qa_list in questions_and_answers]
+            }
+        else:
+            payload = inline_payload()
         import requests
 
         print("Number of questions:", [len(qa_list) for qa_list in questions_and_answers])
@@ -285,6 +332,13 @@ class MemoryGenerationManager:
         max_retries = 3
         for attempt in range(max_retries):
             response = requests.post(self.config.respond_url, json=payload)
+            if use_sessions and response.status_code == 409:
+                # Some sessions were evicted since the last sync; recreate them from full snapshots
+                missing_session_ids = set(response.json().get('missing_session_ids', []))
+                if not self._sync_memory_sessions([memory for memory in batch_memories if memory.session_id in missing_session_ids], force_full=True):
+                    # The sessions cannot be recreated; send the memories inline on the next attempt
+                    use_sessions = False
+                    payload = inline_payload()
             results = response.json().get('result', [])
 
             if len(results) > 0:
@@ -299,6 +353,13 @@ class MemoryGenerationManager:
         elapsed_time = end_time - start_time
         print(f"Elapsed time: {elapsed_time:.2f} seconds")
 
+        if sessions_created:
+            # Questions are answered once per batch; free the sessions on the server
+            try:
+                self.memory_session_client.delete(batch_memories)
+            except Exception as e:
+                print(f"Failed to delete memory sessions: {e}")
+
         questions_list = [[qa['question'] for qa in qa_list] for qa_list in questions_and_answers]
 
         def clean_pred(pred):
@@ -398,6 +459,10 @@ class MemoryGenerationManager:
             )
             last_chunk_meta_info = chunk_meta_info  # Keep track of last chunk's meta_info
 
+            if self.memory_session_client is not None:
+                # Push this chunk's memory operations so question answering only sends session ids
+                self._sync_memory_sessions(batch_memories)
+
             chunk_input_ids = [None] * batch_size
             chunk_responses_ids = [None] * batch_size
             chunk_response_masks = [None] * batch_size
@@ -583,16 +648,38 @@ class MemoryGenerationManager:
         final_output.meta_info.update(last_chunk_meta_info)
         return final_output
 
+    def _execute_function_calls(self, prediction: str, memory: Memory) -> Tuple[float, List[Dict]]:
+        """Run the memory tool calls of one response; returns (success rate, executed calls)."""
+        assistant_messages = self.memory_agent_template._parse_response(prediction)
+        function_calls_messages = [msg for msg in assistant_messages if msg.get("function_call")]
+        if not function_calls_messages:
+            # No function calls in this response
+            return 0.0, []
+
+        successful_calls = 0
+        current_function_calls = []
+        for assistant_msg in function_calls_messages:
+            name, arguments, tool_result = self.memory_agent_template._run_tool_from_function_call(assistant_msg["function_call"], memory, return_arguments=True)
+
+            # Check if the function call was successful based on the result string
+            if "executed successfully" in tool_result and not "'status': 'skipped'" in tool_result:
+                successful_calls += 1
+
+            current_function_calls.append({
+                "name": name,
+                "arguments": arguments,
+                "result": tool_result,
+                'success': "executed successfully" in tool_result
+            })
+
+        # Calculate reward as success rate
+        return successful_calls / len(function_calls_messages), current_function_calls
+
     def _process_chunk_with_memory_operations(self, rollings: DataProto, current_chunks: List[str], batch_memories: List[Memory]) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, Dict]:
         """
         Process chunks following agent.py chat() logic with status='memorie'.
         This implements the same loop structure as agent.chat() for memory operations.
         """
-        from agent import MemoryAgent
-
-        # Initialize a single memory agent template for function execution
-        memory_agent_template = MemoryAgent(agent_config={'model_name': 'Qwen/Qwen3-4B', 'vllm': False, 'including_core': self.config.including_core}, is_template=True)
-
         # Add chunks to rolling state
         chunk_ids = self._process_next_chunk(current_chunks, batch_memories)
 
@@ -617,35 +704,29 @@ class MemoryGenerationManager:
 
         if self.config.enable_thinking:
 
-            # Define the sentence to be masked
-            sentence_to_mask = "\n\nConsidering the limited time by the user, I have to give the solution based on the thinking directly now.\n</think>\n\n"
-            sentence_to_mask_ids = self.tokenizer.encode(sentence_to_mask, add_special_tokens=False)
+            sentence_to_mask = self.thinking_closure
+            sentence_to_mask_ids = self.thinking_closure_ids
 
             new_responses_ids = []
             new_responses_str = []
             original_response_ids = []  # Keep track of original response IDs for masking
             needs_masking = []
 
-            # check if there is unstopped thinking
+            # check if there is unstopped thinking; close it by appending the sentence's ids to the response's ids
             for response_ids, response_str in zip(responses_ids, responses_str):
+                response_ids = response_ids[response_ids != self.tokenizer.pad_token_id]
+                original_response_ids.append(response_ids)
                 if "</think>" not in response_str:
-                    # Store original response IDs for masking comparison
-                    original_response_ids.append(response_ids)
-                    response_str += sentence_to_mask
-                    new_response_ids = self.tokenizer.encode(response_str, return_tensors="pt")[0]
-                    new_responses_ids.append(new_response_ids)
-                    new_responses_str.append(response_str)
+                    new_responses_ids.append(torch.cat([response_ids, sentence_to_mask_ids]))
+                    new_responses_str.append(response_str + sentence_to_mask)
                     needs_masking.append(True)
                 else:
-                    original_response_ids.append(response_ids)
                     new_responses_ids.append(response_ids)
                     new_responses_str.append(response_str)
                     needs_masking.append(False)
 
             # pad to the same length
-            max_length = max(len(response_ids) for response_ids in new_responses_ids)
-            new_responses_ids = [torch.cat([response_ids, torch.tensor([self.tokenizer.pad_token_id] * (max_length - len(response_ids)))]) for response_ids in new_responses_ids]
-            new_responses_ids = torch.stack(new_responses_ids).long()
+            new_responses_ids = torch.nn.utils.rnn.pad_sequence(new_responses_ids, batch_first=True, padding_value=self.tokenizer.pad_token_id).long()
             rollings = self._update_rolling_state(rollings,
                                                 empty_response,  # Empty response with correct batch size
                                                 new_responses_ids)
@@ -676,53 +757,13 @@ class MemoryGenerationManager:
                 if need_masking:
                     response_mask[i, original_len: original_len+len(sentence_to_mask_ids)] = 0
 
-        # Track function call success rates for reward calculation
-        function_call_rewards = []
-        all_function_calls = []
-
-        for i, prediction in enumerate(responses_str):
-
-            # Parse memory operation from prediction
-            # operation, params = self.parse_memory_operation(prediction)
-            assistant_messages = memory_agent_template._parse_response(prediction)
-
-            function_calls_messages = [msg for msg in assistant_messages if msg.get("function_call")]
-            if function_calls_messages:
-                # Track function call success for this batch item
-                total_calls = len(function_calls_messages)
-
-                successful_calls = 0
-                current_function_calls = []
-
-                for assistant_msg in function_calls_messages:
-
-                    name, arguments, tool_result = memory_agent_template._run_tool_from_function_call(assistant_msg["function_call"], batch_memories[i], return_arguments=True)
-
-                    # Check if the function call was successful based on the result string
-                    if "executed successfully" in tool_result and not "'status': 'skipped'" in tool_result:
-                        successful_calls += 1
+        # Parse and execute every item's function calls on the worker pool (each item has its own memory)
+        results = list(self.tool_executor.map(self._execute_function_calls, responses_str, batch_memories))
+        function_call_rewards = [reward for reward, _ in results]
+        all_function_calls = [function_calls for _, function_calls in results]
 
-                    current_function_calls.append({
-                        "name": name,
-                        "arguments": arguments,
-                        "result": tool_result,
-                        'success': "executed successfully" in tool_result
-                    })
-
-                # Calculate reward as success rate
-                if total_calls > 0:
-                    success_rate = successful_calls / total_calls
-                    function_call_rewards.append(success_rate)
-
-                else:
-                    function_call_rewards.append(0.0)
-
-                all_function_calls.append(current_function_calls)
-
-            else:
-                # No function calls in this response
-                function_call_rewards.append(0.0)
-                all_function_calls.append([])
+        # Embed everything this chunk's tool calls wrote in one batched request
+        Memory.flush_all_embeddings(batch_memories)
 
         # Add function call rewards to meta_info
         updated_meta_info = gen_output.meta_info.copy()
@@ -12,7 +12,16 @@ import numpy as np
 import nltk
 import tiktoken
 from rouge_score import rouge_scorer
+from memalpha.chunking import get_sentence_chunker
 from editdistance import eval as edit_distance
+import functools
+# Optional: batched Levenshtein distance matrices for candidate matching
+try:
+    from rapidfuzz.distance import Levenshtein
+    from rapidfuzz.process import cdist
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
 
 import logging
 
@@ -48,6 +57,14 @@ def normalize_answer(answer_text):
     return text
 
 
+@functools.lru_cache(maxsize=65536)
+def _normalized_tokens(text):
+    """Normalized text and its token counts; ground truths repeat across predictions, so both are cached."""
+    normalized_text = normalize_answer(text)
+    tokens = normalized_text.split()
+    return normalized_text, Counter(tokens), len(tokens)
+
+
 def f1_score(prediction, ground_truth):
     """
     Calculate F1 score between prediction and ground truth.
@@ -59,8 +76,8 @@ def f1_score(prediction, ground_truth):
     Returns:
         Tuple of (f1_score, precision, recall)
     """
-    normalized_prediction = normalize_answer(prediction)
-    normalized_ground_truth = normalize_answer(ground_truth)
+    normalized_prediction, prediction_counts, num_prediction_tokens = _normalized_tokens(prediction)
+    normalized_ground_truth, ground_truth_counts, num_ground_truth_tokens = _normalized_tokens(ground_truth)
 
     ZERO_METRIC = (0, 0, 0)
 
@@ -70,19 +87,16 @@ def f1_score(prediction, ground_truth):
         normalized_prediction != normalized_ground_truth):
         return ZERO_METRIC
 
-    # Tokenize both texts and calculate token overlap
-    prediction_tokens = normalized_prediction.split()
-    ground_truth_tokens = normalized_ground_truth.split()
-    
-    common_tokens = Counter(prediction_tokens) & Counter(ground_truth_tokens)
+    # Calculate token overlap
+    common_tokens = prediction_counts & ground_truth_counts
     num_common_tokens = sum(common_tokens.values())
     
     if num_common_tokens == 0:
         return ZERO_METRIC
     
     # Calculate precision, recall, and F1
-    precision = num_common_tokens / len(prediction_tokens)
-    recall = num_common_tokens / len(ground_truth_tokens)
+    precision = num_common_tokens / num_prediction_tokens
+    recall = num_common_tokens / num_ground_truth_tokens
     f1 = (2 * precision * recall) / (precision + recall)
     
     return f1, precision, recall
@@ -99,7 +113,7 @@ def drqa_exact_match_score(prediction, ground_truth):
     Returns:
         Boolean indicating exact match
     """
-    return normalize_answer(prediction) == normalize_answer(ground_truth)
+    return _normalized_tokens(prediction)[0] == _normalized_tokens(ground_truth)[0]
 
 
 def substring_exact_match_score(prediction, ground_truth):
@@ -113,7 +127,7 @@ def substring_exact_match_score(prediction, ground_truth):
     Returns:
         Boolean indicating substring match
     """
-    return normalize_answer(ground_truth) in normalize_answer(prediction)
+    return _normalized_tokens(ground_truth)[0] in _normalized_tokens(prediction)[0]
 
 
 def drqa_metric_max_over_ground_truths(metric_function, prediction, ground_truths):
@@ -186,44 +200,7 @@ def chunk_text_into_sentences(text, model_name="gpt-4o-mini", chunk_size=4096):
     Returns:
         List of text chunks, each within the specified token limit
     """
-    # Ensure NLTK sentence tokenizer is available
-    nltk.download('punkt', quiet=True)
-    
-    # Initialize tokenizer with fallback
-    try:
-        encoding = tiktoken.encoding_for_model(model_name)
-    except KeyError:
-        # Use fallback model if specified model is not recognized
-        encoding = tiktoken.encoding_for_model("gpt-4o-mini")
-
-    # Split text into sentences
-    sentences = nltk.sent_tokenize(text)
-    
-    text_chunks = []
-    current_chunk_sentences = []
-    current_chunk_token_count = 0
-
-    for sentence in sentences:
-        # Count tokens in current sentence
-        sentence_tokens = encoding.encode(sentence, allowed_special={'<|endoftext|>'})
-        sentence_token_count = len(sentence_tokens)
-        
-        # Check if adding this sentence would exceed chunk size
-        if current_chunk_token_count + sentence_token_count > chunk_size:
-            # Finalize current chunk and start new one
-            text_chunks.append(" ".join(current_chunk_sentences))
-            current_chunk_sentences = [sentence]
-            current_chunk_token_count = sentence_token_count
-        else:
-            # Add sentence to current chunk
-            current_chunk_sentences.append(sentence)
-            current_chunk_token_count += sentence_token_count
-    
-    # Add final chunk if it contains any sentences
-    if current_chunk_sentences:
-        text_chunks.append(" ".join(current_chunk_sentences))
-    
-    return text_chunks
+    return get_sentence_chunker(model_name).chunk_text(text, chunk_size, separator=" ", count_separator=False)
 
 
 def count_tokens(text, model_name="gpt-3.5-turbo"):
@@ -260,41 +237,8 @@ def create_chunks_use_sent_tokenizer(text, max_tokens=10000):
     Returns:
         List of text chunks
     """
-    # Ensure NLTK punkt tokenizer is available
-    try:
-        nltk.data.find('tokenizers/punkt')
-    except LookupError:
-        nltk.download('punkt')
-    
-    # Split into sentences
-    sentences = nltk.sent_tokenize(text)
-    
-    chunks = []
-    current_chunk_text = ""
-    current_token_count = 0
-    
-    for sentence in sentences:
-        sentence_token_count = count_tokens(sentence)
-        
-        # Start new chunk if adding sentence would exceed limit
-        if current_token_count + sentence_token_count > max_tokens and current_chunk_text:
-            chunks.append(current_chunk_text.strip())
-            current_chunk_text = sentence
-            current_token_count = sentence_token_count
-        else:
-            # Add sentence to current chunk
-            if current_chunk_text:
-                current_chunk_text += " " + sentence
-                current_token_count += sentence_token_count + count_tokens(" ")
-            else:
-                current_chunk_text = sentence
-                current_token_count = sentence_token_count
-    
-    # Add final chunk
-    if current_chunk_text:
-        chunks.append(current_chunk_text.strip())
-    
-    return chunks
+    # Token counts (sentences and the joining space) use count_tokens' default model
+    return get_sentence_chunker("gpt-3.5-turbo").chunk_text(text, max_tokens, separator=" ")
 
 
 # ============================================================================
@@ -345,33 +289,53 @@ def extract_movie_name(text):
     return normalize_whitespace(clean_parentheses(cleaned_name))
 
 
+class MovieMatcher:
+    """
+    Nearest-candidate matcher by (case-insensitive) edit distance.
+
+    The candidate set is deduplicated and lowercased once; all predicted items of an output are then
+    matched with a single distance matrix (rapidfuzz cdist when available, editdistance otherwise).
+    Ties go to the first candidate in first-occurrence order.
+    """
+
+    def __init__(self, candidate_movies):
+        self.candidates = list(dict.fromkeys(candidate_movies))
+        self.lowered = [candidate.lower() for candidate in self.candidates]
+
+    def distances(self, target_names):
+        """Edit distance matrix of shape (len(target_names), len(candidates))."""
+        targets = [name.lower() for name in target_names]
+        if RAPIDFUZZ_AVAILABLE:
+            return cdist(targets, self.lowered, scorer=Levenshtein.distance, dtype=np.int32, workers=-1)
+        return np.array([[edit_distance(target, candidate) for candidate in self.lowered] for target in targets],
+                        dtype=np.int32).reshape(len(targets), len(self.lowered))
+
+    def match(self, target_names):
+        """One find_nearest_movie result per target name."""
+        if not target_names:
+            return []
+        distances = self.distances(target_names)
+        nearest_indices = np.argmin(distances, axis=1)
+        return [{
+            'movie_name': target_name,
+            'min_edit_distance': int(distances[i, nearest_index]),
+            'nearest_movie': self.candidates[nearest_index]
+        } for i, (target_name, nearest_index) in enumerate(zip(target_names, nearest_indices))]
+
+
 def find_nearest_movie(target_name, candidate_movies):
     """
     Find the nearest movie name using edit distance.
     
     Args:
         target_name: The movie name to match
-        candidate_movies: List of candidate movie names
+        candidate_movies: List of candidate movie names, or a MovieMatcher built on them
         
     Returns:
         Dictionary with matching information
     """
-    # Remove duplicates from candidates
-    unique_candidates = list(set(candidate_movies))
-    
-    # Calculate edit distances
-    distances = [edit_distance(target_name.lower(), candidate.lower()) 
-                for candidate in unique_candidates]
-    
-    # Find nearest match
-    nearest_index = np.argmin(distances)
-    nearest_movie = unique_candidates[nearest_index]
-    
-    return {
-        'movie_name': target_name, 
-        'min_edit_distance': distances[nearest_index], 
-        'nearest_movie': nearest_movie
-    }
+    matcher = candidate_movies if isinstance(candidate_movies, MovieMatcher) else MovieMatcher(candidate_movies)
+    return matcher.match([target_name])[0]
 
 
 def extract_recommendation_list(text, movie_candidates=None):
@@ -380,7 +344,7 @@ def extract_recommendation_list(text, movie_candidates=None):
     
     Args:
         text: Text containing recommendations
-        movie_candidates: Optional list of valid movie names for matching
+        movie_candidates: Optional list of valid movie names (or a MovieMatcher) for matching
         
     Returns:
         Tuple of (recommendation_list, preference_text)
@@ -399,9 +363,12 @@ def extract_recommendation_list(text, movie_candidates=None):
         clean_text_elements(item.strip()) for item in recommendation_text.split('\n')
     ]
     
-    # Match against candidates if provided
-    recommendation_list = ([find_nearest_movie(item, movie_candidates) for item in raw_recommendations] 
-                         if movie_candidates is not None else raw_recommendations)
+    # Match against candidates if provided, all items in one batched distance computation
+    if movie_candidates is not None:
+        matcher = movie_candidates if isinstance(movie_candidates, MovieMatcher) else MovieMatcher(movie_candidates)
+        recommendation_list = matcher.match(raw_recommendations)
+    else:
+        recommendation_list = raw_recommendations
     
     return recommendation_list, preference_text
 
@@ -410,8 +377,16 @@ def extract_recommendation_list(text, movie_candidates=None):
 # METRICS CALCULATION
 # ============================================================================
 
+class _CachedRougeTokenizer:
+    """ROUGE's default (stemming) tokenizer with a cache, so each ground truth is stemmed once."""
+
+    def __init__(self, use_stemmer=True):
+        from rouge_score.tokenizers import DefaultTokenizer
+        self.tokenize = functools.lru_cache(maxsize=65536)(DefaultTokenizer(use_stemmer).tokenize)
+
+
 # Initialize ROUGE scorer
-rouge_scorer_instance = rouge_scorer.RougeScorer(['rougeL', 'rougeLsum'], use_stemmer=True)
+rouge_scorer_instance = rouge_scorer.RougeScorer(['rougeL', 'rougeLsum'], tokenizer=_CachedRougeTokenizer(use_stemmer=True))
 
 
 def calculate_metrics(prediction, ground_truth_answers):
@@ -451,6 +426,36 @@ def calculate_metrics(prediction, ground_truth_answers):
     return metrics
 
 
+def _answer_key(ground_truth_answers):
+    return ground_truth_answers if isinstance(ground_truth_answers, str) else json.dumps(ground_truth_answers, sort_keys=True, default=str)
+
+
+def calculate_metrics_batch(predictions, ground_truth_answers_list):
+    """
+    calculate_metrics for many (prediction, ground truth answers) pairs.
+    
+    Identical pairs are scored once, and normalized / stemmed ground truths are reused across
+    predictions.
+    
+    Args:
+        predictions: List of predicted texts
+        ground_truth_answers_list: Ground truth answer(s) per prediction
+        
+    Returns:
+        List of metric dictionaries, one per prediction
+    """
+    pair_index = {}
+    unique_metrics = []
+    positions = []
+    for prediction, ground_truth_answers in zip(predictions, ground_truth_answers_list):
+        key = (prediction, _answer_key(ground_truth_answers))
+        if key not in pair_index:
+            pair_index[key] = len(unique_metrics)
+            unique_metrics.append(calculate_metrics(prediction, ground_truth_answers))
+        positions.append(pair_index[key])
+    return [dict(unique_metrics[position]) for position in positions]
+
+
 # ============================================================================
 # DATASET-SPECIFIC POST-PROCESSING
 # ============================================================================
@@ -563,18 +568,23 @@ def _process_ruler_memory_merging_dataset(output, answer, sub_dataset_name):
         return default_post_process(output, answer)
 
 
+@functools.lru_cache(maxsize=None)
+def _load_recsys_candidates(entity_mapping_path):
+    """Movie entity mapping and a matcher over its names, built once per process."""
+    name_to_id = json.load(open(entity_mapping_path))
+    id_to_name = {entity_id: extract_movie_name(name) for name, entity_id in name_to_id.items()}
+    return id_to_name, MovieMatcher(list(id_to_name.values()))
+
+
 def _process_recsys_dataset(output, answer):
     """Process recommendation system dataset outputs."""
     # Load movie entity mapping
-    entity_mapping_path = "/home/wangyu/data/entity2id.json"
-    name_to_id = json.load(open(entity_mapping_path))
-    id_to_name = {entity_id: extract_movie_name(name) for name, entity_id in name_to_id.items()}
+    id_to_name, movie_matcher = _load_recsys_candidates("/home/wangyu/data/entity2id.json")
 
-    # Get movie candidates and parse prediction
+    # Parse prediction against the movie candidates
     prediction = output["output"]
-    movie_candidates = list(id_to_name.values())
     
-    predicted_list, _ = extract_recommendation_list(prediction, movie_candidates)
+    predicted_list, _ = extract_recommendation_list(prediction, movie_matcher)
     predicted_movies = [item['nearest_movie'] for item in predicted_list]
 
     # Convert ground truth IDs to movie names / answer is a string with movie ids divided by comma
@@ -607,14 +617,15 @@ def default_post_process(output, answer):
         Tuple of (metrics_dict, additional_info_dict)
     """
     prediction = output["output"]
-    metrics = calculate_metrics(prediction, answer)
     
     # Try parsing output and take maximum scores
     parsed_prediction = parse_output(prediction)
     if parsed_prediction is not None:
-        parsed_metrics = calculate_metrics(parsed_prediction, answer)
+        metrics, parsed_metrics = calculate_metrics_batch([prediction, parsed_prediction], [answer, answer])
         metrics = {metric_name: max(original_score, parsed_metrics[metric_name]) 
                   for metric_name, original_score in metrics.items()}
+    else:
+        metrics = calculate_metrics(prediction, answer)
     
     return metrics, {"parsed_output": parsed_prediction}
 
@@ -0,0 +1,179 @@
+"""Named memory sessions shared between Memory clients and the memory server.
+
+A client creates a session once with a full snapshot of its memory and then only sends the
+insert/update/delete operations recorded since the last acknowledged sync. Both sides keep a
+hash chained over the snapshot and every applied operation; a client whose base hash does not
+match the server's (evicted session, server restart, lost request) is asked to resync in full.
+"""
+
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+def snapshot_hash(memory_data: Dict[str, Any]) -> str:
+    """Hash of a full memory snapshot (core, semantic, episodic)."""
+    payload = json.dumps([memory_data.get('core'), memory_data.get('semantic', []), memory_data.get('episodic', [])],
+                         ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def chain_hash(base_hash: str, changes: List[Dict[str, Any]]) -> str:
+    """Extend a session hash with a list of operations; O(size of the operations)."""
+    session_hash = base_hash
+    for change in changes:
+        payload = session_hash + json.dumps(change, ensure_ascii=False, sort_keys=True)
+        session_hash = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    return session_hash
+
+
+def apply_memory_changes(memory_data: Dict[str, Any], changes: List[Dict[str, Any]]) -> None:
+    """Replay Memory operations on a {'core', 'semantic', 'episodic'} dict in place.
+
+    Mirrors Memory.new_memory_insert / memory_update / memory_delete: inserts append, updates
+    replace and deletes remove the first item with the given id, and 'core' replaces the core.
+    """
+    for change in changes:
+        op = change['op']
+        if op == 'core':
+            memory_data['core'] = change['content']
+            continue
+        mem_list = memory_data.setdefault(change['memory_type'], [])
+        memory_id = change['memory_id']
+        if op == 'insert':
+            mem_list.append({memory_id: change['content']})
+            continue
+        for i, mem in enumerate(mem_list):
+            if memory_id in mem:
+                if op == 'update':
+                    mem_list[i] = {memory_id: change['content']}
+                elif op == 'delete':
+                    mem_list.pop(i)
+                else:
+                    raise ValueError(f"Unknown memory operation: {op}")
+                break
+
+
+class MemorySessionStore:
+    """Server-side LRU of memory sessions, keyed by session id."""
+
+    def __init__(self, max_sessions: int = 4096) -> None:
+        self.max_sessions = max_sessions
+        self.sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def sync(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Apply full snapshots ('memory') or operation deltas ('base_hash', 'changes', 'hash').
+
+        Returns one {'session_id', 'status', 'hash'} per entry, where status is 'ok' or 'resync'.
+        """
+        results = []
+        with self.lock:
+            for entry in entries:
+                session_id = entry['session_id']
+                if entry.get('memory') is not None:
+                    memory_data = {
+                        'core': entry['memory'].get('core'),
+                        'semantic': list(entry['memory'].get('semantic', [])),
+                        'episodic': list(entry['memory'].get('episodic', [])),
+                    }
+                    session = {'memory': memory_data, 'hash': snapshot_hash(memory_data)}
+                    self.sessions[session_id] = session
+                else:
+                    session = self.sessions.get(session_id)
+                    if session is None or session['hash'] != entry['base_hash']:
+                        results.append({'session_id': session_id, 'status': 'resync', 'hash': None})
+                        continue
+                    new_hash = chain_hash(session['hash'], entry['changes'])
+                    if new_hash != entry['hash']:
+                        results.append({'session_id': session_id, 'status': 'resync', 'hash': None})
+                        continue
+                    apply_memory_changes(session['memory'], entry['changes'])
+                    session['hash'] = new_hash
+                self.sessions.move_to_end(session_id)
+                results.append({'session_id': session_id, 'status': 'ok', 'hash': session['hash']})
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        return results
+
+    def get_many(self, session_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Memory data per session id (shallow copies), None for unknown or evicted sessions."""
+        memories = []
+        with self.lock:
+            for session_id in session_ids:
+                session = self.sessions.get(session_id)
+                if session is None:
+                    memories.append(None)
+                    continue
+                self.sessions.move_to_end(session_id)
+                memory_data = session['memory']
+                memories.append({
+                    'core': memory_data['core'],
+                    'semantic': list(memory_data['semantic']),
+                    'episodic': list(memory_data['episodic']),
+                })
+        return memories
+
+    def delete(self, session_ids: List[str]) -> None:
+        with self.lock:
+            for session_id in session_ids:
+                self.sessions.pop(session_id, None)
+
+
+class MemorySessionClient:
+    """Client side of the session protocol for a list of Memory objects."""
+
+    def __init__(self, base_url: str, timeout: float = 600) -> None:
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        import requests
+        response = requests.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _full_entry(memory) -> Dict[str, Any]:
+        return {'session_id': memory.session_id, 'memory': memory.snapshot()}
+
+    def sync(self, memories: List[Any], force_full: bool = False) -> None:
+        """Push the changes of each memory since its last acknowledged sync; resync in full where needed."""
+        entries, sent = [], []
+        for memory in memories:
+            changes = memory.pending_changes
+            if force_full or changes is None or memory.synced_hash is None:
+                entry = self._full_entry(memory)
+                new_hash = snapshot_hash(entry['memory'])
+            elif changes:
+                new_hash = chain_hash(memory.synced_hash, changes)
+                entry = {'session_id': memory.session_id, 'base_hash': memory.synced_hash,
+                         'changes': changes, 'hash': new_hash}
+            else:
+                continue
+            entries.append(entry)
+            sent.append((memory, new_hash, len(changes) if changes is not None else None))
+        if not entries:
+            return
+
+        results = self._post('/sessions/sync', {'sessions': entries})['results']
+        resync = []
+        for (memory, new_hash, num_sent), result in zip(sent, results):
+            if result['status'] == 'ok' and result['hash'] == new_hash:
+                memory.mark_synced(new_hash, num_sent)
+            else:
+                resync.append(memory)
+        if resync:
+            results = self._post('/sessions/sync', {'sessions': [self._full_entry(memory) for memory in resync]})['results']
+            for memory, result in zip(resync, results):
+                if result['status'] != 'ok':
+                    raise RuntimeError(f"Memory server refused full sync of session {memory.session_id}")
+                memory.mark_synced(result['hash'], None)
+
+    def delete(self, memories: List[Any]) -> None:
+        self._post('/sessions/delete', {'session_ids': [memory.session_id for memory in memories]})
+        for memory in memories:
+            memory.synced_hash = None
+            memory.pending_changes = None
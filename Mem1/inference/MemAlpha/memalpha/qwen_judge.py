@@ -0,0 +1,165 @@
+"""Batched completions against a Qwen server, and a memoized LLM judge built on them."""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Sequence, Tuple
+
+
+class QwenCompletionClient:
+    """Chat-templated completions with several mini-batches in flight.
+
+    The OpenAI client (and its connection pool), the tokenizer and the worker threads are created
+    once and reused across calls. Prompts of the next mini-batch are rendered while the previous
+    ones are being served.
+    """
+
+    def __init__(self, base_url: str = None, model: str = "qwen3-32b", tokenizer_name: str = "Qwen/Qwen3-32B",
+                 max_inflight_batches: int = 4) -> None:
+        from openai import OpenAI
+        self.client = OpenAI(base_url=base_url or os.getenv("QWEN_URL"), api_key="EMPTY")
+        self.model = model
+        self.tokenizer_name = tokenizer_name
+        self._tokenizer = None
+        self._tokenizer_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_inflight_batches)
+
+    @property
+    def tokenizer(self):
+        with self._tokenizer_lock:
+            if self._tokenizer is None:
+                from transformers import AutoTokenizer
+                self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name, trust_remote_code=True)
+        return self._tokenizer
+
+    def render(self, question: str, system_prompt: str = None, no_thinking: bool = False) -> str:
+        messages = [] if system_prompt is None else [{"role": "system", "content": system_prompt}]
+        messages.append({"role": "user", "content": question})
+        prompt = self.tokenizer.apply_chat_template(
+            messages,
+            tokenize=False,
+            add_generation_prompt=True
+        )
+        if no_thinking:
+            prompt += "<think></think>\n\n"
+        return prompt
+
+    def _complete_batch(self, prompts: List[str], max_tokens: int, temperature: float) -> List[str]:
+        response = self.client.completions.create(
+            model=self.model,
+            prompt=prompts,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=False
+        )
+        return [choice.text for choice in response.choices]
+
+    def submit(self, questions: Sequence[str], batch_size: int = 32, system_prompt: str = None, no_thinking: bool = False,
+               max_tokens: int = 1024, temperature: float = 0.0) -> List[Future]:
+        """Dispatch questions in mini-batches of batch_size; one future (list of responses) per mini-batch."""
+        futures = []
+        for i in range(0, len(questions), batch_size):
+            prompts = [self.render(question, system_prompt, no_thinking) for question in questions[i:i + batch_size]]
+            futures.append(self.executor.submit(self._complete_batch, prompts, max_tokens, temperature))
+        return futures
+
+    def complete(self, questions: Sequence[str], **kwargs) -> List[str]:
+        """Responses for all questions, in order."""
+        responses = []
+        for future in self.submit(questions, **kwargs):
+            responses.extend(future.result())
+        return responses
+
+
+_clients: Dict[Tuple[str, str], QwenCompletionClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_qwen_client(model: str = "qwen3-32b", base_url: str = None) -> QwenCompletionClient:
+    """Process-wide completion client per (base_url, model)."""
+    key = (base_url or os.getenv("QWEN_URL"), model)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = QwenCompletionClient(base_url=key[0], model=model)
+        return _clients[key]
+
+
+class LLMJudge:
+    """Judge responses for (question, gold answer, prediction) items, memoized by a hash of the item.
+
+    The judge runs at temperature 0, so an item seen before (e.g. identical answers across rollouts
+    and training steps) reuses the stored response instead of querying the server again. Identical
+    items within one call are sent once.
+    """
+
+    CACHE_SIZE = 200000
+
+    def __init__(self, system_prompt: str, prompt_template: str, client: QwenCompletionClient = None,
+                 batch_size: int = 256, no_thinking: bool = True) -> None:
+        self.system_prompt = system_prompt
+        self.prompt_template = prompt_template
+        self.client = client or get_qwen_client()
+        self.batch_size = batch_size
+        self.no_thinking = no_thinking
+        self.cache: "OrderedDict[str, str]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(question: str, gold_answer, prediction) -> str:
+        payload = json.dumps([question, str(gold_answer), str(prediction)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def submit(self, items: Sequence[Tuple[str, str, str]]) -> List[Future]:
+        """One future per (question, gold_answer, prediction) item, resolved with the judge's response."""
+        futures: List[Future] = [None] * len(items)
+        todo: "OrderedDict[str, List]" = OrderedDict()  # key -> [prompt, positions]
+        with self.lock:
+            for i, (question, gold_answer, prediction) in enumerate(items):
+                key = self._key(question, gold_answer, prediction)
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    futures[i] = Future()
+                    futures[i].set_result(self.cache[key])
+                elif key in todo:
+                    todo[key][1].append(i)
+                else:
+                    prompt = self.prompt_template.format(question=question, gold_answer=gold_answer, generated_answer=prediction)
+                    todo[key] = [prompt, [i]]
+        if not todo:
+            return futures
+
+        keys = list(todo)
+        batch_futures = self.client.submit([todo[key][0] for key in keys], batch_size=self.batch_size,
+                                           system_prompt=self.system_prompt, no_thinking=self.no_thinking,
+                                           temperature=0.0)
+        for b, batch_future in enumerate(batch_futures):
+            batch_keys = keys[b * self.batch_size:(b + 1) * self.batch_size]
+            item_futures = [Future() for _ in batch_keys]
+            for key, item_future in zip(batch_keys, item_futures):
+                for i in todo[key][1]:
+                    futures[i] = item_future
+            batch_future.add_done_callback(partial(self._resolve, batch_keys, item_futures))
+        return futures
+
+    def _resolve(self, keys: List[str], item_futures: List[Future], batch_future: Future) -> None:
+        try:
+            responses = batch_future.result()
+        except Exception as e:
+            for item_future in item_futures:
+                item_future.set_exception(e)
+            return
+        with self.lock:
+            for key, response in zip(keys, responses):
+                self.cache[key] = response
+                self.cache.move_to_end(key)
+            while len(self.cache) > self.CACHE_SIZE:
+                self.cache.popitem(last=False)
+        for item_future, response in zip(item_futures, responses):
+            item_future.set_result(response)
+
+    def judge(self, items: Sequence[Tuple[str, str, str]]) -> List[str]:
+        return [future.result() for future in self.submit(items)]
@@ -1,4 +1,5 @@
 import json
+import functools
 import tiktoken
 import numpy as np
 from json_repair import repair_json
@@ -11,12 +12,20 @@ except ImportError:
     RAPIDFUZZ_AVAILABLE = False
     print("rapidfuzz not available. Install with: pip install rapidfuzz")
 
+@functools.lru_cache(maxsize=None)
+def get_encoding(model="gpt-4o-mini"):
+    """Resolve the tiktoken encoding of a model once per process."""
+    return tiktoken.encoding_for_model(model)
+
+@functools.lru_cache(maxsize=65536)
+def _count_tokens_cached(text, model):
+    # Keyed by the text itself (its hash is cached on the str object), so repeated contents are counted once
+    return len(get_encoding(model).encode(text))
+
 def count_tokens(text, model="gpt-4o-mini"):
     """Count tokens using tiktoken"""
     import traceback
     
-    encoding = tiktoken.encoding_for_model(model)
-    
     # Convert input to string if it's not already a string
     if not isinstance(text, str):
         print(f"!!!! WARNING: Non-string input to count_tokens: {repr(text)} (type: {type(text)})")
@@ -33,7 +42,7 @@ def count_tokens(text, model="gpt-4o-mini"):
             print(f"!!!! FIXED: Converted to string for tokenization: {repr(text)}")
     
     try:
-        length = len(encoding.encode(text))
+        return _count_tokens_cached(text, model)
     except Exception as e:
         print(f"!!!! ERROR when processing text: {text}")
         print(f"!!!! ERROR type: {type(e).__name__}: {e}")
@@ -41,7 +50,6 @@ def count_tokens(text, model="gpt-4o-mini"):
         traceback.print_stack()
         print("!!!! END STACK TRACE")
         return 0
-    return len(encoding.encode(text))
 
 def evaluate_eurlex(predicted_answers, gold_answers):
 
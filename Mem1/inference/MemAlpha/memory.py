@@ -4,16 +4,242 @@ import json
 import os
 import openai
 import uuid
+import hashlib
+import threading
 import math
 import re
 import numpy as np
-from collections import Counter, defaultdict
+from collections import Counter, OrderedDict, defaultdict
 from dotenv import load_dotenv
 from sklearn.metrics.pairwise import cosine_similarity
-from rank_bm25 import BM25Okapi
+from .memalpha.bm25_index import BM25Index
 from .memalpha.utils import count_tokens
 
 
+class EmbeddingProvider:
+    """Base class for text embedding backends used by Memory.
+
+    ``embed`` maps a batch of texts to a (n x dim) float32 matrix in one round-trip.
+    Vectors are cached by a hash of (model, text), so re-inserting or re-searching
+    the same content never hits the backend twice. Failures raise instead of
+    returning zero vectors; callers decide how to degrade.
+    """
+
+    CACHE_SIZE = 100000
+
+    def __init__(self, model: str) -> None:
+        self.model = model
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\n{text}".encode("utf-8")).hexdigest()
+
+    def _embed_uncached(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError("Subclasses must implement _embed_uncached()")
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        keys = [self._key(text) for text in texts]
+        vectors: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    vectors[key] = self._cache[key]
+
+        # Embed each distinct uncached text once
+        todo: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                todo.setdefault(key, text)
+        if todo:
+            new_vectors = np.asarray(self._embed_uncached(list(todo.values())), dtype=np.float32)
+            with self._lock:
+                for key, vector in zip(todo.keys(), new_vectors):
+                    vectors[key] = vector
+                    self._cache[key] = vector
+                while len(self._cache) > self.CACHE_SIZE:
+                    self._cache.popitem(last=False)
+
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([vectors[key] for key in keys])
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI embeddings API with a single reused client."""
+
+    MAX_BATCH_SIZE = 2048  # max inputs per embeddings request
+
+    def __init__(self, model: str = "text-embedding-3-small") -> None:
+        super().__init__(model)
+        self._client = None
+
+    @property
+    def client(self) -> openai.OpenAI:
+        if self._client is None:
+            load_dotenv()
+            self._client = openai.OpenAI()
+        return self._client
+
+    def _embed_uncached(self, texts: List[str]) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), self.MAX_BATCH_SIZE):
+            response = self.client.embeddings.create(model=self.model, input=texts[start:start + self.MAX_BATCH_SIZE])
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return np.array(vectors, dtype=np.float32)
+
+
+class SentenceTransformerEmbeddingProvider(EmbeddingProvider):
+    """Offline embeddings with a local sentence-transformers model (no network needed once the model is cached)."""
+
+    def __init__(self, model: str = "all-MiniLM-L6-v2", device: str = None) -> None:
+        super().__init__(model)
+        self.device = device
+        self._encoder = None
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError as e:
+                raise ImportError("The local embedding backend requires sentence-transformers. "
+                                  "Install with: pip install sentence-transformers") from e
+            self._encoder = SentenceTransformer(self.model, device=self.device)
+        return self._encoder
+
+    def _embed_uncached(self, texts: List[str]) -> np.ndarray:
+        return self.encoder.encode(texts, convert_to_numpy=True, show_progress_bar=False)
+
+
+EMBEDDING_BACKENDS = {
+    "openai": OpenAIEmbeddingProvider,
+    "local": SentenceTransformerEmbeddingProvider,
+}
+
+_default_embedding_provider = None
+
+
+def get_default_embedding_provider() -> EmbeddingProvider:
+    """Process-wide provider shared by all Memory instances.
+
+    The backend is chosen with MEMALPHA_EMBEDDING_BACKEND ('openai' or 'local') and
+    MEMALPHA_EMBEDDING_MODEL overrides the backend's default model.
+    """
+    global _default_embedding_provider
+    if _default_embedding_provider is None:
+        backend = os.environ.get("MEMALPHA_EMBEDDING_BACKEND", "openai").lower()
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {backend}. Choose from {', '.join(EMBEDDING_BACKENDS)}")
+        model = os.environ.get("MEMALPHA_EMBEDDING_MODEL")
+        _default_embedding_provider = EMBEDDING_BACKENDS[backend](model) if model else EMBEDDING_BACKENDS[backend]()
+    return _default_embedding_provider
+
+
+class EmbeddingBuffer:
+    """Growable float32 matrix of embeddings with an id -> row index.
+
+    Rows are appended into a capacity-doubling buffer and deleted rows are only
+    tombstoned, so insert, update and delete are amortized O(d). Tombstones are
+    compacted away once they outnumber live rows, or when the dense matrix is read.
+    """
+
+    INITIAL_CAPACITY = 64
+
+    def __init__(self, dim: int = 1536) -> None:
+        self.dim = dim
+        self.data = np.empty((0, dim), dtype=np.float32)
+        self.size = 0  # rows in use, including tombstones
+        self.row_ids: List[str] = []  # memory id per row, None for tombstones
+        self.id2row: Dict[str, int] = {}
+        self.num_dead = 0
+
+    def __len__(self) -> int:
+        return self.size - self.num_dead
+
+    def __contains__(self, memory_id: str) -> bool:
+        return memory_id in self.id2row
+
+    def _reserve(self, capacity: int) -> None:
+        if capacity <= self.data.shape[0]:
+            return
+        new_capacity = max(capacity, 2 * self.data.shape[0], self.INITIAL_CAPACITY)
+        new_data = np.empty((new_capacity, self.dim), dtype=np.float32)
+        new_data[:self.size] = self.data[:self.size]
+        self.data = new_data
+
+    def append(self, memory_id: str, embedding: np.ndarray) -> None:
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if len(self) == 0 and embedding.shape[0] != self.dim:
+            # adopt the dimension of the embedding backend on first insert
+            self.reset(dim=embedding.shape[0])
+        if memory_id in self.id2row:
+            self.delete(memory_id)
+        self._reserve(self.size + 1)
+        self.data[self.size] = embedding
+        self.row_ids.append(memory_id)
+        self.id2row[memory_id] = self.size
+        self.size += 1
+
+    def update(self, memory_id: str, embedding: np.ndarray) -> None:
+        if memory_id not in self.id2row:
+            raise ValueError(f"Memory ID {memory_id} not found in embedding matrix")
+        self.data[self.id2row[memory_id]] = np.asarray(embedding, dtype=np.float32).reshape(-1)
+
+    def delete(self, memory_id: str) -> None:
+        if memory_id not in self.id2row:
+            raise ValueError(f"Memory ID {memory_id} not found in embedding matrix")
+        row = self.id2row.pop(memory_id)
+        self.row_ids[row] = None
+        self.num_dead += 1
+        if self.num_dead > len(self):
+            self.compact()
+
+    def compact(self) -> None:
+        """Drop tombstoned rows in place, preserving the order of live rows."""
+        if self.num_dead == 0:
+            return
+        live_rows = [row for row, memory_id in enumerate(self.row_ids) if memory_id is not None]
+        n_live = len(live_rows)
+        self.data[:n_live] = self.data[live_rows]
+        self.row_ids = [self.row_ids[row] for row in live_rows]
+        self.id2row = {memory_id: row for row, memory_id in enumerate(self.row_ids)}
+        self.size = n_live
+        self.num_dead = 0
+
+    def reset(self, ids: List[str] = None, matrix: np.ndarray = None, dim: int = None) -> None:
+        """Replace the contents, e.g. when restoring a saved state."""
+        ids = list(ids or [])
+        if matrix is not None and np.asarray(matrix).size > 0:
+            matrix = np.asarray(matrix, dtype=np.float32)
+            dim = matrix.shape[1]
+        else:
+            matrix = None
+        self.dim = dim or self.dim
+        self.data = np.empty((0, self.dim), dtype=np.float32)
+        self.size, self.num_dead = 0, 0
+        self.row_ids, self.id2row = [], {}
+        if matrix is not None:
+            self._reserve(matrix.shape[0])
+            self.data[:matrix.shape[0]] = matrix
+            self.size = matrix.shape[0]
+        # ids beyond the number of stored rows (e.g. a missing embeddings file) have no embedding
+        self.row_ids = ids[:self.size]
+        self.id2row = {memory_id: row for row, memory_id in enumerate(self.row_ids)}
+        if len(self.row_ids) < self.size:
+            self.size = len(self.row_ids)
+
+    def matrix(self) -> np.ndarray:
+        """Dense (live rows x dim) view; valid until the next mutation."""
+        self.compact()
+        return self.data[:self.size]
+
+    def ids(self) -> List[str]:
+        self.compact()
+        return list(self.row_ids)
+
+
 class Memory:
     """Holds core, semantic, episodic memories entirely in RAM."""
 
@@ -23,7 +249,8 @@ class Memory:
     MODEL = "gpt-4o-mini"  # Same model as agent.py
     TOPK = 20
 
-    def __init__(self, including_core: bool = False, disabled_memory_types: List[str] = None) -> None:
+    def __init__(self, including_core: bool = False, disabled_memory_types: List[str] = None,
+                 embedding_provider: EmbeddingProvider = None) -> None:
         disabled_memory_types = disabled_memory_types or []
         normalized_disabled = {mem_type.lower() for mem_type in disabled_memory_types}
         invalid = normalized_disabled - {"core", "semantic", "episodic"}
@@ -33,6 +260,23 @@ class Memory:
         self.disabled_memory_types = normalized_disabled
         including_core = including_core and "core" not in self.disabled_memory_types
 
+        # Token counts per memory item (parallel to the memory lists) and their running sums,
+        # maintained by the memory setters and mutators so total_length is O(1)
+        self.item_tokens: Dict[str, List[int]] = {"semantic": [], "episodic": []}
+        self.type_tokens: Dict[str, int] = {"core": 0, "semantic": 0, "episodic": 0}
+        # Lookup indexes over the memory lists, maintained like the token counts: content -> multiset
+        # of ids holding it (duplicate checks) and id -> position of its first item (id lookups)
+        self.content_ids: Dict[str, Dict[str, Counter]] = {"semantic": {}, "episodic": {}}
+        self.id_positions: Dict[str, Dict[str, int]] = {"semantic": {}, "episodic": {}}
+        # Memory server session (see memalpha/memory_sessions.py): operations recorded since the last
+        # acknowledged sync, or None when the next sync has to send a full snapshot
+        self.session_id = uuid.uuid4().hex
+        self.synced_hash = None
+        self.pending_changes: List[Dict[str, str]] = None
+        # Chunk checkpoints of main.py: operations recorded since the last checkpoint record, or None
+        # when the next record has to hold a full snapshot. Kept apart from the session deltas above
+        self.checkpoint_changes: List[Dict[str, str]] = None
+
         if including_core:
             self.core: str = ""  # Changed to simple string
         else:
@@ -40,14 +284,214 @@ class Memory:
         self.instructions = None
         self.semantic: List[Dict[str, str]] = []
         self.episodic: List[Dict[str, str]] = []
-        # Embeddings stored as matrices for batch operations
-        self.semantic_embedding_matrix: np.ndarray = np.empty((0, 1536))  # text-embedding-3-small has 1536 dimensions
-        self.episodic_embedding_matrix: np.ndarray = np.empty((0, 1536))
-        # Memory ID mappings to track which row corresponds to which memory
-        self.semantic_embedding_ids: List[str] = []
-        self.episodic_embedding_ids: List[str] = []
+        # Embeddings stored in growable matrices for batch operations, with id -> row mappings
+        self.embedding_buffers: Dict[str, EmbeddingBuffer] = {
+            "semantic": EmbeddingBuffer(1536),  # text-embedding-3-small has 1536 dimensions
+            "episodic": EmbeddingBuffer(1536),
+        }
+        # Texts inserted/updated since the last flush, embedded together in one batched request
+        self.pending_embeddings: Dict[str, Dict[str, str]] = {"semantic": {}, "episodic": {}}
+        # BM25 inverted indexes, synced incrementally with the memory lists on each search
+        self.bm25_indexes: Dict[str, BM25Index] = {"semantic": BM25Index(), "episodic": BM25Index()}
+        self.embedding_provider = embedding_provider or get_default_embedding_provider()
         self.including_core = including_core
 
+    # Assigning a whole memory (e.g. when restoring a saved state) recounts its tokens
+    @property
+    def core(self) -> str:
+        return self._core
+
+    @core.setter
+    def core(self, content: str) -> None:
+        self._core = content
+        self.type_tokens["core"] = count_tokens(content) if content is not None else 0
+        self._record_change({"op": "core", "content": content})
+
+    @property
+    def semantic(self) -> List[Dict[str, str]]:
+        return self._semantic
+
+    @semantic.setter
+    def semantic(self, mem_list: List[Dict[str, str]]) -> None:
+        self._semantic = mem_list
+        self._recount_tokens("semantic")
+        self._reindex("semantic")
+        self.pending_changes = None
+        self.checkpoint_changes = None
+
+    @property
+    def episodic(self) -> List[Dict[str, str]]:
+        return self._episodic
+
+    @episodic.setter
+    def episodic(self, mem_list: List[Dict[str, str]]) -> None:
+        self._episodic = mem_list
+        self._recount_tokens("episodic")
+        self._reindex("episodic")
+        self.pending_changes = None
+        self.checkpoint_changes = None
+
+    def snapshot(self) -> Dict:
+        """The memory contents as sent to the memory server."""
+        return {"core": self.core, "semantic": self.semantic, "episodic": self.episodic}
+
+    def _record_change(self, change: Dict[str, str]) -> None:
+        if self.pending_changes is not None:
+            self.pending_changes.append(change)
+        if self.checkpoint_changes is not None:
+            self.checkpoint_changes.append(change)
+
+    def mark_synced(self, session_hash: str, num_changes: int = None) -> None:
+        """Acknowledge a sync of the first num_changes pending changes (None: a full snapshot)."""
+        self.synced_hash = session_hash
+        self.pending_changes = [] if num_changes is None else self.pending_changes[num_changes:]
+
+    def _count_item_tokens(self, mem_type: str, mem_idx: int, mem: Dict[str, str]) -> int:
+        item_tokens = 0
+        for mem_id, content in mem.items():
+            # Debug: Check if content is problematic with detailed info
+            if not isinstance(content, str):
+                print(f"!!!! MEMORY ERROR: Non-string content found!")
+                print(f"  Memory type: {mem_type}")
+                print(f"  Memory index: {mem_idx}")
+                print(f"  Memory ID: {mem_id}")
+                print(f"  Content: {repr(content)}")
+                print(f"  Content type: {type(content)}")
+                print(f"  Memory object ID: {id(mem)}")
+                print(f"  Full memory item: {repr(mem)}")
+                # Also check if it's a numpy/torch type
+                if hasattr(content, 'item'):
+                    print(f"  Has .item() method, value: {content.item()}")
+                if hasattr(content, 'dtype'):
+                    print(f"  Has dtype: {content.dtype}")
+            item_tokens += count_tokens(content)
+        return item_tokens
+
+    def _recount_tokens(self, mem_type: str) -> None:
+        mem_list = getattr(self, mem_type)
+        self.item_tokens[mem_type] = [self._count_item_tokens(mem_type, mem_idx, mem) for mem_idx, mem in enumerate(mem_list)]
+        self.type_tokens[mem_type] = sum(self.item_tokens[mem_type])
+
+    def _set_item_tokens(self, mem_type: str, mem_idx: int, mem: Dict[str, str] = None) -> None:
+        """Track an appended (mem_idx == len), replaced or deleted (mem is None) memory item."""
+        item_tokens = self.item_tokens[mem_type]
+        if mem_idx < len(item_tokens):
+            self.type_tokens[mem_type] -= item_tokens[mem_idx]
+        if mem is None:
+            item_tokens.pop(mem_idx)
+            return
+        new_tokens = self._count_item_tokens(mem_type, mem_idx, mem)
+        if mem_idx < len(item_tokens):
+            item_tokens[mem_idx] = new_tokens
+        else:
+            item_tokens.append(new_tokens)
+        self.type_tokens[mem_type] += new_tokens
+
+    def _index_item(self, mem_type: str, mem_idx: int, mem: Dict[str, str]) -> None:
+        id_positions = self.id_positions[mem_type]
+        for mem_id, content in mem.items():
+            self.content_ids[mem_type].setdefault(content, Counter())[mem_id] += 1
+            id_positions.setdefault(mem_id, mem_idx)
+
+    def _unindex_item(self, mem_type: str, mem: Dict[str, str]) -> None:
+        content_ids = self.content_ids[mem_type]
+        for mem_id, content in mem.items():
+            ids = content_ids[content]
+            ids[mem_id] -= 1
+            if ids[mem_id] <= 0:
+                del ids[mem_id]
+            if not ids:
+                del content_ids[content]
+
+    def _reindex(self, mem_type: str) -> None:
+        self.content_ids[mem_type] = {}
+        self.id_positions[mem_type] = {}
+        for mem_idx, mem in enumerate(getattr(self, mem_type)):
+            self._index_item(mem_type, mem_idx, mem)
+
+    def _find_memory(self, mem_type: str, memory_id: str) -> int:
+        """Position of the first item holding memory_id, or -1."""
+        return self.id_positions[mem_type].get(memory_id, -1)
+
+    # Read-only dense views used when saving agent states; use set_embeddings to restore them
+    @property
+    def semantic_embedding_matrix(self) -> np.ndarray:
+        self.flush_embeddings("semantic")
+        return self.embedding_buffers["semantic"].matrix()
+
+    @property
+    def episodic_embedding_matrix(self) -> np.ndarray:
+        self.flush_embeddings("episodic")
+        return self.embedding_buffers["episodic"].matrix()
+
+    @property
+    def semantic_embedding_ids(self) -> List[str]:
+        self.flush_embeddings("semantic")
+        return self.embedding_buffers["semantic"].ids()
+
+    @property
+    def episodic_embedding_ids(self) -> List[str]:
+        self.flush_embeddings("episodic")
+        return self.embedding_buffers["episodic"].ids()
+
+    def set_embeddings(self, memory_type: str, ids: List[str] = None, matrix: np.ndarray = None) -> None:
+        """Replace the stored embeddings of a memory type, e.g. when restoring a saved state."""
+        self.pending_embeddings[memory_type].clear()
+        self.embedding_buffers[memory_type].reset(ids=ids, matrix=matrix)
+
+    def flush_embeddings(self, memory_type: str = None) -> bool:
+        """Embed all pending texts in one batched provider call and store them in the buffers.
+
+        Called at the end of a chunk's tool calls and lazily before any embedding read.
+        On failure the texts stay pending (retried on the next flush) and False is returned.
+        """
+        memory_types = [memory_type] if memory_type else list(self.pending_embeddings)
+        todo = [(mem_type, memory_id, content)
+                for mem_type in memory_types
+                for memory_id, content in self.pending_embeddings[mem_type].items()]
+        if not todo:
+            return True
+        try:
+            embeddings = self.embedding_provider.embed([content for _, _, content in todo])
+        except Exception as e:
+            print(f"Error generating embeddings for {len(todo)} memories: {e}")
+            return False
+        for (mem_type, memory_id, _), embedding in zip(todo, embeddings):
+            embedding_buffer = self.embedding_buffers[mem_type]
+            if memory_id in embedding_buffer:
+                # Overwrite the embedding row in place
+                embedding_buffer.update(memory_id, embedding)
+            else:
+                # Append embedding to the growable matrix (amortized O(d))
+                embedding_buffer.append(memory_id, embedding)
+        for mem_type in memory_types:
+            self.pending_embeddings[mem_type].clear()
+        return True
+
+    @staticmethod
+    def flush_all_embeddings(memories: List["Memory"]) -> None:
+        """Flush the pending embeddings of many memories (e.g. a batch after one chunk) with one request per provider."""
+        provider_texts = defaultdict(list)
+        for memory in memories:
+            for pending in memory.pending_embeddings.values():
+                provider_texts[memory.embedding_provider].extend(pending.values())
+        for provider, texts in provider_texts.items():
+            if texts:
+                try:
+                    # Warm the provider cache so the per-memory flushes below are cache hits
+                    provider.embed(texts)
+                except Exception as e:
+                    print(f"Error generating embeddings for {len(texts)} memories: {e}")
+        for memory in memories:
+            memory.flush_embeddings()
+
+    def recalculate_embeddings(self, memory_type: str) -> None:
+        """Rebuild the embeddings of a memory type from its contents with batched requests."""
+        self.set_embeddings(memory_type)
+        for mem in getattr(self, memory_type):
+            self.pending_embeddings[memory_type].update(mem)
+        self.flush_embeddings(memory_type)
+
     def is_memory_type_enabled(self, memory_type: str) -> bool:
         """Check if a memory type is enabled for this run."""
         memory_type = memory_type.lower()
@@ -77,30 +521,13 @@ class Memory:
         total_length = 0
         if self.is_memory_type_enabled("core") and self.core is not None:
             # Core is now a simple string
-            total_length += count_tokens(self.core)
+            total_length += self.type_tokens["core"]
         
-        # Handle semantic and episodic memories
-        for mem_type, mem_list in [("semantic", self.semantic), ("episodic", self.episodic)]:
+        # Handle semantic and episodic memories (per-item counts are kept up to date on every change)
+        for mem_type in ["semantic", "episodic"]:
             if not self.is_memory_type_enabled(mem_type):
                 continue
-            for mem_idx, mem in enumerate(mem_list):
-                for mem_id, content in mem.items():
-                    # Debug: Check if content is problematic with detailed info
-                    if not isinstance(content, str):
-                        print(f"!!!! MEMORY ERROR: Non-string content found!")
-                        print(f"  Memory type: {mem_type}")
-                        print(f"  Memory index: {mem_idx}")
-                        print(f"  Memory ID: {mem_id}")
-                        print(f"  Content: {repr(content)}")
-                        print(f"  Content type: {type(content)}")
-                        print(f"  Memory object ID: {id(mem)}")
-                        print(f"  Full memory item: {repr(mem)}")
-                        # Also check if it's a numpy/torch type
-                        if hasattr(content, 'item'):
-                            print(f"  Has .item() method, value: {content.item()}")
-                        if hasattr(content, 'dtype'):
-                            print(f"  Has dtype: {content.dtype}")
-                    total_length += count_tokens(content)
+            total_length += self.type_tokens[mem_type]
         
         return total_length
 
@@ -113,27 +540,11 @@ class Memory:
         if memory_type == 'core':
             return self.core == content if self.core is not None else False
         else:
-            mem_list = getattr(self, memory_type)
-            for mem in mem_list:
-                for _, existing_content in mem.items():
-                    if existing_content == content:
-                        return True
-            return False
+            return content in self.content_ids[memory_type]
 
     def _get_embedding(self, text: str) -> np.ndarray:
-        """Generate embedding for text using OpenAI's embedding model."""
-        try:
-            load_dotenv()
-            client = openai.OpenAI()
-            response = client.embeddings.create(
-                model="text-embedding-3-small",
-                input=text
-            )
-            return np.array(response.data[0].embedding)
-        except Exception as e:
-            # print(f"Error generating embedding: {e}")
-            # Return a zero vector as fallback
-            return np.zeros(1536)  # text-embedding-3-small has 1536 dimensions
+        """Generate embedding for a single text with the configured embedding provider."""
+        return self.embedding_provider.embed([text])[0]
 
     # --------------------------------------------------
     # Rendering helpers
@@ -379,19 +790,15 @@ CONSOLIDATION OBJECTIVES:
             
             # For semantic and episodic memories, use the existing logic
             memory_id = self._generate_memory_id()
-            getattr(self, memory_type).append({memory_id: content})
+            mem_list = getattr(self, memory_type)
+            mem_list.append({memory_id: content})
+            self._set_item_tokens(memory_type, len(mem_list) - 1, mem_list[-1])
+            self._index_item(memory_type, len(mem_list) - 1, mem_list[-1])
+            self._record_change({"op": "insert", "memory_type": memory_type, "memory_id": memory_id, "content": content})
             
-            # Generate and store embedding for semantic and episodic memories
+            # Queue the embedding for semantic and episodic memories; see flush_embeddings
             if memory_type in ['semantic', 'episodic']:
-                embedding = self._get_embedding(content)
-                # Add embedding to matrix
-                embedding_matrix = getattr(self, f"{memory_type}_embedding_matrix")
-                embedding_ids = getattr(self, f"{memory_type}_embedding_ids")
-                
-                # Append embedding to matrix
-                new_matrix = np.vstack([embedding_matrix, embedding.reshape(1, -1)])
-                setattr(self, f"{memory_type}_embedding_matrix", new_matrix)
-                embedding_ids.append(memory_id)
+                self.pending_embeddings[memory_type][memory_id] = content
             
             return {memory_id: content}
 
@@ -432,21 +839,25 @@ CONSOLIDATION OBJECTIVES:
         else:
             # For semantic and episodic memories, use the existing logic
             mem_list = getattr(self, memory_type)
-            for i, mem in enumerate(mem_list):
-                if memory_id in mem:
-                    mem_list[i] = {memory_id: new_content}
-                    break
-            
-            # Update embedding for semantic and episodic memories
-            if memory_type in ['semantic', 'episodic']:
-                embedding = self._get_embedding(new_content)
-                embedding_matrix = getattr(self, f"{memory_type}_embedding_matrix")
-                embedding_ids = getattr(self, f"{memory_type}_embedding_ids")
-                
-                # Find and update the embedding in the matrix
-                idx = embedding_ids.index(memory_id)
-                embedding_matrix[idx] = embedding
-            
+            i = self._find_memory(memory_type, memory_id)
+            if i >= 0:
+                old_mem = mem_list[i]
+                mem_list[i] = {memory_id: new_content}
+                if len(old_mem) > 1:
+                    # Items normally hold a single id; rebuild the indexes if the update drops others
+                    self._reindex(memory_type)
+                else:
+                    self._unindex_item(memory_type, old_mem)
+                    self._index_item(memory_type, i, mem_list[i])
+                self._set_item_tokens(memory_type, i, mem_list[i])
+                self._record_change({"op": "update", "memory_type": memory_type, "memory_id": memory_id, "content": new_content})
+
+                # Queue the new embedding for semantic and episodic memories; see flush_embeddings
+                if memory_type in ['semantic', 'episodic']:
+                    self.pending_embeddings[memory_type][memory_id] = new_content
+            else:
+                raise ValueError(f"Memory ID {memory_id} not found")
+
             updated_memory = {memory_id: new_content}
             return updated_memory
 
@@ -469,25 +880,32 @@ CONSOLIDATION OBJECTIVES:
         else:
             # For semantic and episodic memories, use the existing logic
             mem_list = getattr(self, memory_type)
-            for i, mem in enumerate(mem_list):
-                if memory_id in mem:
-                    mem_list.pop(i)
-                    break
+            i = self._find_memory(memory_type, memory_id)
+            if i >= 0:
+                deleted_mem = mem_list.pop(i)
+                self._unindex_item(memory_type, deleted_mem)
+                self._set_item_tokens(memory_type, i)
+                self._record_change({"op": "delete", "memory_type": memory_type, "memory_id": memory_id})
+                # Items after the deleted one shift down by one position
+                id_positions = self.id_positions[memory_type]
+                for mem in [deleted_mem] + mem_list[i:]:
+                    for mem_id in mem:
+                        if id_positions.get(mem_id, -1) >= i:
+                            del id_positions[mem_id]
+                for j in range(i, len(mem_list)):
+                    for mem_id in mem_list[j]:
+                        id_positions.setdefault(mem_id, j)
             
             # Delete corresponding embedding for semantic and episodic memories
             if memory_type in ['semantic', 'episodic']:
-                embedding_matrix = getattr(self, f"{memory_type}_embedding_matrix")
-                embedding_ids = getattr(self, f"{memory_type}_embedding_ids")
-                
-                # Find and remove the embedding from the matrix
+                pending = self.pending_embeddings[memory_type].pop(memory_id, None)
+                # Tombstone the embedding row; the buffer compacts lazily
                 try:
-                    idx = embedding_ids.index(memory_id)
-                    # Remove row from matrix
-                    new_matrix = np.delete(embedding_matrix, idx, axis=0)
-                    setattr(self, f"{memory_type}_embedding_matrix", new_matrix)
-                    # Remove ID from list
-                    embedding_ids.pop(idx)
+                    self.embedding_buffers[memory_type].delete(memory_id)
                 except ValueError:
+                    if pending is not None:
+                        # Inserted since the last flush, never embedded
+                        return
                     # Memory ID not found in embeddings, this shouldn't happen but handle gracefully
                     print(f"Warning: Memory ID {memory_id} not found in embedding matrix")
 
@@ -532,7 +950,7 @@ CONSOLIDATION OBJECTIVES:
             raise ValueError(f"Unknown search method: {search_method}. Use 'bm25' or 'text-embedding'.")
 
     def _search_bm25(self, memory_type: str, query: str, top_k: int = None, min_score: float = 0.0) -> List[Tuple[Dict[str, str], float]]:
-        """Search using BM25 ranking algorithm with rank_bm25 library."""
+        """Search using BM25 ranking over an incrementally maintained inverted index."""
         mem_list = getattr(self, memory_type)
         
         # Tokenize query
@@ -542,32 +960,25 @@ CONSOLIDATION OBJECTIVES:
         
         # Prepare documents and their metadata
         documents = []
-        doc_contents = []
         
         for mem in mem_list:
             for memory_id, content in mem.items():
                 documents.append((memory_id, content))
-                doc_contents.append(content)
         
         if not documents:
             return []
         
-        # Tokenize all documents
-        tokenized_corpus = []
-        for content in doc_contents:
-            doc_tokens = self._tokenize(content)
-            tokenized_corpus.append(doc_tokens)
-        
-        # Create BM25 object
-        bm25 = BM25Okapi(tokenized_corpus)
+        # Only contents added, updated or deleted since the last search are (re-)tokenized
+        bm25_index = self.bm25_indexes[memory_type]
+        bm25_index.sync(content for _, content in documents)
         
         # Get scores for the query
-        doc_scores = bm25.get_scores(query_tokens)
+        doc_scores = bm25_index.get_scores(query)
         
         # Create results with scores
         results = []
-        for i, (memory_id, content) in enumerate(documents):
-            score = doc_scores[i]
+        for memory_id, content in documents:
+            score = doc_scores.get(content, 0.0)
             if score >= min_score:
                 results.append(({memory_id: content}, score))
         
@@ -583,17 +994,23 @@ CONSOLIDATION OBJECTIVES:
     def _search_embedding(self, memory_type: str, query: str, top_k: int = None, min_score: float = 0.0) -> List[Tuple[Dict[str, str], float]]:
         """Search using text embedding cosine similarity with batch calculation."""
         mem_list = getattr(self, memory_type)
-        embedding_matrix = getattr(self, f"{memory_type}_embedding_matrix")
-        embedding_ids = getattr(self, f"{memory_type}_embedding_ids")
-        
-        if not mem_list or embedding_matrix.shape[0] == 0:
-            return []
-        
-        # Get query embedding
-        query_embedding = self._get_embedding(query)
-        if np.allclose(query_embedding, 0):  # Check if embedding generation failed
+        embedding_buffer = self.embedding_buffers[memory_type]
+
+        # Embed the query together with the memories written since the last flush in one request;
+        # both are then served from the provider's cache
+        try:
+            self.embedding_provider.embed(list(self.pending_embeddings[memory_type].values()) + [query])
+        except Exception as e:
+            raise RuntimeError(f"Embedding generation failed: {e}") from e
+        self.flush_embeddings(memory_type)
+        query_embedding = self.embedding_provider.embed([query])[0]
+
+        if not mem_list or len(embedding_buffer) == 0:
             return []
         
+        embedding_matrix = embedding_buffer.matrix()
+        embedding_ids = embedding_buffer.ids()
+
         # Batch calculate cosine similarity for all embeddings at once
         similarities = cosine_similarity(
             query_embedding.reshape(1, -1), 
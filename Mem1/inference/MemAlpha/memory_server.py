@@ -12,13 +12,21 @@ import json
 import logging
 import argparse
 import re
+import time
+import hashlib
+import functools
+import threading
 import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List, Dict, Any, Tuple
 from flask import Flask, request, jsonify
 from openai import OpenAI, AzureOpenAI
 from transformers import AutoTokenizer
 import dotenv
 from openrouter_worker import init_openrouter_worker, run_openrouter_completion
+from memalpha.bm25_index import BM25Index
+from memalpha.memory_sessions import MemorySessionStore
 
 # Load environment variables
 dotenv.load_dotenv()
@@ -61,12 +69,46 @@ MODEL_NAME = "qwen3-4b-think-FC"  # Options: "gpt-4o-mini", "gpt-4.1-mini", "qwe
 # Global variable to store server URL from command line
 SERVER_URL = None
 
+@functools.lru_cache(maxsize=None)
+def get_tiktoken_encoding(model: str):
+    """Resolve the tiktoken encoding of a model once per process."""
+    import tiktoken
+    return tiktoken.encoding_for_model(model)
+
+
 class MemoryProcessor:
     """Processes memories and generates responses using OpenAI."""
 
+    BM25_CACHE_SIZE = 256  # Number of memory snapshots whose BM25 index is kept
+    FRAGMENTS_CACHE_SIZE = 1024  # Number of core memories whose prompt head is kept rendered and counted
+    PACKING_SLACK = 16  # Tokens around the budget within which pack_memories re-counts the whole prompt
+
+    SYSTEM_PROMPT_HEAD = """You are a reasoning assistant with access to structured memory. Use the memories below to provide accurate, relevant, and comprehensive responses to user queries.
+
+MEMORY STRUCTURE:
+{memory_structure}
+
+CURRENT MEMORY STATE:
+
+"""
+    SYSTEM_PROMPT_TAIL = """
+
+INSTRUCTIONS:
+- Use the memories above to inform your responses
+- If information is available in memory, reference it appropriately
+- If memory is insufficient to answer a question, acknowledge this clearly
+- Provide helpful and contextual responses based on the available memory
+- Be concise but comprehensive in your answers"""
+
     def __init__(self, server_url=None):
         """Initialize the OpenAI client based on model configuration."""
         self.model = MODEL_NAME
+        self.bm25_cache: "OrderedDict[str, BM25Index]" = OrderedDict()
+        self.bm25_cache_lock = threading.Lock()
+        # Token counts by text; memory lines and prompts are counted again and again across questions
+        self._count_tokens_cached = functools.lru_cache(maxsize=65536)(self._encode_length)
+        # Rendered prompt head (and its token count) per core memory, shared by all questions of a memory set
+        self.prompt_fragments = functools.lru_cache(maxsize=self.FRAGMENTS_CACHE_SIZE)(self._prompt_fragments)
 
         if self.model == "qwen3-4b-think-FC":
             if server_url:
@@ -322,23 +364,29 @@ Respond ONLY with a JSON code block in this exact format:
         if not memory_list:
             return f"<{block_name}>\n(No memories stored)\n</{block_name}>"
 
-        formatted_memories = []
-        for i, memory_item in enumerate(memory_list, 1):
-            if isinstance(memory_item, dict):
-                # Handle dict format like {'id': 'content'} or {'content': 'text'}
-                if len(memory_item) == 1:
-                    # Single key-value pair, use the value
-                    content = list(memory_item.values())[0]
-                else:
-                    # Multiple keys, look for common content keys
-                    content = memory_item.get('content', str(memory_item))
-            else:
-                content = str(memory_item)
-
-            formatted_memories.append(f"{i}. {content}")
+        formatted_memories = [self._format_memory_line(i, memory_item) for i, memory_item in enumerate(memory_list, 1)]
 
         return f"<{block_name}>\n" + "\n".join(formatted_memories) + f"\n</{block_name}>"
 
+    def _format_memory_line(self, index: int, memory_item: Any) -> str:
+        """Format the numbered line of one semantic or episodic memory item."""
+        return f"{index}. {self._memory_item_content(memory_item)}"
+
+    @staticmethod
+    def _memory_item_content(memory_item: Any) -> str:
+        if isinstance(memory_item, dict):
+            # Handle dict format like {'id': 'content'} or {'content': 'text'}
+            if len(memory_item) == 1:
+                # Single key-value pair, use the value
+                content = list(memory_item.values())[0]
+            else:
+                # Multiple keys, look for common content keys
+                content = memory_item.get('content', str(memory_item))
+        else:
+            content = str(memory_item)
+
+        return content
+
     def _format_core_memory_block(self, core_memory: Any) -> str:
         """Format core memory block (core memory is a string or None)."""
         if not core_memory:
@@ -352,6 +400,15 @@ Respond ONLY with a JSON code block in this exact format:
         tokens = re.findall(r'\b\w+\b', text.lower())
         return tokens
 
+    def _encode_length(self, text: str) -> int:
+        if self.tokenizer is not None:
+            # Use the model's tokenizer for accurate token counting
+            return len(self.tokenizer.encode(text))
+        else:
+            # For Azure models without tokenizer, use tiktoken
+            # Use GPT-4 encoding as a reasonable approximation
+            return len(get_tiktoken_encoding("gpt-4").encode(text))
+
     def count_tokens(self, text: str) -> int:
         """Count tokens in text using the appropriate tokenizer."""
         import traceback
@@ -372,15 +429,7 @@ Respond ONLY with a JSON code block in this exact format:
                 print(f"!!!! FIXED: Converted to string for tokenization: {repr(text)}")
 
         try:
-            if self.tokenizer is not None:
-                # Use the model's tokenizer for accurate token counting
-                return len(self.tokenizer.encode(text))
-            else:
-                # For Azure models without tokenizer, use tiktoken
-                import tiktoken
-                # Use GPT-4 encoding as a reasonable approximation
-                encoding = tiktoken.encoding_for_model("gpt-4")
-                return len(encoding.encode(text))
+            return self._count_tokens_cached(text)
         except Exception as e:
             print(f"!!!! ERROR in MemoryProcessor.count_tokens when processing text: {text}")
             print(f"!!!! ERROR type: {type(e).__name__}: {e}")
@@ -389,37 +438,50 @@ Respond ONLY with a JSON code block in this exact format:
             print("!!!! END STACK TRACE")
             return 0
 
-    def search_memories(self, memory_data: Dict[str, Any], query: str, top_k: int = 20) -> Dict[str, Any]:
-        """Search memories using BM25 and return top-k results for semantic and episodic memories.
+    def _get_bm25_index(self, contents: List[str]) -> BM25Index:
+        """Return the BM25 index of a memory snapshot, built once and cached by content hash."""
+        key = hashlib.sha256("\x00".join(contents).encode("utf-8")).hexdigest()
+        with self.bm25_cache_lock:
+            bm25_index = self.bm25_cache.get(key)
+            if bm25_index is not None:
+                self.bm25_cache.move_to_end(key)
+                return bm25_index
+
+        bm25_index = BM25Index()
+        bm25_index.sync(contents)
+        with self.bm25_cache_lock:
+            self.bm25_cache[key] = bm25_index
+            while len(self.bm25_cache) > self.BM25_CACHE_SIZE:
+                self.bm25_cache.popitem(last=False)
+        return bm25_index
+
+    def rank_memories(self, memory_data: Dict[str, Any], queries: List[str]) -> List[Dict[str, Any]]:
+        """Rank semantic and episodic memories by BM25 for many queries over the same memory.
 
         Args:
             memory_data: Dictionary containing 'core', 'semantic', and 'episodic' memories
-            query: Search query string
-            top_k: Number of top results to return for each memory type
+            queries: Search query strings
 
         Returns:
-            Dictionary with same structure as memory_data but with filtered memories
+            One dictionary per query with the same structure as memory_data, where the semantic
+            and episodic lists hold all memories sorted by score; slice them with take_top_k
         """
-        from rank_bm25 import BM25Okapi
-
-        result = {
+        results = [{
             'core': memory_data.get('core', None),
             'semantic': [],
             'episodic': []
-        }
+        } for _ in queries]
 
         # Process semantic and episodic memories
         for memory_type in ['semantic', 'episodic']:
             memories = memory_data.get(memory_type, [])
-            if not memories or not query.strip():
+            if not memories:
                 continue
 
             # Prepare documents for BM25
             documents = []
-            doc_contents = []
-            original_indices = []  # Track original position for episodic sorting
 
-            for idx, mem in enumerate(memories):
+            for mem in memories:
                 # Handle the expected structure: each mem is a dict with single key-value pair
                 # where key is memory_id and value is content
 
@@ -432,91 +494,135 @@ Respond ONLY with a JSON code block in this exact format:
                 if not isinstance(content, str):
                     content = str(content)
 
-                documents.append((memory_id, content, idx))
-                doc_contents.append(content)
-                original_indices.append(idx)
+                documents.append((memory_id, content))
 
-            if not documents:
-                continue
+            # The index is built once per memory snapshot and shared by all queries (and later requests)
+            bm25_index = self._get_bm25_index([content for _, content in documents])
+            all_doc_scores = bm25_index.get_batch_scores(queries)
 
-            # Tokenize query and documents
-            query_tokens = self._tokenize(query)
-            if not query_tokens:
-                continue
+            for query, doc_scores, result in zip(queries, all_doc_scores, results):
+                # Skip empty queries and queries without any token, as before
+                if not query.strip() or not self._tokenize(query):
+                    continue
 
-            tokenized_corpus = []
-            for content in doc_contents:
-                doc_tokens = self._tokenize(content)
-                tokenized_corpus.append(doc_tokens)
+                # Create results with scores
+                scored_results = [({memory_id: content}, doc_scores.get(content, 0.0))
+                                  for memory_id, content in documents]
 
-            # Perform BM25 search
-            bm25 = BM25Okapi(tokenized_corpus)
-            doc_scores = bm25.get_scores(query_tokens)
+                # Sort by score descending (stable, so ties keep the original order)
+                scored_results.sort(key=lambda x: x[1], reverse=True)
 
-            # Create results with scores
-            scored_results = []
-            for i, (memory_id, content, orig_idx) in enumerate(documents):
-                score = doc_scores[i]
-                scored_results.append(({memory_id: content}, score, orig_idx))
+                # Extract just the memory dictionaries
+                result[memory_type] = [scored[0] for scored in scored_results]
 
-            # Sort by score descending and take top_k
-            scored_results.sort(key=lambda x: x[1], reverse=True)
-            top_results = scored_results[:top_k]
+        return results
 
-            # # For episodic memory, sort by original order after retrieval
-            # if memory_type == 'episodic':
-            #     top_results.sort(key=lambda x: x[2])  # Sort by original index
+    @staticmethod
+    def take_top_k(ranked_memory_data: Dict[str, Any], top_k: int) -> Dict[str, Any]:
+        """Keep the top_k semantic and episodic memories of a rank_memories result."""
+        return {
+            'core': ranked_memory_data['core'],
+            'semantic': ranked_memory_data['semantic'][:top_k],
+            'episodic': ranked_memory_data['episodic'][:top_k]
+        }
 
-            # Extract just the memory dictionaries
-            filtered_memories = [result[0] for result in top_results]
-            result[memory_type] = filtered_memories
+    def pack_memories(self, ranked_memory_data: Dict[str, Any], memory_data: Dict[str, Any],
+                      max_top_k: int = 20, token_budget: int = 30000) -> Tuple[Dict[str, Any], str, int, int]:
+        """Pick the largest top_k <= max_top_k whose system prompt fits in token_budget.
 
-        return result
+        Gives the same top_k as trying max_top_k, max_top_k - 1, ... 1 in turn, without tokenizing a
+        prompt for every candidate. The token count of each candidate prompt is the sum of cached
+        fragment counts: the prompt head per core memory, and each numbered memory line. Only the
+        chosen prompt is rendered, and it is tokenized in full only when its count lies within
+        PACKING_SLACK tokens of the budget.
 
-    def construct_system_prompt(self, memory_data: Dict[str, Any], original_memory_data: Dict[str, Any] = None) -> str:
-        """Construct system prompt from memory data."""
-        core_memory = memory_data.get('core', None)  # core is string or None
-        semantic_memories = memory_data.get('semantic', [])  # list of dicts
-        episodic_memories = memory_data.get('episodic', [])  # list of dicts
+        Returns:
+            Tuple of (filtered_memory_data, system_prompt, token_count, top_k)
+        """
+        _, head_tokens = self.prompt_fragments(ranked_memory_data.get('core', None))
+        semantic_line_tokens = self._memory_line_tokens(ranked_memory_data['semantic'][:max_top_k])
+        episodic_line_tokens = self._memory_line_tokens(ranked_memory_data['episodic'][:max_top_k])
+        for top_k in range(max_top_k, 0, -1):
+            token_count = self._prompt_tokens(head_tokens, semantic_line_tokens[:top_k], episodic_line_tokens[:top_k])
+            if token_count > token_budget + self.PACKING_SLACK and top_k > 1:
+                continue
+            filtered_memory_data = self.take_top_k(ranked_memory_data, top_k)
+            system_prompt = self.construct_system_prompt(filtered_memory_data, memory_data)
+            if token_count > token_budget - self.PACKING_SLACK:
+                # Near the budget: confirm with the count of the whole prompt
+                token_count = self.count_tokens(system_prompt)
+                if token_count > token_budget and top_k > 1:
+                    continue
+            if top_k < max_top_k:
+                logger.info(f"Packed system prompt to top_k={top_k} below {max_top_k}: {token_count} tokens (budget {token_budget})")
+            return filtered_memory_data, system_prompt, token_count, top_k
+
+    def search_memories(self, memory_data: Dict[str, Any], query: str, top_k: int = 20) -> Dict[str, Any]:
+        """Search memories using BM25 and return top-k results for semantic and episodic memories.
+
+        Args:
+            memory_data: Dictionary containing 'core', 'semantic', and 'episodic' memories
+            query: Search query string
+            top_k: Number of top results to return for each memory type
 
-        # Format memory blocks
-        memory_blocks = []
+        Returns:
+            Dictionary with same structure as memory_data but with filtered memories
+        """
+        return self.take_top_k(self.rank_memories(memory_data, [query])[0], top_k)
+
+    def _prompt_fragments(self, core_memory: Any) -> Tuple[str, int]:
+        """System prompt up to the semantic memory block (it only depends on the core memory) and its token count."""
+        memory_blocks_head = ""
         memory_structure_items = []
 
         # Only include core memory if it has content
         if core_memory and core_memory.strip():
-            core_block = self._format_core_memory_block(core_memory)
-            memory_blocks.append(core_block)
+            memory_blocks_head = self._format_core_memory_block(core_memory) + "\n\n"
             memory_structure_items.append("- Core Memory: Fundamental facts about the user (preferences, roles, goals, etc.)")
 
-        semantic_block = self._format_memory_block(semantic_memories, "semantic_memory")
-        episodic_block = self._format_memory_block(episodic_memories, "episodic_memory")
-        memory_blocks.extend([semantic_block, episodic_block])
         memory_structure_items.extend([
             "- Semantic Memory: General knowledge, factual or conceptual information",
             "- Episodic Memory: Specific personal experiences or events with time and context"
         ])
 
-        memory_structure = "\n".join(memory_structure_items)
-        memory_content = "\n\n".join(memory_blocks)
-
-        system_prompt = f"""You are a reasoning assistant with access to structured memory. Use the memories below to provide accurate, relevant, and comprehensive responses to user queries.
-
-MEMORY STRUCTURE:
-{memory_structure}
-
-CURRENT MEMORY STATE:
-
-{memory_content}
+        head = self.SYSTEM_PROMPT_HEAD.format(memory_structure="\n".join(memory_structure_items)) + memory_blocks_head
+        return head, self.count_tokens(head)
 
-INSTRUCTIONS:
-- Use the memories above to inform your responses
-- If information is available in memory, reference it appropriately
-- If memory is insufficient to answer a question, acknowledge this clearly
-- Provide helpful and contextual responses based on the available memory
-- Be concise but comprehensive in your answers"""
+    def construct_system_prompt(self, memory_data: Dict[str, Any], original_memory_data: Dict[str, Any] = None) -> str:
+        """Construct system prompt from memory data."""
+        head, _ = self.prompt_fragments(memory_data.get('core', None))  # core is string or None
+        semantic_block = self._format_memory_block(memory_data.get('semantic', []), "semantic_memory")
+        episodic_block = self._format_memory_block(memory_data.get('episodic', []), "episodic_memory")
+        return head + semantic_block + "\n\n" + episodic_block + self.SYSTEM_PROMPT_TAIL
+
+    def _memory_line_tokens(self, memory_list: List[Dict[str, str]]) -> List[int]:
+        """Token count of every "{i}. {content}\n" line of _format_memory_block, cached by line."""
+        return [self.count_tokens(self._format_memory_line(i, memory_item) + "\n")
+                for i, memory_item in enumerate(memory_list, 1)]
+
+    def _block_tokens(self, line_tokens: List[int], block_name: str, suffix: str) -> int:
+        """Token count of a memory block with the given line counts, followed by suffix."""
+        if not line_tokens:
+            return self.count_tokens(self._format_memory_block([], block_name) + suffix)
+        return self.count_tokens(f"<{block_name}>\n") + sum(line_tokens) + self.count_tokens(f"</{block_name}>" + suffix)
+
+    def _prompt_tokens(self, head_tokens: int, semantic_line_tokens: List[int], episodic_line_tokens: List[int]) -> int:
+        """Token count of construct_system_prompt from the counts of its fragments.
+
+        Fragments end with a newline that is followed by a digit or "<". The pre-tokenizers of the
+        BPE tokenizers used here (Qwen, tiktoken) never merge across that point, so the fragment
+        counts add up to the count of the whole prompt.
+        """
+        return (head_tokens
+                + self._block_tokens(semantic_line_tokens, "semantic_memory", "\n\n")
+                + self._block_tokens(episodic_line_tokens, "episodic_memory", self.SYSTEM_PROMPT_TAIL))
 
-        return system_prompt
+    def estimate_prompt_tokens(self, memory_data: Dict[str, Any]) -> int:
+        """Token count of construct_system_prompt(memory_data) without rendering or tokenizing the whole prompt."""
+        _, head_tokens = self.prompt_fragments(memory_data.get('core', None))
+        return self._prompt_tokens(head_tokens,
+                                   self._memory_line_tokens(memory_data.get('semantic', [])),
+                                   self._memory_line_tokens(memory_data.get('episodic', [])))
 
     def generate_response(self, memory_data: Dict[str, List], question: str) -> str:
         """Generate a response for a single question using the memory data."""
@@ -556,8 +662,14 @@ INSTRUCTIONS:
             logger.error(f"Error generating response: {str(e)}")
             return f"Error generating response: {str(e)}"
 
-    def process_batch(self, memories: List[Dict[str, Any]], questions: List[List[str]]) -> List[List[str]]:
-        """Process a batch of memories and questions."""
+    def process_batch(self, memories: List[Dict[str, Any]], questions: List[List[str]],
+                      executor: ThreadPoolExecutor = None) -> List[List[str]]:
+        """Process a batch of memories and questions; questions run concurrently on executor if given."""
+        if executor is not None:
+            futures = [[executor.submit(self.generate_response, memory_data, question) for question in question_list]
+                       for memory_data, question_list in zip(memories, questions)]
+            return [[future.result() for future in question_futures] for question_futures in futures]
+
         results = []
 
         for i, (memory_data, question_list) in enumerate(zip(memories, questions)):
@@ -766,9 +878,167 @@ INSTRUCTIONS:
             logger.error(f"Error generating final response: {str(e)}")
             return f"Error generating response: {str(e)}", search_history
 
+class UpstreamBatcher:
+    """Coalesces prompts from concurrent requests into shared upstream batches.
+
+    Prompts are queued per batch key (call type and sampling parameters). A dispatcher thread
+    takes one of max_inflight slots, then sends up to max_batch_size queued prompts of the oldest
+    key as one upstream call on the worker pool. While every slot is busy, prompts from all requests
+    keep queueing, so batches fill up across requests instead of going out half-empty one at a time.
+    """
+
+    def __init__(self, max_inflight: int = 8, max_wait: float = 0.01) -> None:
+        self.max_wait = max_wait  # seconds a partial batch waits for more prompts once a slot is free
+        self.slots = threading.Semaphore(max_inflight)
+        self.executor = ThreadPoolExecutor(max_workers=max_inflight)
+        self.pending: "OrderedDict[Any, Tuple[Any, int, List[Tuple[Any, Future]]]]" = OrderedDict()
+        self.cond = threading.Condition()
+        threading.Thread(target=self._dispatch_loop, daemon=True).start()
+
+    def submit(self, batch_key: Any, batch_fn, payloads: List[Any], max_batch_size: int) -> List[Future]:
+        """Queue payloads; batch_fn(list of payloads) -> list of results is called per upstream batch."""
+        futures = [Future() for _ in payloads]
+        with self.cond:
+            if batch_key not in self.pending:
+                self.pending[batch_key] = (batch_fn, max_batch_size, [])
+            self.pending[batch_key][2].extend(zip(payloads, futures))
+            self.cond.notify_all()
+        return futures
+
+    def _next_batch(self):
+        with self.cond:
+            while not self.pending:
+                self.cond.wait()
+            batch_key = next(iter(self.pending))
+            batch_fn, max_batch_size, items = self.pending[batch_key]
+            deadline = time.time() + self.max_wait
+            while len(items) < max_batch_size and time.time() < deadline:
+                self.cond.wait(deadline - time.time())
+            batch, rest = items[:max_batch_size], items[max_batch_size:]
+            if rest:
+                # Round-robin between keys so one large request cannot starve the others
+                self.pending[batch_key] = (batch_fn, max_batch_size, rest)
+                self.pending.move_to_end(batch_key)
+            else:
+                del self.pending[batch_key]
+            return batch_fn, batch
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            self.slots.acquire()
+            batch_fn, batch = self._next_batch()
+            self.executor.submit(self._run, batch_fn, batch)
+
+    def _run(self, batch_fn, batch) -> None:
+        try:
+            results = batch_fn([payload for payload, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Upstream returned {len(results)} results for {len(batch)} prompts")
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        finally:
+            self.slots.release()
+
+
 # Global processor and processor variables
 processor = None
 
+# Async serving mode (--async_serving): shared upstream batcher, prompt construction pool and a pool
+# for per-item work such as agentic search; None in the default synchronous mode
+upstream_batcher = None
+prompt_executor = None
+request_executor = None
+
+
+def _completions_upstream(prompts: List[str], max_tokens: int, temperature: float) -> List[str]:
+    resp = processor.client.completions.create(
+        model=processor.model_name,
+        prompt=prompts,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        stream=False
+    )
+    return [choice.text for choice in resp.choices]
+
+
+def _completion_upstream(prompts: List[str], max_tokens: int, temperature: float) -> List[str]:
+    """Single-prompt batch sent as a plain string (OpenRouter's prompt format, as run_openrouter_completion does)."""
+    prompt, = prompts
+    resp = processor.client.completions.create(
+        model=processor.model_name,
+        prompt=prompt,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        stream=False
+    )
+    return [resp.choices[0].text]
+
+
+def _chat_upstream(messages_list: List[List[Dict[str, str]]], max_tokens: int, temperature: float,
+                   extra_body: Dict[str, Any] = None) -> List[str]:
+    kwargs = {"extra_body": extra_body} if extra_body is not None else {}
+    results = []
+    for messages in messages_list:
+        response = processor.client.chat.completions.create(
+            model=processor.model_name,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **kwargs
+        )
+        results.append(response.choices[0].message.content)
+    return results
+
+
+def submit_upstream(prompts: List[Any], max_tokens: int, temperature: float, use_completions: bool,
+                    batch_size: int, extra_body: Dict[str, Any] = None) -> List[Future]:
+    """Queue prompts on the shared upstream batcher (async serving mode).
+
+    Completion prompts go out in batches of batch_size (one prompt per call for OpenRouter, as before);
+    chat messages have no batch API and are sent one call each, concurrently.
+    """
+    base_url_obj = getattr(processor.client, "base_url", "")
+    is_openrouter = bool(base_url_obj) and "openrouter" in str(base_url_obj).lower()
+    if use_completions:
+        if is_openrouter:
+            batch_fn = functools.partial(_completion_upstream, max_tokens=max_tokens, temperature=temperature)
+            batch_size = 1
+        else:
+            batch_fn = functools.partial(_completions_upstream, max_tokens=max_tokens, temperature=temperature)
+        batch_key = ("completions", max_tokens, temperature, batch_size)
+    else:
+        batch_fn = functools.partial(_chat_upstream, max_tokens=max_tokens, temperature=temperature, extra_body=extra_body)
+        batch_size = 1
+        batch_key = ("chat", max_tokens, temperature, json.dumps(extra_body, sort_keys=True))
+    return upstream_batcher.submit(batch_key, batch_fn, prompts, batch_size)
+
+
+def gather_upstream(futures: List[Future]) -> List[str]:
+    """Wait for queued prompts; failed calls become "Error: ..." placeholders as in the synchronous mode."""
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            logger.error(f"Error processing upstream batch: {str(e)}")
+            results.append(f"Error: {str(e)}")
+    return results
+
+# Memory sessions created through /sessions/sync and referenced by "session_ids" instead of "memories"
+session_store = MemorySessionStore()
+
+def resolve_request_memories(data: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Return the memory sets of a request, given inline or by session id, and any unknown session ids."""
+    if 'session_ids' not in data:
+        return data.get('memories', []), []
+    session_ids = data['session_ids']
+    memories = session_store.get_many(session_ids)
+    missing_session_ids = [session_id for session_id, memory_data in zip(session_ids, memories) if memory_data is None]
+    return memories, missing_session_ids
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
@@ -780,6 +1050,52 @@ def health_check():
         "analysis_mode": "llm-based" if processor is not None else "rule-based"
     })
 
+@app.route('/sessions/sync', methods=['POST'])
+def sync_sessions():
+    """
+    Create or update named memory sessions.
+
+    Expected payload:
+    {
+        "sessions": [
+            {"session_id": "...", "memory": {"core": ..., "semantic": [...], "episodic": [...]}},  // full snapshot
+            {"session_id": "...", "base_hash": "...", "changes": [...], "hash": "..."},         // delta
+            ...
+        ]
+    }
+
+    Changes are {"op": "insert" | "update" | "delete" | "core", ...} records as produced by Memory.
+    A delta is only applied when base_hash matches the session and hash matches the result;
+    otherwise (or when the session was evicted) its status is "resync" and the client sends a snapshot.
+
+    Returns:
+    {
+        "results": [{"session_id": "...", "status": "ok" | "resync", "hash": "..."}, ...],
+        "status": "success"
+    }
+    """
+    try:
+        data = request.get_json()
+
+        if not data or 'sessions' not in data:
+            return jsonify({"error": "'sessions' is required"}), 400
+
+        results = session_store.sync(data['sessions'])
+        return jsonify({"results": results, "status": "success"})
+
+    except Exception as e:
+        logger.error(f"Error syncing memory sessions: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/sessions/delete', methods=['POST'])
+def delete_sessions():
+    """Drop memory sessions: {"session_ids": [...]}."""
+    data = request.get_json()
+    if not data or 'session_ids' not in data:
+        return jsonify({"error": "'session_ids' is required"}), 400
+    session_store.delete(data['session_ids'])
+    return jsonify({"status": "success"})
+
 @app.route('/process', methods=['POST'])
 def process_memories_and_questions():
     """
@@ -816,7 +1132,9 @@ def process_memories_and_questions():
         if not data:
             return jsonify({"error": "No JSON data provided"}), 400
 
-        memories = data.get('memories', [])
+        memories, missing_session_ids = resolve_request_memories(data)
+        if missing_session_ids:
+            return jsonify({"error": "Unknown or evicted memory sessions", "missing_session_ids": missing_session_ids}), 409
         questions = data.get('questions', [])
 
         if not memories or not questions:
@@ -828,7 +1146,7 @@ def process_memories_and_questions():
         logger.info(f"Processing {len(memories)} memory sets with questions")
 
         # Process the batch
-        results = processor.process_batch(memories, questions)
+        results = processor.process_batch(memories, questions, executor=request_executor)
 
         return jsonify({
             "result": results,
@@ -1056,7 +1374,12 @@ def _process_function_batch(data):
 
         # Perform batch inference if we have valid items
         llm_results = []
-        if all_prompts:
+        if all_prompts and upstream_batcher is not None:
+            # Async serving mode: share upstream batches with concurrent requests
+            llm_results = gather_upstream(submit_upstream(
+                all_prompts, 512, 0.1, processor.model == "qwen3-32b" and processor.tokenizer is not None,
+                qwen_batch_size, extra_body={"chat_template_kwargs": {"enable_thinking": False}}))
+        elif all_prompts:
             if processor.model == "qwen3-32b" and processor.tokenizer is not None:
                 # For Qwen model, use completions API with converted prompts
                 effective_batch_size = qwen_batch_size
@@ -1353,7 +1676,9 @@ def agentic_process():
         if not data:
             return jsonify({"error": "No JSON data provided"}), 400
 
-        memories = data.get('memories', [])
+        memories, missing_session_ids = resolve_request_memories(data)
+        if missing_session_ids:
+            return jsonify({"error": "Unknown or evicted memory sessions", "missing_session_ids": missing_session_ids}), 409
         questions = data.get('questions', [])
         max_iterations = data.get('max_iterations', 5)
         temperature = data.get('temperature', 0.7)
@@ -1371,29 +1696,41 @@ def agentic_process():
         results = []
         all_search_iterations = []
 
-        for mem_idx, (memory_data, question_list) in enumerate(zip(memories, questions)):
-            logger.info(f"Processing memory set {mem_idx+1}/{len(memories)} with {len(question_list)} questions")
+        def run_search(memory_data, question):
+            return processor.agentic_search_and_respond(
+                memory_data=memory_data,
+                question=question,
+                max_iterations=max_iterations,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
 
-            batch_results = []
-            batch_iterations = []
+        if request_executor is not None:
+            # Async serving mode: every question's search loop runs concurrently
+            futures = [[request_executor.submit(run_search, memory_data, question) for question in question_list]
+                       for memory_data, question_list in zip(memories, questions)]
+            for question_futures in futures:
+                outputs = [future.result() for future in question_futures]
+                results.append([response for response, _ in outputs])
+                all_search_iterations.append([search_history for _, search_history in outputs])
+        else:
+            for mem_idx, (memory_data, question_list) in enumerate(zip(memories, questions)):
+                logger.info(f"Processing memory set {mem_idx+1}/{len(memories)} with {len(question_list)} questions")
 
-            for q_idx, question in enumerate(question_list):
-                logger.info(f"  Processing question {q_idx+1}/{len(question_list)}: {question[:50]}...")
+                batch_results = []
+                batch_iterations = []
 
-                # Perform agentic search for this question
-                response, search_history = processor.agentic_search_and_respond(
-                    memory_data=memory_data,
-                    question=question,
-                    max_iterations=max_iterations,
-                    temperature=temperature,
-                    max_tokens=max_tokens
-                )
+                for q_idx, question in enumerate(question_list):
+                    logger.info(f"  Processing question {q_idx+1}/{len(question_list)}: {question[:50]}...")
 
-                batch_results.append(response)
-                batch_iterations.append(search_history)
+                    # Perform agentic search for this question
+                    response, search_history = run_search(memory_data, question)
 
-            results.append(batch_results)
-            all_search_iterations.append(batch_iterations)
+                    batch_results.append(response)
+                    batch_iterations.append(search_history)
+
+                results.append(batch_results)
+                all_search_iterations.append(batch_iterations)
 
         logger.info(f"Successfully completed agentic processing for {len(memories)} memory sets")
 
@@ -1412,11 +1749,48 @@ def agentic_process():
 
 
 
+def build_batch_prompts(memory_data: Dict[str, Any], question_list: List[str], enable_thinking: bool = False) -> List[Any]:
+    """Prompts (chat-templated strings, or messages without a tokenizer) for the questions of one memory set."""
+    prompts = []
+    # Rank the memories for all questions of this memory set against one BM25 index
+    ranked_memory_data = processor.rank_memories(memory_data, question_list)
+    for q_idx, question in enumerate(question_list):
+        # Retrieve relevant memories for this specific question with the largest top_k (<= 20)
+        # whose system prompt fits in 30k tokens
+        filtered_memory_data, system_prompt, token_count, top_k = processor.pack_memories(
+            ranked_memory_data[q_idx], memory_data, max_top_k=20, token_budget=30000)
+
+        # Assert it's less than 30k after potential reduction
+        assert token_count < 30000, f"System prompt has {token_count} tokens, exceeds 30k limit even after reduction to top_k={top_k} (question: {question[:50]}...)"
+        logger.debug(f"System prompt token count: {token_count}/30000")
+
+        # Create message dictionary
+        dict_messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": question}
+        ]
+
+        # Convert to prompt using tokenizer if available (for Qwen)
+        if processor.tokenizer is not None:
+            prompts.append(processor.tokenizer.apply_chat_template(
+                dict_messages,
+                tokenize=False,
+                add_generation_prompt=True,
+                enable_thinking=enable_thinking
+            ))
+        else:
+            # For Azure models, we'll handle differently
+            prompts.append(dict_messages)
+    return prompts
+
+
 @app.route('/batch_process', methods=['POST'])
 def batch_process():
     """
     Batch inference endpoint that takes the same input as /process but converts to prompts for batch inference.
     Includes mini-batch processing to handle large batches efficiently and avoid API rate limits.
+    Instead of "memories", a request may pass "session_ids" of sessions created with /sessions/sync;
+    unknown or evicted sessions are reported with status 409 and "missing_session_ids".
 
     Expected payload:
     {
@@ -1459,7 +1833,9 @@ def batch_process():
         if not data:
             return jsonify({"error": "No JSON data provided"}), 400
 
-        memories = data.get('memories', [])
+        memories, missing_session_ids = resolve_request_memories(data)
+        if missing_session_ids:
+            return jsonify({"error": "Unknown or evicted memory sessions", "missing_session_ids": missing_session_ids}), 409
         questions = data.get('questions', [])
         max_tokens = data.get('max_tokens', 2048)
         temperature = data.get('temperature', 0.7)
@@ -1477,58 +1853,35 @@ def batch_process():
 
         logger.info(f"Processing batch inference for {len(memories)} memory sets")
 
+        use_completions = "qwen3-32b" in processor.model and processor.tokenizer is not None
+        if upstream_batcher is not None:
+            # Async serving mode: build each memory set's prompts on the prompt pool and queue them
+            # on the shared upstream batcher as soon as they are ready
+            prompt_futures = [prompt_executor.submit(build_batch_prompts, memory_data, question_list, enable_thinking)
+                              for memory_data, question_list in zip(memories, questions)]
+            result_futures = [submit_upstream(prompt_future.result(), max_tokens, temperature, use_completions,
+                                              qwen_batch_size)
+                              for prompt_future in prompt_futures]
+            results = [gather_upstream(futures) for futures in result_futures]
+            processed_count = sum(len(r) for r in results)
+            logger.info(f"Successfully processed {processed_count} completions")
+            return jsonify({
+                "result": results,
+                "status": "success",
+                "processed_count": processed_count
+            })
+
         # Create prompts for all memory/question combinations and track structure
         all_prompts = []
         structure_info = []  # Track which memory and question index each prompt belongs to
 
         for mem_idx, (memory_data, question_list) in enumerate(zip(memories, questions)):
-            for q_idx, question in enumerate(question_list):
-                # Retrieve relevant memories for this specific question with adaptive top_k
-                top_k = 20
-                filtered_memory_data = processor.search_memories(memory_data, question, top_k=top_k)
-
-                # Construct system prompt with filtered memories
-                system_prompt = processor.construct_system_prompt(filtered_memory_data, memory_data)
-
-                # Count tokens and progressively reduce top_k if exceeds 30k
-                token_count = processor.count_tokens(system_prompt)
-                while token_count > 30000 and top_k > 1:
-                    original_top_k = top_k
-                    top_k -= 1
-                    logger.info(f"System prompt has {token_count} tokens (>30k), reducing top_k from {original_top_k} to {top_k}")
-                    filtered_memory_data = processor.search_memories(memory_data, question, top_k=top_k)
-                    system_prompt = processor.construct_system_prompt(filtered_memory_data, memory_data)
-                    token_count = processor.count_tokens(system_prompt)
-                    logger.info(f"After reduction to top_k={top_k}, system prompt has {token_count} tokens")
-
-                # Assert it's less than 30k after potential reduction
-                assert token_count < 30000, f"System prompt has {token_count} tokens, exceeds 30k limit even after reduction to top_k={top_k} (question: {question[:50]}...)"
-                logger.debug(f"System prompt token count: {token_count}/30000")
-
-                # Create message dictionary
-                dict_messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": question}
-                ]
-
-                # Convert to prompt using tokenizer if available (for Qwen)
-                if processor.tokenizer is not None:
-                    prompt = processor.tokenizer.apply_chat_template(
-                        dict_messages,
-                        tokenize=False,
-                        add_generation_prompt=True,
-                        enable_thinking=enable_thinking
-                    )
-                    all_prompts.append(prompt)
-                else:
-                    # For Azure models, we'll handle differently
-                    all_prompts.append(dict_messages)
-
-                # Track which memory and question this prompt belongs to
-                structure_info.append((mem_idx, q_idx))
+            all_prompts.extend(build_batch_prompts(memory_data, question_list, enable_thinking))
+            # Track which memory and question each prompt belongs to
+            structure_info.extend((mem_idx, q_idx) for q_idx in range(len(question_list)))
 
         # Perform batch inference
-        if "qwen3-32b" in processor.model and processor.tokenizer is not None:
+        if use_completions:
             # For Qwen model, use completions API with converted prompts
             # Process in mini-batches to avoid API limits
             batch_size = qwen_batch_size  # Maximum batch size for Qwen API
@@ -1706,6 +2059,25 @@ if __name__ == '__main__':
     parser.add_argument('--model_name',
                       help='Model name to use for API calls',
                       default=None)
+    parser.add_argument('--max_sessions',
+                      type=int,
+                      default=4096,
+                      help='Number of memory sessions kept before evicting the least recently used (default: 4096)')
+    parser.add_argument('--async_serving',
+                      action='store_true',
+                      help='Serve requests concurrently and coalesce their prompts into shared upstream batches')
+    parser.add_argument('--max_inflight',
+                      type=int,
+                      default=16,
+                      help='Maximum concurrent upstream model calls in async serving mode (default: 16)')
+    parser.add_argument('--prompt_workers',
+                      type=int,
+                      default=8,
+                      help='Worker threads building prompts and running agentic searches in async serving mode (default: 8)')
+    parser.add_argument('--coalesce_wait_ms',
+                      type=float,
+                      default=10,
+                      help='Milliseconds a partial upstream batch waits for prompts of other requests (default: 10)')
 
     args = parser.parse_args()
 
@@ -1715,6 +2087,11 @@ if __name__ == '__main__':
 
     # Initialize the processor with the server URL
     processor = MemoryProcessor(server_url=args.server_url)
+    session_store.max_sessions = args.max_sessions
+    if args.async_serving:
+        upstream_batcher = UpstreamBatcher(max_inflight=args.max_inflight, max_wait=args.coalesce_wait_ms / 1000)
+        prompt_executor = ThreadPoolExecutor(max_workers=args.prompt_workers)
+        request_executor = ThreadPoolExecutor(max_workers=args.prompt_workers)
 
     # Check if required environment variables are set for Azure models
     if MODEL_NAME != "qwen3-32b" and not os.getenv("AZURE_OPENAI_API_KEY"):
@@ -1727,12 +2104,16 @@ if __name__ == '__main__':
     logger.info(f"Model name for API calls: {processor.model_name}")
     if args.server_url:
         logger.info(f"Using custom server URL: {args.server_url}")
+    if args.async_serving:
+        logger.info(f"Async serving: {args.max_inflight} upstream calls in flight, {args.prompt_workers} prompt workers")
     logger.info("Available endpoints:")
     logger.info("  GET  /health - Health check")
+    logger.info("  POST /sessions/sync - Create or update memory sessions")
+    logger.info("  POST /sessions/delete - Delete memory sessions")
     logger.info("  POST /process - Process memories and questions")
     logger.info("  POST /batch_process - Batch process memories and questions")
     logger.info("  POST /agentic_process - Agentic memory search and response")
     logger.info("  POST /analyze_function - Analyze memory function calls for quality")
 
     # Get debug mode from environment variable, default to False for production
-    app.run(host=args.host, port=args.port)
+    app.run(host=args.host, port=args.port, threaded=True)
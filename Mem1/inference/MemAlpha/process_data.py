@@ -7,7 +7,8 @@ import random
 import re
 import sys
 import time
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 from functools import partial
 from typing import Dict, List, Any, Tuple
@@ -22,6 +23,9 @@ from datasets import load_dataset
 from openai import AzureOpenAI
 from tqdm import tqdm
 
+from memalpha.chunking import get_sentence_chunker
+from memalpha.qwen_judge import get_qwen_client
+
 # Load environment variables
 dotenv.load_dotenv()
 
@@ -195,45 +199,9 @@ def count_tokens(text, model="gpt-4o-mini"):
 
 def create_chunks_use_sent_tokenizer(text, max_tokens=10000):
     """Create chunks from text using sentence tokenization"""
-    # Make sure we have the punkt tokenizer downloaded
-    try:
-        nltk.data.find('tokenizers/punkt')
-    except LookupError:
-        nltk.download('punkt')
-
-    # Split text into sentences
-    sentences = nltk.sent_tokenize(text)
-
-    chunks = []
-    current_chunk = ""
-    current_tokens = 0
-
-    for sentence in sentences:
-
-        if '<|endoftext|>' in sentence:
-            sentence = sentence.replace('<|endoftext|>', '\n')
-
-        sentence_tokens = count_tokens(sentence)
-
-        # If adding this sentence would exceed max_tokens, start a new chunk
-        if current_tokens + sentence_tokens > max_tokens and current_chunk:
-            chunks.append(current_chunk.strip())
-            current_chunk = sentence
-            current_tokens = sentence_tokens
-        else:
-            if current_chunk:
-                # Add space between sentences
-                current_chunk += " " + sentence
-                current_tokens += sentence_tokens + count_tokens(" ")
-            else:
-                current_chunk = sentence
-                current_tokens = sentence_tokens
-
-    # Add the last chunk if it exists
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-
-    return chunks
+    chunker = get_sentence_chunker("gpt-4o-mini")
+    sentences = [sentence.replace('<|endoftext|>', '\n') for sentence in chunker.split_sentences(text)]
+    return chunker.pack(sentences, max_tokens, separator=" ")
 
 def create_chunks(contexts, max_tokens=2000, min_tokens=None, variable_size=False):
     """Create chunks from contexts, ensuring each chunk is less than max_tokens
@@ -244,47 +212,9 @@ def create_chunks(contexts, max_tokens=2000, min_tokens=None, variable_size=Fals
         min_tokens: Minimum tokens per chunk (used when variable_size=True, default: max_tokens/20)
         variable_size: If True, randomly vary chunk size between min_tokens and max_tokens for each chunk
     """
-    chunks = []
-    current_chunk = ""
-    current_tokens = 0
-
-    # Set default min_tokens if not provided and variable_size is enabled
-    if variable_size and min_tokens is None:
-        min_tokens = max(100, max_tokens // 20)
-
-    # Set target tokens for first chunk
-    if variable_size:
-        target_tokens = random.randint(min_tokens, max_tokens)
-    else:
-        target_tokens = max_tokens
-
-    for context in contexts:
-        context_tokens = count_tokens(context)
-
-        # If adding this context would exceed target_tokens, start a new chunk
-        if current_tokens + context_tokens > target_tokens and current_chunk:
-            chunks.append(current_chunk.strip())
-            current_chunk = context
-            current_tokens = context_tokens
-
-            # Set new target for next chunk if using variable size
-            if variable_size:
-                target_tokens = random.randint(min_tokens, max_tokens)
-            else:
-                target_tokens = max_tokens
-        else:
-            if current_chunk:
-                current_chunk += "\n\n" + context
-                current_tokens += context_tokens + count_tokens("\n\n")
-            else:
-                current_chunk = context
-                current_tokens = context_tokens
+    return get_sentence_chunker("gpt-4o-mini").pack(contexts, max_tokens, separator="\n\n",
+                                                    min_tokens=min_tokens, variable_size=variable_size)
 
-    # Add the last chunk if it exists
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-
-    return chunks
 
 def batch_process_questions_with_qwen32b(questions, batch_size=32, system_prompt=None, model="qwen3-32b", no_thinking=False):
     """
@@ -298,79 +228,17 @@ def batch_process_questions_with_qwen32b(questions, batch_size=32, system_prompt
     Returns:
         List of responses corresponding to each question
     """
-
-    # Import and setup Qwen client
-    from openai import OpenAI
-    from transformers import AutoTokenizer
-    import time
-
-    # Setup Qwen client
-    client = OpenAI(
-        base_url=qwen32b_server_url,
-        api_key="EMPTY"
-    )
-
-    # Initialize tokenizer for prompt conversion
-    tokenizer = AutoTokenizer.from_pretrained("Qwen/Qwen3-32B", trust_remote_code=True)
+    # The client, tokenizer and dispatch threads are shared per process; several batches are in flight at once
+    qwen_client = get_qwen_client(model=model, base_url=qwen32b_server_url)
 
     print(f"Starting batch processing of {len(questions)} questions with Qwen32B, batch size {batch_size}")
 
-    all_responses = []
+    all_responses = qwen_client.complete(questions, batch_size=batch_size, system_prompt=system_prompt,
+                                         no_thinking=no_thinking, max_tokens=1024, temperature=0.7)
 
-    # Process questions in batches
-    for i in range(0, len(questions), batch_size):
-        batch_questions = questions[i:i + batch_size]
-        batch_num = (i // batch_size) + 1
-        total_batches = (len(questions) + batch_size - 1) // batch_size
-
-        print(f"Processing batch {batch_num}/{total_batches} ({len(batch_questions)} questions)")
-
-        # Convert all questions in batch to prompts
-        batch_prompts = []
-        for question in batch_questions:
-            if system_prompt is not None:
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": question}
-                ]
-            else:
-                messages = [
-                    {"role": "user", "content": question}
-                ]
-
-            # Convert to prompt using tokenizer
-            prompt = tokenizer.apply_chat_template(
-                messages,
-                tokenize=False,
-                add_generation_prompt=True
-            )
-
-            if no_thinking:
-                prompt += "<think></think>\n\n"
-
-            batch_prompts.append(prompt)
-
-        # Process the entire batch at once using completions API
-        response = client.completions.create(
-            model=model,
-            prompt=batch_prompts,
-            max_tokens=1024,
-            temperature=0.7,
-            stream=False
-        )
-
-        # Extract responses
-        batch_responses = [choice.text for choice in response.choices]
-
-        if not no_thinking:
-            # need to remove the <think></think> tags
-            batch_responses = [(x.split("</think>")[1] if "</think>" in x else x) for x in batch_responses]
-
-        all_responses.extend(batch_responses)
-        print(f"Completed batch {batch_num}/{total_batches}")
-        # Delay between batches to avoid overloading the server
-        if i + batch_size < len(questions):
-            time.sleep(0.5)
+    if not no_thinking:
+        # need to remove the <think></think> tags
+        all_responses = [(x.split("</think>")[1] if "</think>" in x else x) for x in all_responses]
 
     print(f"Batch processing complete. Generated {len(all_responses)} responses.")
     return all_responses
@@ -2067,161 +1935,126 @@ def combine_and_split_datasets(train_ratio=0.9, random_seed=42):
 
     return train_path, test_path
 
-def process_instance_batch(batch_data):
-    """Worker function to process a batch of instances in parallel"""
-    instances_batch, api_key, batch_id, max_questions_to_test = batch_data
+FILTER_TARGET_KEEP = 100  # questions to keep per instance before filtering stops early
 
-    # Create OpenAI client for this worker
-    client = AzureOpenAI(
-        api_key=api_key,
-        api_version="2025-01-01-preview",
-        azure_endpoint="https://jplml-resource.cognitiveservices.azure.com"
-    )
 
-    results = []
-    batch_stats = {
-        'total_instances': len(instances_batch),
-        'total_questions_processed': 0,
-        'total_questions_removed': 0,
-        'total_api_calls': 0,
-        'instances_processed': 0
-    }
+def ask_question_without_context(client, instance_id, qa_idx, qa):
+    """Ask GPT-4o-mini one question without its context chunks; returns the filtering result for it"""
+    question = qa['question']
+    expected_answer = qa.get('answer', qa.get('answers', [''])[0] if qa.get('answers') else '')
 
-    print(f"🚀 Batch {batch_id}: Starting processing of {len(instances_batch)} instances at {time.strftime('%H:%M:%S')}")
-    import sys
-    sys.stdout.flush()  # Force immediate output
+    # Convert expected_answer to string if it's a list
+    if isinstance(expected_answer, list):
+        expected_answer = expected_answer[0] if expected_answer else ''
+    expected_answer = str(expected_answer).strip()
 
-    for instance_idx, instance_data in enumerate(instances_batch):
-        instance_id = instance_data['instance_id']
-        questions_and_answers = instance_data['questions_and_answers']
-
-        questions_to_keep = 0
-        questions_processed = 0
-        questions_removed_this_instance = 0
+    try:
+        messages = [
+            {"role": "system", "content": "You are a helpful assistant. Answer the question as accurately as possible based on your training data."},
+            {"role": "user", "content": question}
+        ]
+
+        response = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            max_tokens=500,
+            temperature=0.0  # Use low temperature for consistent answers
+        )
 
-        # Determine how many questions to test
-        questions_to_test = questions_and_answers[:max_questions_to_test] if max_questions_to_test else questions_and_answers
+        model_answer = response.choices[0].message.content.strip()
+        is_correct = is_answer_correct(model_answer, expected_answer)
+        return {
+            'instance_id': instance_id,
+            'question_id': qa_idx,
+            'question': question,
+            'expected_answer': expected_answer,
+            'prediction_without_chunk': model_answer,
+            'is_correct': is_correct,
+            'keep_question': not is_correct
+        }
 
-        print(f"📝 Batch {batch_id}: Processing instance {instance_id} ({instance_idx+1}/{len(instances_batch)}) - {len(questions_to_test)} questions available")
-        print(f"   🎯 Goal: Find 100 questions to keep (stop when reached)")
+    except Exception as e:
+        print(f"  ⚠️ Instance {instance_id}: ERROR at Q{qa_idx+1}: {e}")
         sys.stdout.flush()
+        time.sleep(0.5)  # Back off this slot after an error
 
-        for qa_idx, qa in enumerate(questions_to_test):
-            # Stop if we already have 100 questions to keep
-            if questions_to_keep >= 100:
-                print(f"  ✅ Instance {instance_id}: Reached target of 100 questions to keep after processing {questions_processed} questions")
-                sys.stdout.flush()
-                break
-
-            question = qa['question']
-            expected_answer = qa.get('answer', qa.get('answers', [''])[0] if qa.get('answers') else '')
-
-            # Convert expected_answer to string if it's a list
-            if isinstance(expected_answer, list):
-                expected_answer = expected_answer[0] if expected_answer else ''
-            expected_answer = str(expected_answer).strip()
+        # Keep the question if there's an error (errors are not journaled, so a rerun asks again)
+        return {
+            'instance_id': instance_id,
+            'question_id': qa_idx,
+            'question': question,
+            'expected_answer': expected_answer,
+            'prediction_without_chunk': None,
+            'is_correct': False,
+            'keep_question': True,
+            'error': str(e)
+        }
 
-            # Show progress for every question
-            print(f"  ❓ Instance {instance_id}: Question {questions_processed + 1}/{len(questions_to_test)} - Currently keeping {questions_to_keep}/100")
-            sys.stdout.flush()
 
+def load_filter_journal(journal_file):
+    """Per-question results journaled by earlier (possibly interrupted) filter runs, keyed by (instance_id, question_id)"""
+    journaled = {}
+    if not os.path.isfile(journal_file):
+        return journaled
+    valid_size = 0
+    with open(journal_file, 'rb') as f:
+        for line in f:
             try:
-                # Ask GPT-4o-mini the question without context
-                messages = [
-                    {"role": "system", "content": "You are a helpful assistant. Answer the question as accurately as possible based on your training data."},
-                    {"role": "user", "content": question}
-                ]
-
-                response = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=messages,
-                    max_tokens=500,
-                    temperature=0.0  # Use low temperature for consistent answers
-                )
-
-                model_answer = response.choices[0].message.content.strip()
-                is_correct = is_answer_correct(model_answer, expected_answer)
-                keep_question = not is_correct
-
-                # Store question and prediction for analysis
-                result = {
-                    'instance_id': instance_id,
-                    'question_id': qa_idx,
-                    'question': question,
-                    'expected_answer': expected_answer,
-                    'prediction_without_chunk': model_answer,
-                    'is_correct': is_correct,
-                    'keep_question': keep_question,
-                    'batch_id': batch_id
-                }
-                results.append(result)
-
-                if keep_question:
-                    questions_to_keep += 1
-                    print(f"    ✅ KEEP: Model couldn't answer correctly (Expected: {expected_answer[:50]}..., Got: {model_answer[:50]}...)")
-                else:
-                    questions_removed_this_instance += 1
-                    print(f"    ❌ REMOVE: Model answered correctly (Answer: {expected_answer[:50]}...)")
-
-                questions_processed += 1
-                batch_stats['total_api_calls'] += 1
-
-                # Detailed progress update every 5 questions
-                if questions_processed % 5 == 0:
-                    progress_pct = (questions_processed / len(questions_to_test)) * 100
-                    print(f"  📊 Instance {instance_id}: Progress {questions_processed}/{len(questions_to_test)} ({progress_pct:.1f}%) - Keeping {questions_to_keep}/100, Removed: {questions_removed_this_instance}")
-                    sys.stdout.flush()
-
-                # Add small delay to avoid rate limiting
-                time.sleep(0.05)  # Reduced delay since we have multiple processes
-
-            except Exception as e:
-                print(f"  ⚠️ Instance {instance_id}: ERROR at Q{qa_idx+1}: {e}")
-                sys.stdout.flush()
-
-                # Store question with error info for analysis
-                result = {
-                    'instance_id': instance_id,
-                    'question_id': qa_idx,
-                    'question': question,
-                    'expected_answer': expected_answer,
-                    'prediction_without_chunk': None,
-                    'is_correct': False,
-                    'keep_question': True,  # Keep if there's an error
-                    'error': str(e),
-                    'batch_id': batch_id
-                }
-                results.append(result)
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # torn last line from an interrupted run
+                break
+            journaled[(result['instance_id'], result['question_id'])] = result
+            valid_size += len(line)
+    if valid_size < os.path.getsize(journal_file):
+        # drop the torn tail so new records start on a fresh line
+        with open(journal_file, 'r+b') as f:
+            f.truncate(valid_size)
+    return journaled
 
-                questions_to_keep += 1  # Count error questions as kept
-                questions_processed += 1
 
-                time.sleep(0.5)  # Longer delay after error
+class InstanceFilterState:
+    """Filtering progress of one instance: questions are tested in order until FILTER_TARGET_KEEP are kept.
 
-        # Update batch statistics
-        batch_stats['total_questions_processed'] += questions_processed
-        batch_stats['total_questions_removed'] += questions_removed_this_instance
-        batch_stats['instances_processed'] += 1
+    A question is only dispatched while the kept results plus the questions in flight are below the
+    target, so no question beyond the instance's stopping point is ever asked.
+    """
 
-        # Instance summary
-        if questions_to_keep >= 100:
-            print(f"  🎉 Instance {instance_id} COMPLETE: ✅ Target reached - keeping {questions_to_keep} questions after testing {questions_processed}/{len(questions_to_test)}")
-        else:
-            print(f"  🎉 Instance {instance_id} COMPLETE: ⚠️  Only found {questions_to_keep} questions to keep after testing all {questions_processed} questions")
-        print(f"    📈 Stats: Tested={questions_processed}, Keeping={questions_to_keep}, Removed={questions_removed_this_instance}, Keep Rate={questions_to_keep/questions_processed*100:.1f}%")
-        sys.stdout.flush()
+    def __init__(self, instance_id, questions):
+        self.instance_id = instance_id
+        self.questions = questions
+        self.results = {}  # question_id -> result
+        self.next_question = 0
+        self.in_flight = 0
+        self.num_kept = 0
+
+    def record(self, result):
+        self.results[result['question_id']] = result
+        if result['keep_question']:
+            self.num_kept += 1
+
+    def next_dispatchable(self):
+        """Index of the next question to ask, skipping journaled ones, or None"""
+        while self.next_question < len(self.questions) and self.next_question in self.results:
+            self.next_question += 1
+        if self.next_question >= len(self.questions) or self.num_kept + self.in_flight >= FILTER_TARGET_KEEP:
+            return None
+        return self.next_question
+
+    @property
+    def done(self):
+        return self.in_flight == 0 and self.next_dispatchable() is None
+
+    def tested_results(self):
+        """Results in question order up to the point where the target of kept questions was reached"""
+        tested, num_kept = [], 0
+        for qa_idx in range(len(self.questions)):
+            if num_kept >= FILTER_TARGET_KEEP or qa_idx not in self.results:
+                break
+            tested.append(self.results[qa_idx])
+            num_kept += self.results[qa_idx]['keep_question']
+        return tested
 
-    # Batch summary
-    questions_kept_in_batch = batch_stats['total_questions_processed'] - batch_stats['total_questions_removed']
-    print(f"🏁 Batch {batch_id} COMPLETE at {time.strftime('%H:%M:%S')}: {batch_stats['instances_processed']}/{batch_stats['total_instances']} instances")
-    print(f"  📊 Questions Tested: {batch_stats['total_questions_processed']}")
-    print(f"  ✅ Questions Found to Keep: {questions_kept_in_batch}")
-    print(f"  ❌ Questions Removed (model answered correctly): {batch_stats['total_questions_removed']}")
-    print(f"  🔗 API Calls Made: {batch_stats['total_api_calls']}")
-    print(f"  🧠 Model Accuracy Rate: {batch_stats['total_questions_removed']/batch_stats['total_questions_processed']*100 if batch_stats['total_questions_processed'] > 0 else 0:.1f}% (higher = more questions removed)")
-    sys.stdout.flush()
-
-    return results
 
 def filter_dataset(dataset_name, max_questions_to_test=None, num_processes=16):
     """Filter out questions that GPT-4o-mini can answer correctly without context chunks
@@ -2230,21 +2063,19 @@ def filter_dataset(dataset_name, max_questions_to_test=None, num_processes=16):
     (i.e., questions the model cannot answer correctly). Stops early when 100 questions
     are found that should be kept in the dataset.
 
+    Questions of all instances are served from one shared queue with at most num_processes API calls in
+    flight, so instances with many answerable questions do not hold up the others. Every answered question
+    is appended to a journal right away; a rerun skips questions that are already journaled.
+
     Args:
         dataset_name: Either 'squad' or 'hotpotqa'
         max_questions_to_test: Maximum number of questions to test (for debugging/testing)
-        num_processes: Number of parallel processes to use (default: 16)
+        num_processes: Maximum number of concurrent API calls (default: 16)
     """
     if dataset_name not in ['squad', 'hotpotqa']:
         print(f"Error: Filtering only supported for 'squad' and 'hotpotqa', got '{dataset_name}'")
         return
 
-    # Limit number of processes to avoid overwhelming the API
-    max_processes = min(num_processes, mp.cpu_count(), 16)  # Cap at 16 processes
-    if max_processes != num_processes:
-        print(f"Limiting processes from {num_processes} to {max_processes} (CPU count: {mp.cpu_count()})")
-        num_processes = max_processes
-
     # Load the parquet file
     parquet_file = f"./data/memalpha/processed_{dataset_name}_data.parquet"
     if not os.path.exists(parquet_file):
@@ -2255,75 +2086,89 @@ def filter_dataset(dataset_name, max_questions_to_test=None, num_processes=16):
     df = pd.read_parquet(parquet_file)
     print(f"Loaded {len(df)} instances")
 
-    # Setup API key for workers
+    # Setup API key for the workers
     api_key = os.getenv("AZURE_OPENAI_API_KEY")
     if not api_key:
         print("Error: AZURE_OPENAI_API_KEY environment variable not set")
         return
+    filter_client = AzureOpenAI(
+        api_key=api_key,
+        api_version="2025-01-01-preview",
+        azure_endpoint="https://jplml-resource.cognitiveservices.azure.com"
+    )
 
-    # Collect all instances to process
-    all_instances = []
+    # Results of earlier runs
+    journal_file = f"./data/memalpha/{dataset_name}_filter_journal.jsonl"
+    journaled = load_filter_journal(journal_file)
+    if journaled:
+        print(f"Loaded {len(journaled)} journaled question results from {journal_file}")
 
+    # Collect all instances to process
     print("Collecting instances for processing...")
     total_questions_before = 0
+    instance_states = []
 
     for idx, row in df.iterrows():
-        chunks = json.loads(row['chunks'])
         questions_and_answers = json.loads(row['questions_and_answers'])
-
         total_questions_before += len(questions_and_answers)
 
-        instance_data = {
-            'instance_id': idx,
-            'questions_and_answers': questions_and_answers,
-            'chunks': chunks
-        }
-        all_instances.append(instance_data)
-
-    print(f"Collected {len(all_instances)} instances with {total_questions_before} total questions to process with {num_processes} processes")
-
-    # Split instances into batches for multiprocessing
-    batch_size = max(1, len(all_instances) // num_processes)
-    instance_batches = []
-
-    for i in range(0, len(all_instances), batch_size):
-        batch = all_instances[i:i + batch_size]
-        batch_id = len(instance_batches)
-        instance_batches.append((batch, api_key, batch_id, max_questions_to_test))
-
-    print(f"Split into {len(instance_batches)} batches of ~{batch_size} instances each")
-
-    # Estimate processing time - we'll process questions until we find 100 to keep per instance
-    avg_questions_per_instance = total_questions_before / len(all_instances)
-    # Assume roughly 70% of questions will be kept (model can't answer), so we need to process ~143 questions to find 100 to keep
-    estimated_questions_per_instance = min(avg_questions_per_instance, 143)  # Cap at 143 since we stop at 100 kept
-    estimated_api_calls = estimated_questions_per_instance * len(all_instances)
-    estimated_minutes = (estimated_api_calls * 0.1) / 60 / num_processes  # ~0.1 seconds per API call, divided by processes
-
-    print(f"🎯 Goal: Find 100 questions to keep per instance (stop when target reached)")
-    print(f"⏱️  Estimated processing time: ~{estimated_minutes:.1f} minutes")
-    print(f"📊 Expected API calls: ~{estimated_api_calls:,.0f} (early stopping when 100 questions found per instance)")
-
-    # Process batches in parallel
-    print("Processing instances in parallel...")
-    print(f"Total instances to process: {len(all_instances)}")
-    print(f"Estimated questions to process: {total_questions_before} (may be less due to early stopping)")
-    print(f"Using {num_processes} parallel processes")
+        # Determine how many questions to test
+        questions_to_test = questions_and_answers[:max_questions_to_test] if max_questions_to_test else questions_and_answers
+        state = InstanceFilterState(idx, questions_to_test)
+        for qa_idx, qa in enumerate(questions_to_test):
+            result = journaled.get((idx, qa_idx))
+            if result is not None and result['question'] == qa['question']:
+                state.record(result)
+        instance_states.append(state)
+
+    total_questions_to_test = sum(len(state.questions) for state in instance_states)
+    print(f"Collected {len(instance_states)} instances with {total_questions_before} total questions "
+          f"({total_questions_to_test} to test) with up to {num_processes} concurrent API calls")
+    print(f"🎯 Goal: Find {FILTER_TARGET_KEEP} questions to keep per instance (stop when target reached)")
     print("-" * 60)
 
-    with mp.Pool(processes=num_processes) as pool:
-        batch_results = list(tqdm(
-            pool.imap(process_instance_batch, instance_batches),
-            total=len(instance_batches),
-            desc=f"🔄 Processing {len(instance_batches)} batches",
-            unit="batch",
-            bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} batches [{elapsed}<{remaining}, {rate_fmt}]"
-        ))
-
-    # Combine results from all batches
+    # Shared question queue: slots are refilled from the first instances that can still dispatch
+    active = deque(state for state in instance_states if not state.done)
+    futures = {}
+    with open(journal_file, 'a', encoding='utf-8') as journal_f, \
+            ThreadPoolExecutor(max_workers=num_processes) as executor, \
+            tqdm(total=len(active), desc="🔄 Filtering instances", unit="instance") as pbar:
+
+        def fill_slots():
+            for state in list(active):
+                while len(futures) < num_processes:
+                    qa_idx = state.next_dispatchable()
+                    if qa_idx is None:
+                        break
+                    state.next_question += 1
+                    state.in_flight += 1
+                    future = executor.submit(ask_question_without_context, filter_client, state.instance_id, qa_idx, state.questions[qa_idx])
+                    futures[future] = state
+                if len(futures) >= num_processes:
+                    return
+
+        fill_slots()
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                state = futures.pop(future)
+                result = future.result()
+                state.in_flight -= 1
+                state.record(result)
+                if not result.get('error'):
+                    journal_f.write(json.dumps(result, ensure_ascii=False) + "\n")
+                if state.done:
+                    active.remove(state)
+                    pbar.update(1)
+            # Results of this batch of completed questions are durable before more are dispatched
+            journal_f.flush()
+            os.fsync(journal_f.fileno())
+            fill_slots()
+
+    # Combine results of all instances, in order
     all_results = []
-    for batch_result in batch_results:
-        all_results.extend(batch_result)
+    for state in instance_states:
+        all_results.extend(state.tested_results())
 
     questions_and_predictions = all_results
     api_calls_made = len([r for r in all_results if r.get('prediction_without_chunk') is not None])
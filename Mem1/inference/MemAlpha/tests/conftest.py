@@ -0,0 +1,9 @@
+# conftest.py
+import os
+import sys
+
+# The scripts import their siblings top-level (memory_server, memalpha.*), while memory.py uses
+# package-relative imports and is imported as MemAlpha.memory
+MEMALPHA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(MEMALPHA_DIR))
+sys.path.insert(0, MEMALPHA_DIR)
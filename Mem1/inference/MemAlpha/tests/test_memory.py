@@ -0,0 +1,69 @@
+"""
+Unit tests for Memory mutations and their queued embeddings.
+
+Run with:
+    pytest Mem1/inference/MemAlpha/tests/test_memory.py -v
+"""
+
+import zlib
+
+import numpy as np
+import pytest
+
+from MemAlpha.memory import EmbeddingProvider, Memory
+
+
+class FakeEmbeddingProvider(EmbeddingProvider):
+    """Deterministic offline embeddings: a random vector seeded by the text."""
+
+    def __init__(self, dim: int = 8) -> None:
+        super().__init__("fake")
+        self.dim = dim
+
+    def _embed_uncached(self, texts):
+        return np.stack([np.random.default_rng(zlib.crc32(text.encode("utf-8"))).random(self.dim)
+                         for text in texts]).astype(np.float32)
+
+
+@pytest.fixture
+def memory() -> Memory:
+    memory = Memory(embedding_provider=FakeEmbeddingProvider())
+    memory.new_memory_insert("semantic", "The user lives in Lisbon.")
+    memory.flush_embeddings()
+    return memory
+
+
+def test_memory_update_replaces_content_and_embedding(memory):
+    memory_id = next(iter(memory.semantic[0]))
+    memory.memory_update("semantic", "The user lives in Porto.", memory_id)
+    assert memory.semantic == [{memory_id: "The user lives in Porto."}]
+    assert memory.flush_embeddings()
+    buffer = memory.embedding_buffers["semantic"]
+    assert len(buffer) == 1
+    expected = FakeEmbeddingProvider().embed(["The user lives in Porto."])[0]
+    np.testing.assert_allclose(buffer.matrix()[0], expected)
+
+
+def test_memory_update_unknown_id_raises_without_queueing_embedding(memory):
+    before = list(memory.semantic)
+    with pytest.raises(ValueError, match="Memory ID missing-id not found"):
+        memory.memory_update("semantic", "A hallucinated memory.", "missing-id")
+    assert memory.semantic == before
+    assert memory.pending_embeddings["semantic"] == {}
+    assert memory.flush_embeddings()
+    buffer = memory.embedding_buffers["semantic"]
+    assert "missing-id" not in buffer
+    assert len(buffer) == 1
+
+
+def test_checkpoint_changes_are_kept_apart_from_session_changes(memory):
+    memory.checkpoint_changes = []
+    memory.pending_changes = None  # the next session sync sends a full snapshot
+    memory.new_memory_insert("semantic", "The user works at a bakery.")
+    assert [change["op"] for change in memory.checkpoint_changes] == ["insert"]
+    assert memory.pending_changes is None
+
+    # A whole-list assignment has no operations to replay: both logs ask for a full snapshot
+    memory.semantic = [{"restored-id": "The user lives in Lisbon."}]
+    assert memory.checkpoint_changes is None
+    assert memory.pending_changes is None
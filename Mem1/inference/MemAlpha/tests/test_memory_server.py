@@ -0,0 +1,93 @@
+"""
+Unit tests for MemoryProcessor prompt token counting and packing.
+
+Run with:
+    pytest Mem1/inference/MemAlpha/tests/test_memory_server.py -v
+"""
+
+import functools
+import random
+
+import pytest
+from tokenizers import Regex, Tokenizer, decoders, models, pre_tokenizers, trainers
+
+import memory_server
+
+
+# Pre-tokenizer patterns of Qwen2/3 and of tiktoken's cl100k_base
+PRETOKENIZE_PATTERNS = {
+    "qwen": r"(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+",
+    "cl100k": r"(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+",
+}
+
+ENDINGS = [".", "!", "?", ".)", ":", ";", "...", "", " ", "  ", "\n", ".\n", "\t"]
+
+
+def random_sentence(rng: random.Random) -> str:
+    words = ["user", "likes", "Lisbon", "met", "Alice", "on", "2024-05-01", "at", "the", "café", "(work)", "#3"]
+    return " ".join(rng.choice(words) for _ in range(rng.randint(1, 12))) + rng.choice(ENDINGS)
+
+
+class SmallBPETokenizer:
+    """Byte-level BPE trained on numbered memory lists, with a real model's pre-tokenizer."""
+
+    def __init__(self, pattern: str) -> None:
+        rng = random.Random(0)
+        corpus = ["\n".join(f"{i}. {random_sentence(rng)}" for i in range(1, 21)) for _ in range(300)]
+        corpus.append(memory_server.MemoryProcessor.SYSTEM_PROMPT_HEAD + memory_server.MemoryProcessor.SYSTEM_PROMPT_TAIL)
+        self.tokenizer = Tokenizer(models.BPE())
+        self.tokenizer.pre_tokenizer = pre_tokenizers.Sequence([
+            pre_tokenizers.Split(Regex(pattern), "isolated"),
+            pre_tokenizers.ByteLevel(add_prefix_space=False, use_regex=False),
+        ])
+        self.tokenizer.decoder = decoders.ByteLevel()
+        self.tokenizer.train_from_iterator(corpus, trainers.BpeTrainer(
+            vocab_size=2000, initial_alphabet=pre_tokenizers.ByteLevel.alphabet()))
+
+    def encode(self, text: str):
+        return self.tokenizer.encode(text).ids
+
+
+@pytest.fixture(params=sorted(PRETOKENIZE_PATTERNS))
+def processor(request) -> memory_server.MemoryProcessor:
+    # Skip __init__, which connects to the model server; only the tokenizer is needed here
+    processor = memory_server.MemoryProcessor.__new__(memory_server.MemoryProcessor)
+    processor.tokenizer = SmallBPETokenizer(PRETOKENIZE_PATTERNS[request.param])
+    processor._count_tokens_cached = functools.lru_cache(maxsize=65536)(processor._encode_length)
+    processor.prompt_fragments = functools.lru_cache(maxsize=16)(processor._prompt_fragments)
+    return processor
+
+
+def random_memory_data(rng: random.Random):
+    return {
+        'core': rng.choice([None, "", random_sentence(rng)]),
+        'semantic': [{f"s{i}": random_sentence(rng)} for i in range(rng.randint(0, 25))],
+        'episodic': [{f"e{i}": random_sentence(rng)} for i in range(rng.randint(0, 25))],
+    }
+
+
+def test_estimate_matches_whole_prompt_count(processor):
+    rng = random.Random(1)
+    for _ in range(100):
+        memory_data = random_memory_data(rng)
+        system_prompt = processor.construct_system_prompt(memory_data, memory_data)
+        assert processor.estimate_prompt_tokens(memory_data) == processor.count_tokens(system_prompt)
+
+
+def test_pack_memories_matches_exhaustive_packing(processor):
+    rng = random.Random(2)
+    for _ in range(100):
+        memory_data = random_memory_data(rng)
+        token_budget = rng.randint(200, 1500)
+
+        expected_top_k = 1
+        for top_k in range(20, 0, -1):
+            prompt = processor.construct_system_prompt(processor.take_top_k(memory_data, top_k), memory_data)
+            if processor.count_tokens(prompt) <= token_budget:
+                expected_top_k = top_k
+                break
+
+        _, system_prompt, token_count, top_k = processor.pack_memories(memory_data, memory_data, 20, token_budget)
+        assert top_k == expected_top_k
+        assert system_prompt == processor.construct_system_prompt(processor.take_top_k(memory_data, top_k), memory_data)
+        assert token_count == processor.count_tokens(system_prompt)
@@ -0,0 +1,20 @@
+"""
+Unit tests for the answer metrics of memalpha.llm_agent.metrics.
+
+Run with:
+    pytest Mem1/inference/MemAlpha/tests/test_metrics.py -v
+"""
+
+from memalpha.llm_agent.metrics import calculate_metrics, calculate_metrics_batch
+
+
+def test_calculate_metrics_batch_matches_per_pair_metrics():
+    predictions = ["Paris", "The capital is Paris.", "paris", "Lyon", "Paris", "", "The capital is Paris."]
+    ground_truths = ["Paris", ["Paris", "Paris, France"], "Paris", "Paris", ["Paris", "Paris, France"], "Paris",
+                     ["Paris", "Paris, France"]]
+
+    metrics = calculate_metrics_batch(predictions, ground_truths)
+
+    assert metrics == [calculate_metrics(prediction, answers) for prediction, answers in zip(predictions, ground_truths)]
+    # identical pairs are scored once but get their own dictionaries
+    assert metrics[1] == metrics[6] and metrics[1] is not metrics[6]
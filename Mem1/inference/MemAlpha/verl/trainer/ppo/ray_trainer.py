@@ -626,6 +626,8 @@ class RayPPOTrainer:
             respond_url=self.config.respond_url,
             analyze_function_url=self.config.analyze_function_url,
             enable_thinking=self.config.enable_thinking,
+            use_memory_sessions=self.config.get('use_memory_sessions', False),
+            tool_workers=self.config.get('tool_workers', 16),
         )
         generation_manager = MemoryGenerationManager(
             tokenizer=self.tokenizer,
@@ -1159,6 +1161,8 @@ class RayPPOTrainer:
             respond_url=self.config.respond_url,
             analyze_function_url=self.config.analyze_function_url,
             enable_thinking=self.config.enable_thinking,
+            use_memory_sessions=self.config.get('use_memory_sessions', False),
+            tool_workers=self.config.get('tool_workers', 16),
         )
         generation_manager = MemoryGenerationManager(
             tokenizer=self.tokenizer,
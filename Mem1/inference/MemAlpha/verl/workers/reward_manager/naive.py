@@ -24,6 +24,7 @@ from openai import OpenAI
 
 # Add import for memory agent bench evaluation
 from memalpha.llm_agent.metrics import evaluate_wrt_source, _extract_answer_from_response
+from memalpha.qwen_judge import LLMJudge, get_qwen_client
 
 
 SYSTEM_PROMPT = """
@@ -73,76 +74,11 @@ def batch_process_questions_with_qwen32b(questions, batch_size=32, system_prompt
     Returns:
         List of responses corresponding to each question
     """
-
-    # Import and setup Qwen client
-    from openai import OpenAI
-    from transformers import AutoTokenizer
-    import time
-
-    # Setup Qwen client
-    client = OpenAI(
-        base_url=os.getenv("QWEN_URL"),
-        api_key="EMPTY"
-    )
-
-    # Initialize tokenizer for prompt conversion
-    tokenizer = AutoTokenizer.from_pretrained("Qwen/Qwen3-32B", trust_remote_code=True)
-
+    # The client, tokenizer and dispatch threads are shared per process; several batches are in flight at once
+    client = get_qwen_client(model=model)
     print(f"Starting batch processing of {len(questions)} questions with Qwen32B, batch size {batch_size}")
-
-    all_responses = []
-
-    # Process questions in batches
-    for i in range(0, len(questions), batch_size):
-        batch_questions = questions[i:i + batch_size]
-        batch_num = (i // batch_size) + 1
-        total_batches = (len(questions) + batch_size - 1) // batch_size
-
-        print(f"Processing batch {batch_num}/{total_batches} ({len(batch_questions)} questions)")
-
-        # Convert all questions in batch to prompts
-        batch_prompts = []
-        for question in batch_questions:
-            if system_prompt is not None:
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": question}
-                ]
-            else:
-                messages = [
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": question}
-                ]
-
-            # Convert to prompt using tokenizer
-            prompt = tokenizer.apply_chat_template(
-                messages,
-                tokenize=False,
-                add_generation_prompt=True
-            )
-
-            if no_thinking:
-                prompt += "<think></think>\n\n"
-
-            batch_prompts.append(prompt)
-
-        # Process the entire batch at once using completions API
-        response = client.completions.create(
-            model=model,
-            prompt=batch_prompts,
-            max_tokens=1024,
-            temperature=0.0,
-            stream=False
-        )
-
-        # Extract responses
-        batch_responses = [choice.text for choice in response.choices]
-        all_responses.extend(batch_responses)
-        print(f"Completed batch {batch_num}/{total_batches}")
-        # Delay between batches to avoid overloading the server
-        if i + batch_size < len(questions):
-            time.sleep(0.5)
-
+    all_responses = client.complete(questions, batch_size=batch_size, system_prompt=system_prompt or SYSTEM_PROMPT,
+                                    no_thinking=no_thinking, max_tokens=1024, temperature=0.0)
     print(f"Batch processing complete. Generated {len(all_responses)} responses.")
     return all_responses
 
@@ -176,6 +112,8 @@ class NaiveRewardManager:
             base_url=os.getenv("QWEN_URL"),
             api_key="EMPTY"
         )
+        # Created once and reused across steps: verdicts are memoized by (question, gold answer, prediction)
+        self.judge = LLMJudge(SYSTEM_PROMPT, ACCURACY_PROMPT) if generative_reward else None
 
     def _compute_score_for_data_source(self, data_source, predicted_answer, gold_answer, question=None):
         """Compute evaluation score based on data source using the same logic as long_context_eval.py."""
@@ -277,61 +215,56 @@ class NaiveRewardManager:
 
         compression_ratio_reward_scores = [1 - memory_length / chunk_length for memory_length, chunk_length in zip(total_memory_length, total_chunk_length)]
 
-        reward_scores = []
-
-        # First, collect all prompts that need to be processed by qwen32b (only when generative_reward is True)
-        all_qwen_prompts = []
-        qwen_prompt_mapping = []  # Track which batch item and question index each prompt belongs to
+        # First, send everything the qwen32b judge has to label (only when generative_reward is True);
+        # the judge works through it in the background while the other data sources are scored below
+        judge_items = []
+        judge_mapping = []  # Track which batch item each judge item belongs to
 
         if self.generative_reward:
             for i in range(len(ground_truth_answers_list)):
                 if data_sources[i] in ['squad', 'hotpotqa']:
-                    # Collect prompts for this batch item
-                    for j, (question, predicted_answer, ground_truth_answer) in enumerate(zip(questions_list[i], predicted_answers_list[i], ground_truth_answers_list[i])):
-                        prompt = ACCURACY_PROMPT.format(question=question, gold_answer=ground_truth_answer, generated_answer=predicted_answer)
-                        all_qwen_prompts.append(prompt)
-                        qwen_prompt_mapping.append((i, j))  # Store batch item index and question index
-
-        # Process all qwen prompts in a single batch call if there are any
-        if all_qwen_prompts:
-            print(f"Processing {len(all_qwen_prompts)} prompts with qwen32b in a single batch call")
-            all_qwen_responses = batch_process_questions_with_qwen32b(all_qwen_prompts, batch_size=1024, no_thinking=True, generative_reward=self.generative_reward)
-        else:
-            all_qwen_responses = []
+                    for question, predicted_answer, ground_truth_answer in zip(questions_list[i], predicted_answers_list[i], ground_truth_answers_list[i]):
+                        judge_items.append((question, ground_truth_answer, predicted_answer))
+                        judge_mapping.append(i)
 
-        # Create a mapping from batch item index to qwen responses
-        qwen_responses_by_batch_item = defaultdict(list)
-        for response, (batch_idx, question_idx) in zip(all_qwen_responses, qwen_prompt_mapping):
-            qwen_responses_by_batch_item[batch_idx].append(response)
+        judge_futures_by_batch_item = defaultdict(list)
+        if judge_items:
+            print(f"Judging {len(judge_items)} answers with qwen32b ({len(self.judge.cache)} verdicts cached)")
+            for future, batch_idx in zip(self.judge.submit(judge_items), judge_mapping):
+                judge_futures_by_batch_item[batch_idx].append(future)
 
-        # Now process each batch item and calculate reward scores
+        reward_scores = [None] * len(ground_truth_answers_list)
+
+        # Score the batch items that do not wait on the judge
         for i in range(len(ground_truth_answers_list)):
             data_source = data_sources[i]
-
-            # Handle special case for generative reward on squad/hotpotqa
             if data_source in ['squad', 'hotpotqa'] and self.generative_reward:
-                # Use the pre-computed qwen32b responses
-                batch_responses = qwen_responses_by_batch_item[i]
-                all_scores = []
-                for response in batch_responses:
-                    if "<label>CORRECT</label>" in response and "<label>WRONG</label>" in response:
-                        score = 0  # Default to wrong if both tags present
-                    elif "<label>CORRECT</label>" in response:
-                        score = 1
-                    elif "<label>WRONG</label>" in response:
-                        score = 0
-                    else:
-                        score = 0  # Default to wrong if we can't parse
-                    all_scores.append(score)
-                reward_scores.append(np.mean(all_scores))
-            else:
-                # Use the comprehensive scoring method for all other cases
-                all_scores = []
-                for pred, answer, question in zip(predicted_answers_list[i], ground_truth_answers_list[i], questions_list[i]):
-                    # Use the new comprehensive scoring method
-                    score = self._compute_score_for_data_source(data_source, pred, answer, question)
-                    all_scores.append(score)
-                reward_scores.append(np.mean(all_scores))
+                continue
+            # Use the comprehensive scoring method for all other cases
+            all_scores = []
+            for pred, answer, question in zip(predicted_answers_list[i], ground_truth_answers_list[i], questions_list[i]):
+                # Use the new comprehensive scoring method
+                score = self._compute_score_for_data_source(data_source, pred, answer, question)
+                all_scores.append(score)
+            reward_scores[i] = np.mean(all_scores)
+
+        # Handle special case for generative reward on squad/hotpotqa
+        for i in range(len(ground_truth_answers_list)):
+            if reward_scores[i] is not None:
+                continue
+            all_scores = []
+            for future in judge_futures_by_batch_item[i]:
+                response = future.result()
+                if "<label>CORRECT</label>" in response and "<label>WRONG</label>" in response:
+                    score = 0  # Default to wrong if both tags present
+                elif "<label>CORRECT</label>" in response:
+                    score = 1
+                elif "<label>WRONG</label>" in response:
+                    score = 0
+                else:
+                    score = 0  # Default to wrong if we can't parse
+                all_scores.append(score)
+            reward_scores[i] = np.mean(all_scores)
 
         # Save original reward scores:
         original_reward_scores = reward_scores